@@ -1,22 +1,36 @@
-import RPi.GPIO
-import spidev
-import time
+import logging
+
 import EPDExceptions
+import EPDHardware
+import EPDPacking
+import EPDTracing
+
+logger = logging.getLogger('EPD')
 
 
 class DisplayInterface:
-    def __init__(self, commands: dict):
+    # Script step waiting for the device to be idle.
+    WAIT_IDLE = 'WAIT_IDLE'
+
+    def __init__(self, commands: dict, backend=None):
         """
         The display interface is the hardware interface used to communicated with the EPD device.
 
         :param commands: The commands recognized by the device.
         :type commands: dict
+        :param backend: The hardware backend (default is the Raspberry Pi's GPIO and SPI).
+        :type backend: EPDHardware.Backend
         """
         self.__commands = commands
+        self.__backend = backend if backend is not None else EPDHardware.RPiBackend()
 
         # Wait times (s).
         self.WT_PIN_TOGGLE = 0.2
         self.WT_STATE_LOOKUP = 0.1
+        self.WT_POLL_MIN = 0.001
+        self.WT_EDGE_SLICE = 0.5
+        self.WT_BUSY_TIMEOUT = 60
+        self.WT_TEMPERATURE_TTL = 600
 
         # GPIO pins.
         self.RST_PIN = 17
@@ -24,20 +38,60 @@ class DisplayInterface:
         self.CS_PIN = 8
         self.BUSY_PIN = 24
 
+        # Last level written on the DC pin, None if unknown.
+        self.__dc_level = None
+
+        # Set to False once GPIO edge detection turned out to be unavailable.
+        self.__edge_detection = True
+
+        # Number of bytes sent through the SPI device.
+        self.__bytes_sent = 0
+
         # Set GPIO pins.
-        RPi.GPIO.setmode(RPi.GPIO.BCM)
-        RPi.GPIO.setwarnings(False)
-        RPi.GPIO.setup(self.RST_PIN, RPi.GPIO.OUT)
-        RPi.GPIO.setup(self.DC_PIN, RPi.GPIO.OUT)
-        RPi.GPIO.setup(self.CS_PIN, RPi.GPIO.OUT)
-        RPi.GPIO.setup(self.BUSY_PIN, RPi.GPIO.IN)
+        self.__backend.setup_output(self.RST_PIN)
+        self.__backend.setup_output(self.DC_PIN)
+        self.__backend.setup_output(self.CS_PIN)
+        self.__backend.setup_input(self.BUSY_PIN)
+
+        # Largest transfer accepted by the SPI device (B).
+        self.SPI_CHUNK_SIZE = self.__backend.spi_buffer_size
+
+    @property
+    def backend(self) -> EPDHardware.Backend:
+        """
+        Getter for the hardware backend.
+
+        :rtype EPDHardware.Backend
+        """
+        return self.__backend
+
+    @property
+    def bytes_sent(self) -> int:
+        """
+        Getter for the number of bytes sent through the SPI device.
 
-        # SPI device.
-        self.__spi = spidev.SpiDev(0, 0)
+        :rtype int
+        """
+        return self.__bytes_sent
+
+    def clock(self) -> float:
+        """
+        Reads the backend's monotonic clock.
 
-        # Set SPI device.
-        self.__spi.max_speed_hz = 2000000
-        self.__spi.mode = 0b00
+        :return The time (s).
+        :rtype float
+        """
+        return self.__backend.clock()
+
+    def sleep(self, seconds: float):
+        """
+        Pauses for a given time on the backend's clock.
+
+        :param seconds: The time to wait (s).
+        :type seconds: float
+        """
+        with EPDTracing.span('sleep', 'driver', seconds=seconds):
+            self.__backend.sleep(seconds)
 
     def read_pin(self, pin: int) -> bool:
         """
@@ -48,7 +102,7 @@ class DisplayInterface:
         :return The value on the pin.
         :rtype bool
         """
-        return RPi.GPIO.input(pin)
+        return self.__backend.input(pin)
 
     def write_pin(self, pin: int, value: bool):
         """
@@ -59,7 +113,59 @@ class DisplayInterface:
         :param value: The value for the pin.
         :type value: bool
         """
-        RPi.GPIO.output(pin, value)
+        with EPDTracing.span('write_pin', 'driver', pin=pin, value=value):
+            self.__backend.output(pin, value)
+
+        if pin == self.DC_PIN:
+            self.__dc_level = value
+
+    @EPDTracing.traced('wait_for_pin', 'driver')
+    def wait_for_pin(self, pin: int, value: bool, timeout: float) -> bool:
+        """
+        Waits until a given pin reaches a value. GPIO edge detection is used when available, otherwise the pin is polled
+        with an interval growing from WT_POLL_MIN to WT_STATE_LOOKUP. Edges are awaited by slices of WT_EDGE_SLICE so an
+        edge occurring between the level check and the edge detection setup cannot be missed for long.
+
+        :param pin: The pin number.
+        :type pin: int
+        :param value: The awaited value.
+        :type value: bool
+        :param timeout: The maximum waiting time (s).
+        :type timeout: float
+        :return True if the pin reached the value, False if the timeout expired.
+        :rtype bool
+        """
+        deadline = self.clock() + timeout
+        poll_interval = self.WT_POLL_MIN
+
+        while bool(self.read_pin(pin)) != bool(value):
+            remaining = deadline - self.clock()
+
+            if remaining <= 0:
+                return False
+
+            if self.__edge_detection:
+                try:
+                    self.__backend.wait_for_edge(pin, bool(value), min(remaining, self.WT_EDGE_SLICE))
+
+                    continue
+                except NotImplementedError:
+                    self.__edge_detection = False
+
+            self.sleep(min(poll_interval, remaining))
+            poll_interval = min(poll_interval * 2, self.WT_STATE_LOOKUP)
+
+        return True
+
+    def __write_dc(self, value: bool):
+        """
+        Writes a value to the DC pin, skipping the GPIO write if the pin is already at that level.
+
+        :param value: The value for the pin.
+        :type value: bool
+        """
+        if self.__dc_level != value:
+            self.write_pin(self.DC_PIN, value)
 
     def __transfer(self, data: int):
         """
@@ -68,7 +174,22 @@ class DisplayInterface:
         :param data: Numerical data to send.
         :type data: int
         """
-        self.__spi.writebytes(data)
+        self.__backend.spi_write(bytes(data))
+        self.__bytes_sent += len(data)
+
+    def __transfer_buffer(self, buffer):
+        """
+        Transfers a buffer to the display through the SPI device, in chunks no larger than the SPI device's buffer.
+
+        :param buffer: The data to send.
+        :type buffer: bytes or bytearray or memoryview
+        """
+        view = memoryview(buffer).cast('B')
+
+        for start in range(0, len(view), self.SPI_CHUNK_SIZE):
+            self.__backend.spi_write(view[start:start + self.SPI_CHUNK_SIZE])
+
+        self.__bytes_sent += len(view)
 
     def send_command(self, command: str or int, command_name=True):
         """
@@ -79,8 +200,9 @@ class DisplayInterface:
         :param command_name: Determines if the command must be retreived from the commands dictionnary (default is True).
         :type command_name: bool
         """
-        self.write_pin(self.DC_PIN, RPi.GPIO.LOW)
-        self.__transfer([self.__commands[command] if command_name else command])
+        with EPDTracing.span('send_command', 'driver', command=command):
+            self.__write_dc(EPDHardware.LOW)
+            self.__transfer([self.__commands[command] if command_name else command])
 
     def send_data(self, data: int):
         """
@@ -89,14 +211,111 @@ class DisplayInterface:
         :param data: The data to send.
         :type data: int
         """
-        self.write_pin(self.DC_PIN, RPi.GPIO.HIGH)
-        self.__transfer([data])
+        with EPDTracing.span('send_data', 'driver'):
+            self.__write_dc(EPDHardware.HIGH)
+            self.__transfer([data])
+
+    def send_data_buffer(self, buffer):
+        """
+        Sends a whole buffer of data to the device. The DC pin is set once for the burst.
+
+        :param buffer: The data to send.
+        :type buffer: bytes or bytearray or memoryview
+        """
+        with EPDTracing.span('send_data_buffer', 'driver', size=len(buffer)):
+            self.__write_dc(EPDHardware.HIGH)
+            self.__transfer_buffer(buffer)
+
+    def read_data(self, size: int) -> bytes:
+        """
+        Reads data from the device.
+
+        :param size: The number of bytes to read.
+        :type size: int
+        :return The data read.
+        :rtype bytes
+        """
+        with EPDTracing.span('read_data', 'driver', size=size):
+            self.__write_dc(EPDHardware.HIGH)
+
+            return self.__backend.spi_read(size)
+
+    def compile_script(self, script: list) -> list:
+        """
+        Compiles a register script into transactions. Consecutive bytes sent with the same DC level are merged in a
+        single transaction, so a script costs one transaction per command/data switch and one step per WAIT_IDLE.
+
+        :param script: The steps, each one being a tuple of a command (key or actual command) and its data bytes.
+        :type script: list
+        :return The transactions, either WAIT_IDLE or a (DC level, bytes) tuple.
+        :rtype list
+        :raise KeyError: Raised if a command key is not recognized by the device.
+        """
+        transactions = []
+
+        for command, *data in script:
+            if command == self.WAIT_IDLE:
+                transactions.append(self.WAIT_IDLE)
+
+                continue
+
+            code = self.__commands[command] if isinstance(command, str) else command
+
+            for level, values in ((EPDHardware.LOW, [code]), (EPDHardware.HIGH, data)):
+                if not values:
+                    continue
+
+                if transactions and transactions[-1] != self.WAIT_IDLE and transactions[-1][0] == level:
+                    transactions[-1][1].extend(values)
+                else:
+                    transactions.append((level, bytearray(values)))
+
+        return [transaction if transaction == self.WAIT_IDLE else (transaction[0], bytes(transaction[1]))
+                for transaction in transactions]
+
+    @EPDTracing.traced('run_script', 'driver')
+    def run_script(self, transactions: list, wait_until_idle):
+        """
+        Runs compiled register script transactions.
+
+        :param transactions: The transactions, as returned by compile_script.
+        :type transactions: list
+        :param wait_until_idle: Called for every WAIT_IDLE step.
+        """
+        for transaction in transactions:
+            if transaction == self.WAIT_IDLE:
+                wait_until_idle()
+
+                continue
+
+            level, data = transaction
+
+            with EPDTracing.span('transaction', 'driver', dc=level, size=len(data)):
+                self.__write_dc(level)
+                self.__transfer_buffer(data)
 
 
 class Display:
-    def __init__(self, width: int, height: int, interface: DisplayInterface):
+    # Refresh mode set up by the init script.
+    DEFAULT_REFRESH_MODE = 'full'
+
+    # Power states, from the fastest to wake up to the most economical: powered, powered off with the registers kept,
+    # and deep sleep, which needs a reset and the init script.
+    POWERED = 'powered'
+    POWERED_OFF = 'powered_off'
+    DEEP_SLEEP = 'deep_sleep'
+
+    # Range of the temperatures the device's sensor measures (C), readings outside of it are rejected.
+    TEMPERATURE_RANGE = (-25, 50)
+
+    # Sensor readings seen when the data line is not connected (the Waveshare HAT leaves MISO floating): all bits low or
+    # all bits high, 0 and -0.5 C.
+    FLOATING_READINGS = (b'\x00\x00', b'\xff\xff')
+
+    def __init__(self, width: int, height: int, interface: DisplayInterface, init_script: list, refresh_modes=None,
+                 temperature=None):
         """
-        Creates a Display object. It is used upon the Display Interface as an interface to the device's commands. It only needs the device dimensions and the display interface.
+        Creates a Display object. It is used upon the Display Interface as an interface to the device's commands. It only needs the device dimensions, the display interface and the device's power-on register script. Refresh modes can be given to use other waveforms than the default one.
 
         :param width: The width of the device.
         :type width: int
@@ -104,13 +323,45 @@ class Display:
         :type height: int
         :param interface: The display interface.
         :type interface: DisplayInterface
+        :param init_script: The register script run on initialization (see DisplayInterface.compile_script).
+        :type init_script: list
+        :param refresh_modes: The waveforms by refresh mode, each one being a list of (minimum temperature (included),
+        maximum temperature (excluded), register script) tuples. A None temperature bound is unbounded.
+        :type refresh_modes: dict
+        :param temperature: The temperature used to choose the waveforms instead of reading the device's sensor, None
+        to read the sensor (C).
+        :type temperature: float
         """
         self.__width = width
         self.__height = height
 
         self.__interface = interface
+        self.__init_transactions = interface.compile_script(init_script)
+
+        self.__refresh_modes = {}
 
-        self.__sleeping = True
+        for mode, waveforms in (refresh_modes or {}).items():
+            self.__refresh_modes[mode] = [(minimum, maximum, interface.compile_script(script))
+                                          for minimum, maximum, script in waveforms]
+
+        # Loaded waveform as a (mode, index) tuple, configured temperature, and last temperature read with its time.
+        self.__waveform = None
+        self.__temperature_override = temperature
+        self.__temperature = None
+        self.__temperature_time = None
+
+        self.__power_state = self.DEEP_SLEEP
+
+        # Packed frame shown by the device and its fingerprint, None when unknown.
+        self.__screen = None
+        self.__fingerprint = None
+
+        # Busy times (s).
+        self.__last_busy_time = 0
+        self.__busy_time = 0
+
+        # Times of the last refresh, on the interface's clock (s).
+        self.__last_refresh = None
 
         self.init()
 
@@ -135,11 +386,20 @@ class Display:
     @property
     def is_sleeping(self) -> bool:
         """
-        Getter for the device sleep state. This property is kinda artificial as it is set only on reset/sleep calls and do not rely on an actual device information.
+        Getter for the device sleep state, True unless it is powered. This property is kinda artificial as it is set only on reset/power calls and do not rely on an actual device information.
 
         :rtype bool
         """
-        return self.__sleeping
+        return self.__power_state != self.POWERED
+
+    @property
+    def power_state(self) -> str:
+        """
+        Getter for the device power state: POWERED, POWERED_OFF or DEEP_SLEEP.
+
+        :rtype str
+        """
+        return self.__power_state
 
     @property
     def is_busy(self) -> bool:
@@ -150,115 +410,487 @@ class Display:
         """
         return self.__interface.read_pin(self.__interface.BUSY_PIN) == 0 # 0: busy, 1: idle.
 
-    def wait_until_idle(self):
+    @property
+    def last_busy_time(self) -> float:
+        """
+        Getter for the time the device was busy during the last wait (s).
+
+        :rtype float
         """
-        Pauses the process until the device is ready to accept new informations.
+        return self.__last_busy_time
+
+    @property
+    def busy_time(self) -> float:
         """
-        while True:
-            time.sleep(self.__interface.WT_STATE_LOOKUP)
+        Getter for the total time spent waiting for the device (s).
 
-            if not self.is_busy:
-                break
+        :rtype float
+        """
+        return self.__busy_time
+
+    @property
+    def bytes_sent(self) -> int:
+        """
+        Getter for the number of bytes sent to the device.
+
+        :rtype int
+        """
+        return self.__interface.bytes_sent
+
+    @property
+    def last_refresh(self) -> dict:
+        """
+        Getter for the times of the last refresh, on the interface's clock (see clock): frame transferred, refresh
+        started and refresh done. None before the first refresh.
+
+        :rtype dict
+        """
+        return self.__last_refresh
+
+    def clock(self) -> float:
+        """
+        Reads the interface's monotonic clock.
+
+        :return The time (s).
+        :rtype float
+        """
+        return self.__interface.clock()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Getter for the fingerprint of the frame shown by the device (see EPDPacking.fingerprint), None if unknown.
+
+        :rtype str
+        """
+        return self.__fingerprint
 
+    @fingerprint.setter
+    def fingerprint(self, value: str):
+        """
+        Setter for the fingerprint of the frame shown by the device, typically restored after a restart since the
+        device keeps its pixels. The frame itself stays unknown.
+
+        :param value: The fingerprint.
+        :type value: str
+        """
+        self.__screen = None
+        self.__fingerprint = value
+
+    @EPDTracing.traced('Display.wait_until_idle', 'display')
+    def wait_until_idle(self, timeout=None):
+        """
+        Pauses the process until the device is ready to accept new informations. Returns immediately if the device is
+        already idle.
+
+        :param timeout: The maximum waiting time (default is the interface's WT_BUSY_TIMEOUT) (s).
+        :type timeout: float
+        :raise EPDExceptions.DisplayBusyTimeoutException: Raised if the device is still busy after the timeout.
+        """
+        if not self.is_busy:
+            self.__last_busy_time = 0
+
+            return
+
+        start = self.__interface.clock()
+        idle = self.__interface.wait_for_pin(self.__interface.BUSY_PIN, EPDHardware.HIGH,
+                                             self.__interface.WT_BUSY_TIMEOUT if timeout is None else timeout)
+
+        self.__last_busy_time = self.__interface.clock() - start
+        self.__busy_time += self.__last_busy_time
+
+        if not idle:
+            raise EPDExceptions.DisplayBusyTimeoutException('Display still busy after ' +
+                                                            str(round(self.__last_busy_time, 3)) + 's')
+
+    @EPDTracing.traced('Display.reset', 'display')
     def reset(self):
         """
         Resets the device. Its use is not recommanded since the device may need to be reconfigured. Initialization is the recommanded way to get the device out of sleep state.
         """
         self.wait_until_idle()
-        self.__interface.write_pin(self.__interface.RST_PIN, RPi.GPIO.LOW)
-        time.sleep(self.__interface.WT_PIN_TOGGLE)
-        self.__interface.write_pin(self.__interface.RST_PIN, RPi.GPIO.HIGH)
-        time.sleep(self.__interface.WT_PIN_TOGGLE)
+        self.__interface.write_pin(self.__interface.RST_PIN, EPDHardware.LOW)
+        self.__interface.sleep(self.__interface.WT_PIN_TOGGLE)
+        self.__interface.write_pin(self.__interface.RST_PIN, EPDHardware.HIGH)
+        self.__interface.sleep(self.__interface.WT_PIN_TOGGLE)
 
-        self.__sleeping = False
+        # The init script restores the default waveform.
+        self.__waveform = (self.DEFAULT_REFRESH_MODE, 0)
+        self.__power_state = self.POWERED
 
+    @EPDTracing.traced('Display.init', 'display')
     def init(self):
         """
         Resets the device and reconfigures it.
         """
         self.reset()
+        self.__interface.run_script(self.__init_transactions, self.wait_until_idle)
+
+    @EPDTracing.traced('Display.power_off', 'display')
+    def power_off(self):
+        """
+        Powers the device off, its registers and waveform being kept so power_on wakes it up without the init script.
+        """
+        if self.__power_state == self.POWERED:
+            self.wait_until_idle()
+            self.__interface.send_command('POWER_OFF')
+            self.wait_until_idle()
+
+            self.__power_state = self.POWERED_OFF
 
-        self.__interface.send_command('POWER_SETTING')
-        self.__interface.send_data(0x37)
-        self.__interface.send_data(0x00)
+    @EPDTracing.traced('Display.power_on', 'display')
+    def power_on(self):
+        """
+        Powers the device on after power_off.
+        """
+        if self.__power_state == self.POWERED_OFF:
+            self.__interface.send_command('POWER_ON')
+            self.wait_until_idle()
 
-        self.__interface.send_command('PANEL_SETTING')
-        self.__interface.send_data(0xCF)
-        self.__interface.send_data(0x08)
+            self.__power_state = self.POWERED
 
-        self.__interface.send_command('BOOSTER_SOFT_START')
-        self.__interface.send_data(0xc7)
-        self.__interface.send_data(0xcc)
-        self.__interface.send_data(0x28)
+    @EPDTracing.traced('Display.wake', 'display')
+    def wake(self) -> str:
+        """
+        Powers the device on by the shortest path: nothing if it is powered, power_on if it is powered off and init
+        after a deep sleep.
 
-        self.__interface.send_command('POWER_ON')
+        :return The power state the device was in.
+        :rtype str
+        """
+        power_state = self.__power_state
+
+        if power_state == self.POWERED_OFF:
+            self.power_on()
+        elif power_state == self.DEEP_SLEEP:
+            self.init()
+
+        return power_state
+
+    @EPDTracing.traced('Display.sleep', 'display')
+    def sleep(self):
+        """
+        Puts the device in deep sleep mode.
+        """
+        if self.__power_state != self.DEEP_SLEEP:
+            self.power_off()
+            self.__interface.send_command('DEEP_SLEEP')
+            self.__interface.send_data(0xa5)
+
+            self.__power_state = self.DEEP_SLEEP
+
+    @property
+    def refresh_modes(self) -> list:
+        """
+        Getter for the available refresh modes.
+
+        :rtype list
+        """
+        return list(self.__refresh_modes)
+
+    @property
+    def refresh_mode(self) -> str:
+        """
+        Getter for the refresh mode of the loaded waveform.
+
+        :rtype str
+        """
+        return None if self.__waveform is None else self.__waveform[0]
+
+    @EPDTracing.traced('Display.read_temperature', 'display')
+    def read_temperature(self) -> float:
+        """
+        Reads the temperature from the device's sensor.
+
+        :return The temperature (C).
+        :rtype float
+        :raise ValueError: Raised if the reading is not a valid temperature, typically because the sensor cannot be
+        read.
+        """
         self.wait_until_idle()
+        self.__interface.send_command('TEMPERATURE_SENSOR_COMMAND')
+        self.wait_until_idle()
+        data = bytes(self.__interface.read_data(2))
 
-        self.__interface.send_command('PLL_CONTROL')
-        self.__interface.send_data(0x3c)
+        if data in self.FLOATING_READINGS:
+            raise ValueError('No temperature sensor reading (' + data.hex() + ')')
 
-        self.__interface.send_command('TEMPERATURE_CALIBRATION')
-        self.__interface.send_data(0x00)
+        # Signed integer part, then the half degree in the MSB of the second byte.
+        temperature = (data[0] - 256 if data[0] & 0x80 else data[0]) + (0.5 if data[1] & 0x80 else 0)
 
-        self.__interface.send_command('VCOM_AND_DATA_INTERVAL_SETTING')
-        self.__interface.send_data(0x77)
+        if not self.TEMPERATURE_RANGE[0] <= temperature <= self.TEMPERATURE_RANGE[1]:
+            raise ValueError('Temperature reading out of the sensor\'s range: ' + str(temperature) + ' C')
 
-        self.__interface.send_command('TCON_SETTING')
-        self.__interface.send_data(0x22)
+        return temperature
 
-        self.__interface.send_command('TCON_RESOLUTION')
-        self.__interface.send_data(0x02) #source 640
-        self.__interface.send_data(0x80)
-        self.__interface.send_data(0x01) #gate 384
-        self.__interface.send_data(0x80)
+    @property
+    def temperature(self) -> float:
+        """
+        Getter for the device's temperature: the configured temperature if any, the sensor's reading otherwise. The
+        sensor is read again once the last reading is older than the interface's WT_TEMPERATURE_TTL. An invalid
+        reading is logged and makes the temperature unknown until the next reading.
 
-        self.__interface.send_command('VCM_DC_SETTING')
-        self.__interface.send_data(0x1E) #decide by LUT file
+        :return The temperature (C), None if unknown.
+        :rtype float
+        """
+        if self.__temperature_override is not None:
+            return self.__temperature_override
 
-        self.__interface.send_command(0xe5, False) #FLASH MODE
-        self.__interface.send_data(0x03)
+        if self.__temperature_time is None or \
+                self.__interface.clock() - self.__temperature_time > self.__interface.WT_TEMPERATURE_TTL:
+            try:
+                self.__temperature = self.read_temperature()
+            except ValueError as exception:
+                logger.warning(str(exception) + ', only the waveforms valid at any temperature are used. Configure '
+                                                'the temperature if the sensor cannot be read')
+                self.__temperature = None
 
-    def sleep(self):
+            self.__temperature_time = self.__interface.clock()
+
+        return self.__temperature
+
+    @property
+    def temperature_override(self) -> float:
         """
-        Puts the device in sleep mode.
+        Getter for the configured temperature, used instead of the sensor's reading (C), None if not configured.
+
+        :rtype float
         """
-        if not self.is_sleeping:
-            self.wait_until_idle()
-            self.__interface.send_command('POWER_OFF')
-            self.wait_until_idle()
-            self.__interface.send_command('DEEP_SLEEP')
-            self.__interface.send_data(0xa5)
+        return self.__temperature_override
 
-            self.__sleeping = True
+    @temperature_override.setter
+    def temperature_override(self, value: float):
+        """
+        Setter for the configured temperature. The waveform is chosen again on the next refresh mode change.
 
-    def display_frame(self, pixels):
+        :param value: The temperature (C), None to read the sensor.
+        :type value: float
         """
-        Sends a frame to the device and refreshes the display.
+        self.__temperature_override = value
 
-        :param pixels: The pixels matrix, typically PIL's PixelAccess object.
+    @EPDTracing.traced('Display.set_refresh_mode', 'display')
+    def set_refresh_mode(self, mode: str) -> str:
+        """
+        Loads the waveform of a refresh mode valid for the device's temperature. The temperature is only read if the
+        mode's waveforms depend on it and nothing is sent if the waveform is already loaded. If the mode has no waveform
+        for the temperature, or the temperature is unknown and the mode has no waveform valid at any temperature, the
+        default mode is used instead.
+
+        :param mode: The refresh mode.
+        :type mode: str
+        :return The refresh mode actually loaded.
+        :rtype str
+        :raise KeyError: Raised if the refresh mode is unknown.
         :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
         """
         if self.is_sleeping:
             raise EPDExceptions.InvalidDisplayStatusException('Display is sleeping')
 
-        self.wait_until_idle()
-        self.__interface.send_command('DATA_START_TRANSMISSION_1')
+        if mode == self.DEFAULT_REFRESH_MODE and mode not in self.__refresh_modes:
+            return self.refresh_mode
+
+        waveforms = self.__refresh_modes[mode]
+        temperature = None
+
+        if any(minimum is not None or maximum is not None for minimum, maximum, _ in waveforms):
+            temperature = self.temperature
+
+        for index, (minimum, maximum, transactions) in enumerate(waveforms):
+            if temperature is None and (minimum is not None or maximum is not None):
+                continue
+
+            if (minimum is None or temperature >= minimum) and (maximum is None or temperature < maximum):
+                if self.__waveform != (mode, index):
+                    self.wait_until_idle()
+                    self.__interface.run_script(transactions, self.wait_until_idle)
+                    self.__waveform = (mode, index)
+
+                return mode
+
+        if mode == self.DEFAULT_REFRESH_MODE:
+            raise KeyError('No ' + mode + ' waveform for ' + str(temperature) + ' C')
+
+        return self.set_refresh_mode(self.DEFAULT_REFRESH_MODE)
+
+    def __check_frame(self, image):
+        """
+        Checks that a frame can be displayed.
+
+        :param image: The frame, typically a PIL Image or an EPDPacking.PackedFrame.
+        :raise ValueError: Raised if the frame does not match the device's dimensions.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        """
+        if self.is_sleeping:
+            raise EPDExceptions.InvalidDisplayStatusException('Display is sleeping')
+
+        if tuple(image.size) != (self.width, self.height):
+            raise ValueError('Frame size ' + str(image.size) + ' does not match display size ' +
+                             str((self.width, self.height)))
+
+    @EPDTracing.traced('Display.display_frame', 'display')
+    def display_frame(self, image, fast=False, skip_unchanged=False) -> bool:
+        """
+        Sends a frame to the device and refreshes the display.
+
+        :param image: The frame, typically a PIL Image, or an EPDPacking.PackedFrame sent as it is. Any non zero pixel
+        is displayed white.
+        :param fast: Refreshes the whole display with the fast waveform instead of the full one, it is faster but
+        leaves some ghosting. If no fast waveform is available, the partial refresh is used on the whole display.
+        :type fast: bool
+        :param skip_unchanged: Does nothing if the device already shows the frame.
+        :type skip_unchanged: bool
+        :return False if the update was skipped, True otherwise.
+        :rtype bool
+        :raise ValueError: Raised if the frame does not match the device's dimensions.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        """
+        self.__check_frame(image)
+
+        data = EPDPacking.pack_frame(image)
+        fingerprint = EPDPacking.fingerprint(data)
+
+        if skip_unchanged and fingerprint == self.__fingerprint:
+            return False
+
+        if fast and ('fast' not in self.__refresh_modes or self.set_refresh_mode('fast') != 'fast'):
+            self.__display_window(data, (0, 0, self.width, self.height))
+        else:
+            if not fast:
+                self.set_refresh_mode(self.DEFAULT_REFRESH_MODE)
 
-        for y in range(self.height):
-            x = 0
+            self.wait_until_idle()
+            self.__interface.send_command('DATA_START_TRANSMISSION_1')
+            self.__interface.send_data_buffer(data)
+            self.__refresh()
+
+            self.__screen = data
+            self.__fingerprint = fingerprint
 
-            while x < self.width:
-                data = 0x00
+        return True
 
-                if pixels[x, y]:
-                    data += 0x30
+    def window(self, box: (int, int, int, int)) -> (int, int, int, int):
+        """
+        Computes the partial window covering a box. The device addresses columns by groups of 8 pixels, so the box is
+        widened horizontally to the 8 pixels boundaries and clipped to the device's dimensions.
 
-                if pixels[x + 1, y]:
-                    data += 0x03
+        :param box: The box, as left, top, right (excluded) and bottom (excluded).
+        :type box: (int, int, int, int)
+        :return The window, as left, top, right (excluded) and bottom (excluded).
+        :rtype (int, int, int, int)
+        :raise ValueError: Raised if the box does not intersect the device.
+        """
+        left, top, right, bottom = (int(value) for value in box)
 
-                self.__interface.send_data(data)
+        left = max(0, left & ~7)
+        top = max(0, top)
+        right = min(self.width, (right + 7) & ~7)
+        bottom = min(self.height, bottom)
 
-                x += 2
+        if left >= right or top >= bottom:
+            raise ValueError('Empty window for box ' + str(box))
+
+        return left, top, right, bottom
+
+    @EPDTracing.traced('Display.display_partial', 'display')
+    def display_partial(self, image, box: (int, int, int, int), skip_unchanged=False) -> bool:
+        """
+        Sends the pixels of a frame inside a box to the device and refreshes this window only. The fast waveform is
+        used if available.
+
+        :param image: The frame, typically a PIL Image, or an EPDPacking.PackedFrame sent as it is. Any non zero pixel
+        is displayed white.
+        :param box: The box to refresh, as left, top, right (excluded) and bottom (excluded). It is widened to the
+        device's window boundaries (see window).
+        :type box: (int, int, int, int)
+        :param skip_unchanged: Does nothing if the device already shows the frame's pixels inside the window.
+        :type skip_unchanged: bool
+        :return False if the update was skipped, True otherwise.
+        :rtype bool
+        :raise ValueError: Raised if the frame does not match the device's dimensions or the box is empty.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        """
+        self.__check_frame(image)
 
+        window = self.window(box)
+        data = EPDPacking.pack_frame(image)
+
+        if skip_unchanged:
+            if self.__screen is not None:
+                unchanged = EPDPacking.crop(self.__screen, self.width, window) == \
+                            EPDPacking.crop(data, self.width, window)
+            else:
+                # Only the fingerprint is known, the window is unchanged if the whole frame is.
+                unchanged = EPDPacking.fingerprint(data) == self.__fingerprint
+
+            if unchanged:
+                return False
+
+        if 'fast' in self.__refresh_modes:
+            self.set_refresh_mode('fast')
+
+        self.__display_window(data, window)
+
+        return True
+
+    @EPDTracing.traced('Display.display_window', 'display')
+    def __display_window(self, data: bytes, window: (int, int, int, int)):
+        """
+        Sends the pixels of a packed frame inside a window to the device and refreshes this window only, with the
+        loaded waveform.
+
+        :param data: The packed frame.
+        :type data: bytes
+        :param window: The window, as returned by window.
+        :type window: (int, int, int, int)
+        """
+        left, top, right, bottom = window
+
+        # Horizontal positions are set by groups of 8 pixels, ends are included.
+        window_data = bytes([
+            left >> 8, left & 0xf8,
+            (right - 1) >> 8, ((right - 1) & 0xf8) | 0x07,
+            top >> 8, top & 0xff,
+            (bottom - 1) >> 8, (bottom - 1) & 0xff,
+            0x01  # Gates scan inside and outside of the window.
+        ])
+        box_data = EPDPacking.crop(data, self.width, window)
+
+        self.wait_until_idle()
+        self.__interface.send_command('PARTIAL_IN')
+        self.__interface.send_command('PARTIAL_WINDOW')
+        self.__interface.send_data_buffer(window_data)
+        self.__interface.send_command('DATA_START_TRANSMISSION_1')
+        self.__interface.send_data_buffer(box_data)
+        self.__refresh()
+        self.__interface.send_command('PARTIAL_OUT')
+
+        fingerprint = EPDPacking.fingerprint(data)
+
+        if self.__screen is not None:
+            screen = bytearray(self.__screen)
+            EPDPacking.paste(screen, self.width, window, box_data)
+            self.__screen = bytes(screen)
+            self.__fingerprint = EPDPacking.fingerprint(self.__screen)
+        elif window == (0, 0, self.width, self.height) or fingerprint == self.__fingerprint:
+            # The device shows the whole frame.
+            self.__screen = data
+            self.__fingerprint = fingerprint
+        else:
+            # The pixels outside of the window are unknown.
+            self.__fingerprint = None
+
+    @EPDTracing.traced('Display.refresh', 'display')
+    def __refresh(self):
+        """
+        Refreshes the display with the transferred frame and waits for the end of the refresh, recording its times.
+        """
+        transferred = self.__interface.clock()
         self.__interface.send_command('DISPLAY_REFRESH')
+        refresh_started = self.__interface.clock()
         self.wait_until_idle()
+
+        self.__last_refresh = {
+            'transferred': transferred,
+            'refresh_started': refresh_started,
+            'refreshed': self.__interface.clock()
+        }
@@ -0,0 +1,606 @@
+import asyncio
+import collections
+import itertools
+import json
+import EPDClient
+import EPDPacking
+import EPDProtocol
+
+
+class EPDAsyncClient:
+    def __init__(self, socket_path='/var/run/epd.sock', hash_first=True, timeout=EPDClient.DEFAULT_TIMEOUT,
+                 reconnect=True):
+        """
+        Creates an EPDAsyncClient, the asyncio counterpart of EPDClient.EPDClient. Concurrent tasks can send requests
+        through the client: they are multiplexed over a single connection, a reader task dispatching the responses.
+        If the connection is lost, the reader task reconnects with a growing delay between attempts and restores the
+        priority class and the subscription, and the interrupted requests are sent again, the display commands being
+        idempotent. The client is bound to the event loop it connects in.
+
+        :param socket_path: The path of the service socket.
+        :type socket_path: str
+        :param hash_first: Sends the hash of the frames the client packs first, the frame itself being sent only if the
+        service has not cached it.
+        :type hash_first: bool
+        :param timeout: The deadline of each request, reconnection included, None to wait without limit (s).
+        :type timeout: float
+        :param reconnect: Reconnects when the connection is lost, the requests failing until connect is called
+        otherwise.
+        :type reconnect: bool
+        """
+        self.__socket_path = socket_path
+        self.__hash_first = hash_first
+        self.__timeout = timeout
+        self.__reconnect = reconnect
+        self.__last_update = None
+        self.__last_update_id = None
+        self.__request_ids = itertools.count()
+
+        # Connection, None while disconnected, and reader task, None once stopped. The condition is notified when
+        # they change and when an event arrives, it is created on connection.
+        self.__condition = None
+        self.__writer = None
+        self.__task = None
+        self.__closing = False
+
+        # Futures of the responses, by request ID.
+        self.__pending = {}
+
+        # Session restored after a reconnection: priority class and request ID of the subscribe request identifying
+        # the subscription's events, None if not subscribed.
+        self.__priority = None
+        self.__subscription = None
+
+        # Events not read yet: update events by update ID, the oldest ones being dropped, and subscription events.
+        self.__update_events = collections.OrderedDict()
+        self.__events = collections.deque(maxlen=EPDClient.MAX_EVENTS)
+
+    @property
+    def last_update(self) -> str:
+        """
+        Getter for the outcome of the last update command, from any task (see EPDClient.EPDClient.last_update).
+
+        :rtype str
+        """
+        return self.__last_update
+
+    @property
+    def last_update_id(self) -> int:
+        """
+        Getter for the ID the service gave to the last accepted update, identifying its events.
+
+        :rtype int
+        """
+        return self.__last_update_id
+
+    @property
+    def connected(self) -> bool:
+        """
+        Getter for the connection's state, False while reconnecting.
+
+        :rtype bool
+        """
+        return self.__writer is not None
+
+    async def connect(self):
+        """
+        Establishes a connection with the EPD service and starts the reader task. The client can connect again after a
+        disconnection.
+
+        :raise EPDClient.EPDClientConnectionException: Raised if the service does not speak the version 2 protocol.
+        :raise OSError: Raised if the service cannot be reached.
+        """
+        if self.__task is not None:
+            return
+
+        self.__condition = asyncio.Condition()
+        reader, self.__writer = await self.__open()
+        self.__closing = False
+        self.__task = asyncio.create_task(self.__read(reader))
+
+    async def disconnect(self):
+        """
+        Closes the connection and stops the reader task, the pending requests failing.
+        """
+        self.__closing = True
+        task = self.__task
+
+        if self.__writer is not None:
+            self.__writer.close()
+
+        if task is not None and task is not asyncio.current_task():
+            await task
+
+    async def __open(self) -> (asyncio.StreamReader, asyncio.StreamWriter):
+        """
+        Opens a connection and completes the handshake, within the request deadline.
+
+        :return The connection's reader and writer.
+        :rtype (asyncio.StreamReader, asyncio.StreamWriter)
+        :raise EPDClient.EPDClientConnectionException: Raised if the service does not speak the version 2 protocol.
+        :raise OSError: Raised if the service cannot be reached.
+        """
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.__socket_path), self.__timeout)
+
+        try:
+            # A version 1 service answers an error code to each byte of the handshake.
+            writer.write(EPDProtocol.handshake())
+            handshake = await asyncio.wait_for(reader.readexactly(len(EPDProtocol.handshake())), self.__timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exception:
+            writer.close()
+
+            raise ConnectionError('Handshake failed: ' + repr(exception))
+
+        if handshake != EPDProtocol.handshake():
+            writer.close()
+
+            raise EPDClient.EPDClientConnectionException('The service does not speak the protocol version ' +
+                                                         str(EPDProtocol.VERSION))
+
+        return reader, writer
+
+    async def __read(self, reader: asyncio.StreamReader):
+        """
+        Receives the messages and dispatches them until the client disconnects, reconnecting when the connection is
+        lost.
+
+        :param reader: The connection's reader.
+        :type reader: asyncio.StreamReader
+        """
+        while True:
+            try:
+                while True:
+                    payload_length, request_id, status = EPDProtocol.decode_header(
+                        await reader.readexactly(EPDProtocol.HEADER.size))
+                    await self.__dispatch(request_id, status, await reader.readexactly(payload_length))
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                pass
+
+            async with self.__condition:
+                self.__writer.close()
+                self.__writer = None
+
+                # The requests waiting for a response are sent again once reconnected.
+                for future in self.__pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError('Connection lost'))
+
+                self.__pending.clear()
+                self.__condition.notify_all()
+
+            reader = await self.__reopen()
+
+            if reader is None:
+                return
+
+    async def __reopen(self) -> asyncio.StreamReader:
+        """
+        Reconnects, waiting longer after each failed attempt, and restores the session.
+
+        :return The connection's reader, None if the client disconnects or does not reconnect.
+        :rtype asyncio.StreamReader
+        """
+        delay = EPDClient.RECONNECT_DELAY
+
+        while not self.__closing and self.__reconnect:
+            try:
+                reader, writer = await self.__open()
+            except (OSError, asyncio.TimeoutError, EPDClient.EPDClientConnectionException):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, EPDClient.MAX_RECONNECT_DELAY)
+
+                continue
+
+            if self.__closing:
+                writer.close()
+
+                break
+
+            # Nobody waits for the responses of the session requests, they are dropped.
+            session = []
+
+            if self.__priority is not None:
+                session.append((next(self.__request_ids) & 0xFFFFFFFF, EPDProtocol.PRIORITY, bytes([self.__priority])))
+
+            if self.__subscription is not None:
+                self.__subscription = next(self.__request_ids) & 0xFFFFFFFF
+                session.append((self.__subscription, EPDProtocol.SUBSCRIBE, b'\x01'))
+
+            writer.write(b''.join(EPDProtocol.encode_message(*message) for message in session))
+
+            async with self.__condition:
+                self.__writer = writer
+                self.__condition.notify_all()
+
+            return reader
+
+        async with self.__condition:
+            self.__task = None
+            self.__condition.notify_all()
+
+        return None
+
+    async def __dispatch(self, request_id: int, status: int, payload: bytes):
+        """
+        Hands a message over to the task waiting for it, or keeps it as an event.
+
+        :param request_id: The request ID of the message.
+        :type request_id: int
+        :param status: The status of the message.
+        :type status: int
+        :param payload: The payload of the message.
+        :type payload: bytes
+        """
+        if status != EPDProtocol.EVENT:
+            future = self.__pending.pop(request_id, None)
+
+            # The requester may have given up already.
+            if future is not None and not future.done():
+                future.set_result((status, payload))
+
+            return
+
+        event = json.loads(payload.decode())
+
+        if request_id == self.__subscription:
+            self.__events.append(event)
+        elif event['event'] == 'update':
+            self.__update_events[event['update']] = event
+
+            while len(self.__update_events) > EPDClient.MAX_UPDATE_EVENTS:
+                self.__update_events.popitem(last=False)
+
+        async with self.__condition:
+            self.__condition.notify_all()
+
+    async def pipeline(self, requests: list, timeout=None) -> list:
+        """
+        Sends requests in a single write, then waits for their responses. The service starts them in order and
+        answers each one as soon as it is done. Other tasks may send requests meanwhile.
+
+        :param requests: The requests, as (opcode, payload) tuples (see EPDProtocol).
+        :type requests: list
+        :param timeout: The deadline of the requests, default is the client's (s).
+        :type timeout: float
+        :return The responses, as (status, payload) tuples, in the order of the requests.
+        :rtype list
+        :raise EPDClient.EPDClientConnectionException: Raised if the client is not connected.
+        :raise EPDClient.EPDClientTimeoutException: Raised if the responses do not arrive before the deadline.
+        """
+        try:
+            return await asyncio.wait_for(self.__pipeline(requests), self.__timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise EPDClient.EPDClientTimeoutException('No response from the service before the deadline')
+
+    async def __pipeline(self, requests: list) -> list:
+        """
+        Sends requests in a single write and waits for their responses, waiting for the connection if the client is
+        reconnecting, and sending them again if the connection is lost meanwhile. The session requests are recorded,
+        to be restored after a reconnection.
+
+        :param requests: The requests, as (opcode, payload) tuples.
+        :type requests: list
+        :return The responses, as (status, payload) tuples.
+        :rtype list
+        :raise EPDClient.EPDClientConnectionException: Raised if the client is not connected.
+        """
+        while True:
+            async with self.__condition:
+                await self.__condition.wait_for(lambda: self.__writer is not None or self.__task is None)
+
+                if self.__writer is None:
+                    raise EPDClient.EPDClientConnectionException('Client not connected')
+
+                writer = self.__writer
+
+            loop = asyncio.get_running_loop()
+            request_ids = [next(self.__request_ids) & 0xFFFFFFFF for _ in requests]
+            futures = [loop.create_future() for _ in requests]
+            self.__pending.update(zip(request_ids, futures))
+
+            for request_id, (opcode, payload) in zip(request_ids, requests):
+                if opcode == EPDProtocol.PRIORITY:
+                    self.__priority = payload[0]
+                elif opcode == EPDProtocol.SUBSCRIBE:
+                    self.__subscription = request_id if payload == b'\x01' else None
+
+            try:
+                writer.write(b''.join(EPDProtocol.encode_message(request_id, opcode, payload)
+                                      for request_id, (opcode, payload) in zip(request_ids, requests)))
+                await writer.drain()
+
+                return list(await asyncio.gather(*futures))
+            except OSError:
+                if not self.__reconnect:
+                    raise EPDClient.EPDClientConnectionException('Connection lost')
+
+                # The reader task notices the lost connection as well.
+                async with self.__condition:
+                    await self.__condition.wait_for(lambda: self.__writer is not writer)
+            finally:
+                for request_id, future in zip(request_ids, futures):
+                    self.__pending.pop(request_id, None)
+
+                    # Failures of responses nobody waited for are not reported.
+                    if not future.cancel() and not future.cancelled():
+                        future.exception()
+
+    async def __request(self, opcode: int, payload=b'') -> bytes:
+        """
+        Sends a request and waits for its response.
+
+        :param opcode: The opcode.
+        :type opcode: int
+        :param payload: The payload.
+        :type payload: bytes
+        :return The payload of the response.
+        :rtype bytes
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        status, payload = (await self.pipeline([(opcode, payload)]))[0]
+        EPDClient.check_status(status, payload)
+
+        return payload
+
+    async def __wait_for(self, predicate, timeout) -> bool:
+        """
+        Waits for the events or the connection to reach a state.
+
+        :param predicate: Tells whether the state is reached.
+        :param timeout: The maximum waiting time, None to wait without limit (s).
+        :type timeout: float
+        :return False if the state is not reached before the timeout, True otherwise.
+        :rtype bool
+        :raise EPDClient.EPDClientConnectionException: Raised if the client is not connected.
+        """
+        async with self.__condition:
+            try:
+                await asyncio.wait_for(self.__condition.wait_for(lambda: predicate() or self.__task is None), timeout)
+            except asyncio.TimeoutError:
+                return False
+
+            if not predicate():
+                raise EPDClient.EPDClientConnectionException('Client not connected')
+
+            return True
+
+    async def init(self):
+        """
+        Sends the init request to the service.
+
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        await self.__request(EPDProtocol.INIT)
+
+    async def update(self, force=False, image=None) -> bool:
+        """
+        Sends the update request to the service (see EPDClient.EPDClient.update).
+
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDClient.EPDServiceException: Raised if another error status is returned.
+        """
+        return (await self.__update(None, force, image))[0] == 'updated'
+
+    async def update_boxes(self, boxes: list, image=None) -> bool:
+        """
+        Sends a partial update request to the service (see EPDClient.EPDClient.update_boxes).
+
+        :param boxes: The boxes to refresh, as left, top, right (excluded) and bottom (excluded).
+        :type boxes: list
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :return False if the boxes were unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise ValueError: Raised if no box or more than 65535 boxes are given.
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDClient.EPDServiceException: Raised if another error status is returned.
+        """
+        if not boxes:
+            raise ValueError('At least one box has to be refreshed')
+
+        return (await self.__update(boxes, False, image))[0] == 'updated'
+
+    async def refresh(self, image=None, boxes=None, force=False) -> bool:
+        """
+        Wakes the display up, updates it and powers it off (see EPDClient.EPDClient.refresh).
+
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDClient.EPDServiceException: Raised if another error status is returned.
+        """
+        return (await self.__update(boxes, force, image, [(EPDProtocol.INIT, b'')],
+                                    [(EPDProtocol.SLEEP, b'')]))[0] == 'updated'
+
+    async def display(self, image=None, boxes=None, force=False) -> bool:
+        """
+        Sends the display request to the service (see EPDClient.EPDClient.display).
+
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDClient.EPDServiceException: Raised if another error status is returned.
+        """
+        return (await self.__update(boxes, force, image, opcode=EPDProtocol.DISPLAY))[0] == 'updated'
+
+    async def display_nowait(self, image=None, boxes=None, force=False) -> int:
+        """
+        Sends the display request to the service, the service answering as soon as the update is queued (see
+        EPDClient.EPDClient.display_nowait).
+
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return The ID of the update.
+        :rtype int
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        payload = (await self.__update(boxes, force, image, opcode=EPDProtocol.DISPLAY, nowait=True))[1]
+        update_id = EPDProtocol.UPDATE_ID.unpack(payload)[0]
+        self.__last_update_id = update_id
+
+        return update_id
+
+    async def wait(self, update_id: int, timeout=None) -> dict:
+        """
+        Waits for the event of an update sent without waiting (see EPDClient.EPDClient.wait).
+
+        :param update_id: The ID of the update.
+        :type update_id: int
+        :param timeout: The maximum waiting time, None to wait without limit (s).
+        :type timeout: float
+        :return The update event, None if the update is not done before the timeout.
+        :rtype dict
+        :raise EPDClient.EPDClientConnectionException: Raised if the client is not connected.
+        """
+        if not await self.__wait_for(lambda: update_id in self.__update_events, timeout):
+            return None
+
+        return self.__update_events.pop(update_id)
+
+    async def subscribe(self):
+        """
+        Subscribes to the events of the service (see EPDClient.EPDClient.subscribe).
+
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        await self.__request(EPDProtocol.SUBSCRIBE, b'\x01')
+
+    async def unsubscribe(self):
+        """
+        Unsubscribes from the events of the service, the events not read yet being dropped.
+
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        await self.__request(EPDProtocol.SUBSCRIBE, b'\x00')
+        self.__events.clear()
+
+    async def next_event(self, timeout=None) -> dict:
+        """
+        Waits for the next event of the subscription.
+
+        :param timeout: The maximum waiting time, None to wait without limit (s).
+        :type timeout: float
+        :return The event, None if no event arrives before the timeout.
+        :rtype dict
+        :raise EPDClient.EPDClientConnectionException: Raised if the client is not connected.
+        """
+        if not await self.__wait_for(lambda: len(self.__events) > 0, timeout):
+            return None
+
+        return self.__events.popleft()
+
+    async def __update(self, boxes: list, force: bool, image, before=(), after=(), opcode=EPDProtocol.UPDATE,
+                       nowait=False) -> (str, bytes):
+        """
+        Sends an update request, pipelined between other requests, the frame being sent as its hash first if
+        hash_first is set (see EPDClient.EPDClient).
+
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display even if it already shows the frame.
+        :type force: bool
+        :param image: The frame (see EPDClient.EPDClient.update).
+        :param before: The requests sent before the update, as (opcode, payload) tuples.
+        :type before: list
+        :param after: The requests sent after the update, as (opcode, payload) tuples.
+        :type after: list
+        :param opcode: The opcode of the update, UPDATE or DISPLAY.
+        :type opcode: int
+        :param nowait: Asks the service to answer as soon as the update is queued.
+        :type nowait: bool
+        :return The outcome of the update (see last_update) and the payload of its response.
+        :rtype (str, bytes)
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDClient.EPDServiceException: Raised if another error status is returned.
+        """
+        before = list(before)
+        after = list(after)
+        frame = EPDClient.hashable_frame(image) if self.__hash_first else None
+
+        if frame is not None:
+            frame_hash = bytes.fromhex(EPDPacking.fingerprint(frame.data))
+            responses = await self.pipeline(before + [
+                (opcode, EPDProtocol.encode_update(boxes, force, EPDProtocol.FORMAT_HASH, frame_hash, nowait))
+            ])
+
+            if responses[-1][0] == EPDProtocol.NOT_CACHED:
+                after.insert(0, (opcode, EPDClient.update_payload(boxes, force, frame, nowait)))
+                responses.pop()
+
+            if after:
+                responses += await self.pipeline(after)
+        else:
+            responses = await self.pipeline(before + [(opcode, EPDClient.update_payload(boxes, force, image, nowait))] +
+                                            after)
+
+        for response in responses[:len(before)]:
+            EPDClient.check_status(*response)
+
+        self.__last_update = None
+        outcome = EPDClient.update_outcome(*responses[len(before)])
+        self.__last_update = outcome
+
+        for response in responses[len(before) + 1:]:
+            EPDClient.check_status(*response)
+
+        return outcome, responses[len(before)][1]
+
+    async def sleep(self):
+        """
+        Sends the sleep request to the service.
+
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        await self.__request(EPDProtocol.SLEEP)
+
+    async def set_priority(self, priority: int):
+        """
+        Sets the priority class of the connection's next requests, restored after a reconnection (see
+        EPDClient.EPDClient.set_priority).
+
+        :param priority: The priority class, EPDClient.PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+        :type priority: int
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        await self.__request(EPDProtocol.PRIORITY, bytes([priority]))
+
+    async def status(self) -> dict:
+        """
+        Sends the status request to the service, answered even while the display refreshes.
+
+        :return The service's state (see EPD_service.EPDService.status).
+        :rtype dict
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        return json.loads((await self.__request(EPDProtocol.STATUS)).decode())
+
+    async def stats(self) -> dict:
+        """
+        Sends the stats request to the service, answered even while the display refreshes.
+
+        :return The metrics (see EPD_service.EPDService.stats).
+        :rtype dict
+        :raise EPDClient.EPDServiceException: Raised if an error status is returned.
+        """
+        return json.loads((await self.__request(EPDProtocol.STATS)).decode())
@@ -1,99 +1,825 @@
+import collections
+import concurrent.futures
+import itertools
+import json
 import socket
+import threading
+import time
 import EPDExceptions
+import EPDFrameRing
+import EPDPacking
+import EPDProtocol
+
+# Priority classes of the service's operations (see set_priority).
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Events kept until read: events of the subscription, and update events of the updates not waited for yet.
+MAX_EVENTS = 1024
+MAX_UPDATE_EVENTS = 64
+
+# Default deadline of a request, long enough for a queued update and a full refresh (s).
+DEFAULT_TIMEOUT = 60
+
+# Delay before the first reconnection attempt, doubled after each failure up to the maximum (s).
+RECONNECT_DELAY = 0.1
+MAX_RECONNECT_DELAY = 5
 
 
 class EPDClientConnectionException(Exception):
     pass
 
 
+class EPDClientTimeoutException(EPDClientConnectionException):
+    pass
+
+
+class EPDServiceException(Exception):
+    pass
+
+
+def check_status(status: int, payload: bytes):
+    """
+    Raises the exception matching an error status.
+
+    :param status: The status of a response.
+    :type status: int
+    :param payload: The payload of the response, the message for errors.
+    :type payload: bytes
+    :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+    :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+    :raise EPDServiceException: Raised for the other error statuses.
+    """
+    if status == EPDProtocol.FRAME_ERROR:
+        raise EPDExceptions.InvalidFrameException(payload.decode())
+    elif status == EPDProtocol.SLEEPING:
+        raise EPDExceptions.InvalidDisplayStatusException(payload.decode())
+    elif status not in (EPDProtocol.OK, EPDProtocol.UNCHANGED, EPDProtocol.SUPERSEDED, EPDProtocol.ACCEPTED):
+        raise EPDServiceException(payload.decode() or 'Error status ' + str(status))
+
+
+def update_outcome(status: int, payload: bytes) -> str:
+    """
+    Checks the response to an update request.
+
+    :param status: The status of the response.
+    :type status: int
+    :param payload: The payload of the response.
+    :type payload: bytes
+    :return The outcome of the update (see EPDClient.last_update).
+    :rtype str
+    :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+    :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+    :raise EPDServiceException: Raised if another error status is returned.
+    """
+    check_status(status, payload)
+
+    if status == EPDProtocol.UNCHANGED:
+        return 'unchanged'
+    elif status == EPDProtocol.SUPERSEDED:
+        return 'superseded'
+    elif status == EPDProtocol.ACCEPTED:
+        return 'accepted'
+
+    return 'updated'
+
+
+def update_payload(boxes=None, force=False, image=None, nowait=False) -> bytes:
+    """
+    Encodes the payload of an update request.
+
+    :param boxes: The boxes to refresh, None to refresh the whole display.
+    :type boxes: list
+    :param force: Refreshes the whole display even if it already shows the frame.
+    :type force: bool
+    :param image: The frame: a PIL image or an EPDPacking.PackedFrame, sent as a raw frame, the bytes of a raw frame or
+    of an image file, or the EPDFrameRing.FrameSlot of a frame written to the service's frame ring. None for the
+    service to read its frame file.
+    :param nowait: Asks the service to answer as soon as the update is queued.
+    :type nowait: bool
+    :return The payload.
+    :rtype bytes
+    """
+    if image is None:
+        return EPDProtocol.encode_update(boxes, force, nowait=nowait)
+
+    if isinstance(image, EPDFrameRing.FrameSlot):
+        return EPDProtocol.encode_update(boxes, force, EPDProtocol.FORMAT_SLOT, EPDProtocol.SLOT.pack(*image), nowait)
+
+    if isinstance(image, bytes):
+        frame_format = EPDProtocol.FORMAT_RAW if image.startswith(EPDPacking.PackedFrame.MAGIC) else \
+            EPDProtocol.FORMAT_IMAGE
+
+        return EPDProtocol.encode_update(boxes, force, frame_format, image, nowait)
+
+    if not isinstance(image, EPDPacking.PackedFrame):
+        image = EPDPacking.PackedFrame.from_image(image)
+
+    return EPDProtocol.encode_update(boxes, force, EPDProtocol.FORMAT_RAW, image.encode(), nowait)
+
+
+def hashable_frame(image) -> EPDPacking.PackedFrame:
+    """
+    Packs a frame the client can send as its hash first: a PIL image or an EPDPacking.PackedFrame.
+
+    :param image: The frame (see update_payload).
+    :return The packed frame, None if the frame is sent as it is.
+    :rtype EPDPacking.PackedFrame
+    """
+    if image is None or isinstance(image, (bytes, EPDFrameRing.FrameSlot)):
+        return None
+
+    if not isinstance(image, EPDPacking.PackedFrame):
+        image = EPDPacking.PackedFrame.from_image(image)
+
+    return image
+
+
 class EPDClient:
-    def __init__(self):
+    def __init__(self, socket_path='/var/run/epd.sock', hash_first=True, timeout=DEFAULT_TIMEOUT, reconnect=True):
+        """
+        Creates an EPDClient. The EPD client will communicate with the EPD service trought the socket, with the version
+        2 protocol (see EPDProtocol). The client can be shared between threads: their requests are multiplexed over a
+        single connection, a reader thread dispatching the responses. If the connection is lost, the reader thread
+        reconnects with a growing delay between attempts and restores the priority class and the subscription, and
+        the interrupted requests are sent again, the display commands being idempotent.
+
+        :param socket_path: The path of the service socket.
+        :type socket_path: str
+        :param hash_first: Sends the hash of the frames the client packs first, the frame itself being sent only if the
+        service has not cached it.
+        :type hash_first: bool
+        :param timeout: The deadline of each request, reconnection included, None to wait without limit (s).
+        :type timeout: float
+        :param reconnect: Reconnects when the connection is lost, the requests failing until connect is called
+        otherwise.
+        :type reconnect: bool
+        """
+        self.__socket_path = socket_path
+        self.__hash_first = hash_first
+        self.__timeout = timeout
+        self.__reconnect = reconnect
+        self.__last_update = None
+        self.__last_update_id = None
+        self.__request_ids = itertools.count()
+
+        # Connection, None while disconnected, and reader thread, None once stopped. The condition guards them along
+        # with the pending requests and the events, and is notified when they change.
+        self.__condition = threading.Condition()
+        self.__socket = None
+        self.__reader = None
+        self.__closing = False
+
+        # Messages are written whole, one thread at a time.
+        self.__send_lock = threading.Lock()
+
+        # Futures of the responses, by request ID.
+        self.__pending = {}
+
+        # Session restored after a reconnection: priority class and request ID of the subscribe request identifying
+        # the subscription's events, None if not subscribed.
+        self.__priority = None
+        self.__subscription = None
+
+        # Events not read yet: update events by update ID, the oldest ones being dropped, and subscription events.
+        self.__update_events = collections.OrderedDict()
+        self.__events = collections.deque(maxlen=MAX_EVENTS)
+
+    @property
+    def last_update(self) -> str:
+        """
+        Getter for the outcome of the last update command, from any thread: 'updated', 'unchanged' if the display
+        already showed the frame, 'superseded' if a newer update from another client displays the frame instead, or
+        'accepted' if the update was queued without waiting for it (see display_nowait).
+
+        :rtype str
         """
-        Creates an EPDClient. The EPD client will communicate with the EPD service trought the socket.
+        return self.__last_update
+
+    @property
+    def last_update_id(self) -> int:
+        """
+        Getter for the ID the service gave to the last accepted update, identifying its events.
+
+        :rtype int
         """
-        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self.__connected = False
+        return self.__last_update_id
 
     @property
     def connected(self) -> bool:
         """
-        Getter for the connection's state. This property is kinda artificial as it is set only on connect/disconnect calls or if a timeout is caught, it do not rely on an actual connection information.
+        Getter for the connection's state, False while reconnecting.
 
         :rtype bool
         """
-        return self.__connected
+        return self.__socket is not None
 
     def connect(self):
         """
-        Etablishes a connection with the EPD service.
+        Establishes a connection with the EPD service and starts the reader thread. The client can connect again after
+        a disconnection.
+
+        :raise EPDClientConnectionException: Raised if the service does not speak the version 2 protocol.
+        :raise OSError: Raised if the service cannot be reached.
         """
-        self.__socket.connect('/var/run/epd.sock')
-        self.__connected = True
+        with self.__condition:
+            if self.__reader is not None:
+                return
+
+            self.__socket = self.__open()
+            self.__closing = False
+            self.__reader = threading.Thread(target=self.__read, name='EPDClient', daemon=True)
+            self.__reader.start()
 
     def disconnect(self):
         """
-        Closes the connection.
+        Closes the connection and stops the reader thread, the pending requests failing.
+        """
+        with self.__condition:
+            self.__closing = True
+            reader = self.__reader
+
+            if self.__socket is not None:
+                try:
+                    self.__socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+            self.__condition.notify_all()
+
+        if reader is not None and reader is not threading.current_thread():
+            reader.join()
+
+    def __open(self) -> socket.socket:
+        """
+        Opens a connection and completes the handshake, within the request deadline.
+
+        :return The connected socket.
+        :rtype socket.socket
+        :raise EPDClientConnectionException: Raised if the service does not speak the version 2 protocol.
+        :raise OSError: Raised if the service cannot be reached.
         """
-        self.__socket.close()
-        self.__connected = False
+        epd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            epd_socket.settimeout(self.__timeout)
+            epd_socket.connect(self.__socket_path)
+
+            # A version 1 service answers an error code to each byte of the handshake.
+            epd_socket.sendall(EPDProtocol.handshake())
+            handshake = self.__receive(epd_socket, len(EPDProtocol.handshake()))
+            epd_socket.settimeout(None)
+        except OSError:
+            epd_socket.close()
+
+            raise
 
-    def __send(self, data: bytes) -> bytes:
+        if handshake != EPDProtocol.handshake():
+            epd_socket.close()
+
+            raise EPDClientConnectionException('The service does not speak the protocol version ' +
+                                               str(EPDProtocol.VERSION))
+
+        return epd_socket
+
+    @staticmethod
+    def __receive(epd_socket: socket.socket, size: int) -> bytes:
         """
-        Sends data throught the socket and waits for a response.
+        Receives exactly size bytes.
 
-        :param data: The data to send.
-        :type data: bytes
+        :param epd_socket: The connected socket.
+        :type epd_socket: socket.socket
+        :param size: The number of bytes to receive.
+        :type size: int
         :return The data received.
         :rtype bytes
+        :raise OSError: Raised if the connection is closed before all the data is received.
+        """
+        data = b''
+
+        while len(data) < size:
+            chunk = epd_socket.recv(size - len(data))
+
+            if not chunk:
+                raise ConnectionError('Connection closed by the service')
+
+            data += chunk
+
+        return data
+
+    def __read(self):
+        """
+        Receives the messages and dispatches them until the client disconnects, reconnecting when the connection is
+        lost.
+        """
+        epd_socket = self.__socket
+
+        while True:
+            try:
+                while True:
+                    payload_length, request_id, status = EPDProtocol.decode_header(
+                        self.__receive(epd_socket, EPDProtocol.HEADER.size))
+                    self.__dispatch(request_id, status, self.__receive(epd_socket, payload_length))
+            except (OSError, ValueError):
+                pass
+
+            epd_socket.close()
+
+            with self.__condition:
+                self.__socket = None
+
+                # The requests waiting for a response are sent again once reconnected.
+                for future in self.__pending.values():
+                    future.set_exception(ConnectionError('Connection lost'))
+
+                self.__pending.clear()
+
+            epd_socket = self.__reopen()
+
+            if epd_socket is None:
+                return
+
+    def __reopen(self) -> socket.socket:
+        """
+        Reconnects, waiting longer after each failed attempt, and restores the session.
+
+        :return The connected socket, None if the client disconnects or does not reconnect.
+        :rtype socket.socket
+        """
+        delay = RECONNECT_DELAY
+
+        while True:
+            with self.__condition:
+                if self.__closing or not self.__reconnect:
+                    self.__reader = None
+                    self.__condition.notify_all()
+
+                    return None
+
+            try:
+                epd_socket = self.__open()
+            except (OSError, EPDClientConnectionException):
+                with self.__condition:
+                    self.__condition.wait_for(lambda: self.__closing, delay)
+
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+                continue
+
+            with self.__condition:
+                if self.__closing:
+                    epd_socket.close()
+
+                    continue
+
+                # Nobody waits for the responses of the session requests, they are dropped.
+                session = []
+
+                if self.__priority is not None:
+                    session.append((next(self.__request_ids) & 0xFFFFFFFF, EPDProtocol.PRIORITY,
+                                    bytes([self.__priority])))
+
+                if self.__subscription is not None:
+                    self.__subscription = next(self.__request_ids) & 0xFFFFFFFF
+                    session.append((self.__subscription, EPDProtocol.SUBSCRIBE, b'\x01'))
+
+                try:
+                    epd_socket.sendall(b''.join(EPDProtocol.encode_message(*message) for message in session))
+                except OSError:
+                    epd_socket.close()
+
+                    continue
+
+                self.__socket = epd_socket
+                self.__condition.notify_all()
+
+            return epd_socket
+
+    def __dispatch(self, request_id: int, status: int, payload: bytes):
+        """
+        Hands a message over to the thread waiting for it, or keeps it as an event.
+
+        :param request_id: The request ID of the message.
+        :type request_id: int
+        :param status: The status of the message.
+        :type status: int
+        :param payload: The payload of the message.
+        :type payload: bytes
+        """
+        with self.__condition:
+            if status != EPDProtocol.EVENT:
+                future = self.__pending.pop(request_id, None)
+
+                # The requester may have given up already.
+                if future is not None:
+                    future.set_result((status, payload))
+
+                return
+
+            event = json.loads(payload.decode())
+
+            if request_id == self.__subscription:
+                self.__events.append(event)
+            elif event['event'] == 'update':
+                self.__update_events[event['update']] = event
+
+                while len(self.__update_events) > MAX_UPDATE_EVENTS:
+                    self.__update_events.popitem(last=False)
+
+            self.__condition.notify_all()
+
+    @staticmethod
+    def __deadline(timeout) -> float:
+        """
+        Computes a deadline.
+
+        :param timeout: The maximum waiting time, None for no limit (s).
+        :type timeout: float
+        :return The deadline on the monotonic clock, None for no limit.
+        :rtype float
+        """
+        return None if timeout is None else time.monotonic() + timeout
+
+    @staticmethod
+    def __remaining(deadline: float) -> float:
+        """
+        Computes the time left before a deadline.
+
+        :param deadline: The deadline on the monotonic clock, None for no limit.
+        :type deadline: float
+        :return The time left, None for no limit (s).
+        :rtype float
+        """
+        return None if deadline is None else max(0, deadline - time.monotonic())
+
+    def pipeline(self, requests: list, timeout=None) -> list:
+        """
+        Sends requests in a single write, then waits for their responses. The service starts them in order and
+        answers each one as soon as it is done. Other threads may send requests meanwhile.
+
+        :param requests: The requests, as (opcode, payload) tuples (see EPDProtocol).
+        :type requests: list
+        :param timeout: The deadline of the requests, default is the client's (s).
+        :type timeout: float
+        :return The responses, as (status, payload) tuples, in the order of the requests.
+        :rtype list
         :raise EPDClientConnectionException: Raised if the client is not connected.
-        :raise OSError: Raised if an error occured during transmittion.
+        :raise EPDClientTimeoutException: Raised if the responses do not arrive before the deadline.
         """
-        if not self.connected:
-            raise EPDClientConnectionException('Client not connected')
+        deadline = self.__deadline(self.__timeout if timeout is None else timeout)
 
-        try:
-            self.__socket.send(data)
-            return self.__socket.recv(1)
-        except OSError as exception:
-            self.__connected = False
+        while True:
+            request_ids, futures = self.__send(requests, deadline)
+
+            try:
+                return [future.result(self.__remaining(deadline)) for future in futures]
+            except concurrent.futures.TimeoutError:
+                with self.__condition:
+                    for request_id in request_ids:
+                        self.__pending.pop(request_id, None)
+
+                raise EPDClientTimeoutException('No response from the service before the deadline')
+            except ConnectionError:
+                if not self.__reconnect:
+                    raise EPDClientConnectionException('Connection lost')
 
-            raise exception
+    def __send(self, requests: list, deadline: float) -> (list, list):
+        """
+        Sends requests in a single write, waiting for the connection if the client is reconnecting. The session
+        requests are recorded, to be restored after a reconnection.
+
+        :param requests: The requests, as (opcode, payload) tuples.
+        :type requests: list
+        :param deadline: The deadline on the monotonic clock, None for no limit.
+        :type deadline: float
+        :return The request IDs and the futures of the responses.
+        :rtype (list, list)
+        :raise EPDClientConnectionException: Raised if the client is not connected.
+        :raise EPDClientTimeoutException: Raised if the client is not reconnected before the deadline.
+        """
+        while True:
+            with self.__condition:
+                while self.__socket is None:
+                    if self.__reader is None:
+                        raise EPDClientConnectionException('Client not connected')
+
+                    if not self.__condition.wait(self.__remaining(deadline)):
+                        raise EPDClientTimeoutException('Service unreachable before the deadline')
+
+                epd_socket = self.__socket
+                request_ids = [next(self.__request_ids) & 0xFFFFFFFF for _ in requests]
+                futures = [concurrent.futures.Future() for _ in requests]
+                self.__pending.update(zip(request_ids, futures))
+
+                for request_id, (opcode, payload) in zip(request_ids, requests):
+                    if opcode == EPDProtocol.PRIORITY:
+                        self.__priority = payload[0]
+                    elif opcode == EPDProtocol.SUBSCRIBE:
+                        self.__subscription = request_id if payload == b'\x01' else None
+
+            try:
+                with self.__send_lock:
+                    epd_socket.sendall(b''.join(EPDProtocol.encode_message(request_id, opcode, payload)
+                                                for request_id, (opcode, payload) in zip(request_ids, requests)))
+
+                return request_ids, futures
+            except OSError:
+                with self.__condition:
+                    for request_id in request_ids:
+                        self.__pending.pop(request_id, None)
+
+                    if not self.__reconnect:
+                        raise EPDClientConnectionException('Connection lost')
+
+                    # The reader thread notices the lost connection as well.
+                    if self.__socket is epd_socket and not self.__condition.wait(self.__remaining(deadline)):
+                        raise EPDClientTimeoutException('Service unreachable before the deadline')
+
+    def __request(self, opcode: int, payload=b'') -> bytes:
+        """
+        Sends a request and waits for its response.
+
+        :param opcode: The opcode.
+        :type opcode: int
+        :param payload: The payload.
+        :type payload: bytes
+        :return The payload of the response.
+        :rtype bytes
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        status, payload = self.pipeline([(opcode, payload)])[0]
+        check_status(status, payload)
+
+        return payload
 
     def init(self):
         """
-        Sends the init command to the service.
+        Sends the init request to the service.
+
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        self.__request(EPDProtocol.INIT)
+
+    def update(self, force=False, image=None) -> bool:
+        """
+        Sends the update request to the service. The service skips the update if the display already shows the frame.
+
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame, to clear
+        ghosting.
+        :type force: bool
+        :param image: The frame sent with the request: a PIL image, an EPDPacking.PackedFrame, the bytes of a raw frame
+        or of an image file, or an EPDFrameRing.FrameSlot. None for the service to read its frame file.
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDServiceException: Raised if another error status is returned.
+        """
+        return self.__update(None, force, image)[0] == 'updated'
 
-        :raise Exception: The exception is raised if an error code is returned.
+    def update_boxes(self, boxes: list, image=None) -> bool:
         """
-        result = self.__send(b'0')
+        Sends a partial update request to the service. Only the given boxes of the frame are refreshed.
 
-        if result != b'0':
-            raise Exception
+        :param boxes: The boxes to refresh, as left, top, right (excluded) and bottom (excluded), in the frame's
+        coordinates.
+        :type boxes: list
+        :param image: The frame sent with the request: a PIL image, an EPDPacking.PackedFrame, the bytes of a raw frame
+        or of an image file, or an EPDFrameRing.FrameSlot. None for the service to read its frame file.
+        :return False if the boxes were unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise ValueError: Raised if no box or more than 65535 boxes are given.
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDServiceException: Raised if another error status is returned.
+        """
+        if not boxes:
+            raise ValueError('At least one box has to be refreshed')
 
-    def update(self):
+        return self.__update(boxes, False, image)[0] == 'updated'
+
+    def refresh(self, image=None, boxes=None, force=False) -> bool:
         """
-        Sends the update command to the service.
+        Wakes the display up, updates it and powers it off, the three requests being sent in a single write (two if the
+        service asks for a frame sent as its hash).
 
+        :param image: The frame sent with the request: a PIL image, an EPDPacking.PackedFrame, the bytes of a raw frame
+        or of an image file, or an EPDFrameRing.FrameSlot. None for the service to read its frame file.
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
         :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
         :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
-        :raise Exception: The exception is raised if an unhandled error code is returned.
+        :raise EPDServiceException: Raised if another error status is returned.
         """
-        result = self.__send(b'1')
+        return self.__update(boxes, force, image, [(EPDProtocol.INIT, b'')],
+                             [(EPDProtocol.SLEEP, b'')])[0] == 'updated'
 
-        if result == b'2':
-            raise EPDExceptions.InvalidFrameException
-        elif result == b'3':
-            raise EPDExceptions.InvalidDisplayStatusException
-        elif result != b'0':
-            raise Exception
+    def display(self, image=None, boxes=None, force=False) -> bool:
+        """
+        Sends the display request to the service: a single request replacing init, update and sleep. The service wakes
+        the display up if needed, by powering it on rather than resetting it when it can, and lowers its power once it
+        stays idle. An unchanged frame does not wake the display.
+
+        :param image: The frame sent with the request: a PIL image, an EPDPacking.PackedFrame, the bytes of a raw frame
+        or of an image file, or an EPDFrameRing.FrameSlot. None for the service to read its frame file.
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return False if the frame was unchanged or superseded (see last_update), True otherwise.
+        :rtype bool
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDServiceException: Raised if another error status is returned.
+        """
+        return self.__update(boxes, force, image, opcode=EPDProtocol.DISPLAY)[0] == 'updated'
+
+    def display_nowait(self, image=None, boxes=None, force=False) -> int:
+        """
+        Sends the display request to the service (see display), the service answering as soon as the update is queued.
+        Its update event follows once it is done (see wait).
+
+        :param image: The frame (see display).
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+        :type force: bool
+        :return The ID of the update.
+        :rtype int
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        payload = self.__update(boxes, force, image, opcode=EPDProtocol.DISPLAY, nowait=True)[1]
+        update_id = EPDProtocol.UPDATE_ID.unpack(payload)[0]
+        self.__last_update_id = update_id
+
+        return update_id
+
+    def wait(self, update_id: int, timeout=None) -> dict:
+        """
+        Waits for the event of an update sent without waiting (see display_nowait). Only the events of the last
+        MAX_UPDATE_EVENTS updates are kept until they are waited for, and the events of the updates interrupted by a
+        lost connection never arrive.
+
+        :param update_id: The ID of the update.
+        :type update_id: int
+        :param timeout: The maximum waiting time, None to wait without limit (s).
+        :type timeout: float
+        :return The update event: the update's ID, status (see EPDProtocol), message and timings, None if the update
+        is not done before the timeout.
+        :rtype dict
+        :raise EPDClientConnectionException: Raised if the client is not connected.
+        """
+        deadline = self.__deadline(timeout)
+
+        with self.__condition:
+            while update_id not in self.__update_events:
+                if self.__reader is None:
+                    raise EPDClientConnectionException('Client not connected')
+
+                if not self.__condition.wait(self.__remaining(deadline)):
+                    return None
+
+            return self.__update_events.pop(update_id)
+
+    def subscribe(self):
+        """
+        Subscribes to the events of the service: queued updates, update events of all the clients and power state
+        changes (see EPDProtocol and next_event). Only the last MAX_EVENTS events are kept until they are read.
+
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        self.__request(EPDProtocol.SUBSCRIBE, b'\x01')
+
+    def unsubscribe(self):
+        """
+        Unsubscribes from the events of the service, the events not read yet being dropped.
+
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        self.__request(EPDProtocol.SUBSCRIBE, b'\x00')
+
+        with self.__condition:
+            self.__events.clear()
+
+    def next_event(self, timeout=None) -> dict:
+        """
+        Waits for the next event of the subscription (see subscribe).
+
+        :param timeout: The maximum waiting time, None to wait without limit (s).
+        :type timeout: float
+        :return The event, None if no event arrives before the timeout.
+        :rtype dict
+        :raise EPDClientConnectionException: Raised if the client is not connected.
+        """
+        deadline = self.__deadline(timeout)
+
+        with self.__condition:
+            while not self.__events:
+                if self.__reader is None:
+                    raise EPDClientConnectionException('Client not connected')
+
+                if not self.__condition.wait(self.__remaining(deadline)):
+                    return None
+
+            return self.__events.popleft()
+
+    def __update(self, boxes: list, force: bool, image, before=(), after=(), opcode=EPDProtocol.UPDATE,
+                 nowait=False) -> (str, bytes):
+        """
+        Sends an update request, pipelined between other requests. A frame packed by the client is sent as its hash
+        first if hash_first is set, and sent again in full with the following requests if the service has not cached
+        it.
+
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display even if it already shows the frame.
+        :type force: bool
+        :param image: The frame (see update).
+        :param before: The requests sent before the update, as (opcode, payload) tuples.
+        :type before: list
+        :param after: The requests sent after the update, as (opcode, payload) tuples.
+        :type after: list
+        :param opcode: The opcode of the update, UPDATE or DISPLAY.
+        :type opcode: int
+        :param nowait: Asks the service to answer as soon as the update is queued.
+        :type nowait: bool
+        :return The outcome of the update (see last_update) and the payload of its response.
+        :rtype (str, bytes)
+        :raise EPDExceptions.InvalidFrameException: Raised if an error occurs during frame processing.
+        :raise EPDExceptions.InvalidDisplayStatusException: Raised if the display is sleeping.
+        :raise EPDServiceException: Raised if another error status is returned.
+        """
+        before = list(before)
+        after = list(after)
+        frame = hashable_frame(image) if self.__hash_first else None
+
+        if frame is not None:
+            frame_hash = bytes.fromhex(EPDPacking.fingerprint(frame.data))
+            responses = self.pipeline(before + [
+                (opcode, EPDProtocol.encode_update(boxes, force, EPDProtocol.FORMAT_HASH, frame_hash, nowait))
+            ])
+
+            if responses[-1][0] == EPDProtocol.NOT_CACHED:
+                after.insert(0, (opcode, update_payload(boxes, force, frame, nowait)))
+                responses.pop()
+
+            if after:
+                responses += self.pipeline(after)
+        else:
+            responses = self.pipeline(before + [(opcode, update_payload(boxes, force, image, nowait))] + after)
+
+        for response in responses[:len(before)]:
+            check_status(*response)
+
+        self.__last_update = None
+        outcome = update_outcome(*responses[len(before)])
+        self.__last_update = outcome
+
+        for response in responses[len(before) + 1:]:
+            check_status(*response)
+
+        return outcome, responses[len(before)][1]
 
     def sleep(self):
         """
-        Sends the sleep command to the service.
+        Sends the sleep request to the service.
+
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        self.__request(EPDProtocol.SLEEP)
 
-        :raise Exception: The exception is raised if an error code is returned.
+    def set_priority(self, priority: int):
         """
-        result = self.__send(b'2')
+        Sets the priority class of the connection's next requests, restored after a reconnection. The service runs
+        interactive operations before queued background ones, the default class.
 
-        if result != b'0':
-            raise Exception
+        :param priority: The priority class, PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+        :type priority: int
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        self.__request(EPDProtocol.PRIORITY, bytes([priority]))
+
+    def status(self) -> dict:
+        """
+        Sends the status request to the service. The service answers without waiting for the display, even while it
+        refreshes.
+
+        :return The service's state (see EPD_service.EPDService.status).
+        :rtype dict
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        return json.loads(self.__request(EPDProtocol.STATUS).decode())
+
+    def stats(self) -> dict:
+        """
+        Sends the stats request to the service: counters and latency histograms of its commands and of the phases of
+        its updates. The service answers without waiting for the display.
+
+        :return The metrics (see EPD_service.EPDService.stats).
+        :rtype dict
+        :raise EPDServiceException: Raised if an error status is returned.
+        """
+        return json.loads(self.__request(EPDProtocol.STATS).decode())
@@ -4,3 +4,7 @@ class InvalidFrameException(Exception):
 
 class InvalidDisplayStatusException(Exception):
     pass
+
+
+class DisplayBusyTimeoutException(Exception):
+    pass
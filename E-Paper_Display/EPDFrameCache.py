@@ -0,0 +1,103 @@
+import collections
+import threading
+
+import EPDPacking
+
+
+class FrameCache:
+    def __init__(self, capacity=32):
+        """
+        Creates a FrameCache object. The cache keeps the last used packed frames by content, so a client can send the
+        hash of a frame the service already has instead of the frame itself. The least recently used frame is evicted
+        once the cache is full. It is shared by the service's event loop and its hardware worker, so its methods hold a
+        lock.
+
+        :param capacity: The maximum number of frames, 0 disables the cache.
+        :type capacity: int
+        """
+        self.__capacity = capacity
+        self.__frames = collections.OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__frames)
+
+    def __contains__(self, key: str) -> bool:
+        with self.__lock:
+            return key in self.__frames
+
+    @property
+    def capacity(self) -> int:
+        """
+        Getter for the maximum number of frames.
+
+        :rtype int
+        """
+        return self.__capacity
+
+    @property
+    def stats(self) -> dict:
+        """
+        Getter for the number of cached frames, the capacity, the number of lookups that found their frame or not and
+        the hit rate, None before the first lookup.
+
+        :rtype dict
+        """
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+
+            return {
+                'frames': len(self.__frames),
+                'capacity': self.__capacity,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'hit_rate': self.__hits / lookups if lookups else None
+            }
+
+    def get(self, key: str) -> EPDPacking.PackedFrame:
+        """
+        Looks a frame up, making it the most recently used one.
+
+        :param key: The frame's hash (see EPDPacking.fingerprint).
+        :type key: str
+        :return The frame, None if it is not cached.
+        :rtype EPDPacking.PackedFrame
+        """
+        with self.__lock:
+            frame = self.__frames.get(key)
+
+            if frame is None:
+                self.__misses += 1
+
+                return None
+
+            self.__hits += 1
+            self.__frames.move_to_end(key)
+
+            return frame
+
+    def put(self, frame: EPDPacking.PackedFrame) -> str:
+        """
+        Adds a frame, as the most recently used one.
+
+        :param frame: The frame.
+        :type frame: EPDPacking.PackedFrame
+        :return The frame's hash.
+        :rtype str
+        """
+        key = EPDPacking.fingerprint(frame.data)
+
+        if self.__capacity <= 0:
+            return key
+
+        with self.__lock:
+            self.__frames[key] = frame
+            self.__frames.move_to_end(key)
+
+            while len(self.__frames) > self.__capacity:
+                self.__frames.popitem(last=False)
+
+        return key
@@ -0,0 +1,235 @@
+import collections
+import mmap
+import os
+import struct
+
+import EPDPacking
+
+# Ring file header: magic, format version, slots count and slot capacity (B).
+MAGIC = b'EPDS'
+VERSION = 1
+_HEADER = struct.Struct('>4sBxHI4x')
+
+# Slot header: sequence and frame length (B), followed by the frame as a raw frame file (see EPDPacking.PackedFrame).
+# The writer makes the sequence odd while it writes the slot and even once the frame is complete, a new frame always
+# getting a higher sequence. A frame is identified by its slot and its sequence.
+_SLOT_HEADER = struct.Struct('>QI4x')
+
+# Default location, in memory on Linux so frames never reach the disk.
+DEFAULT_PATH = '/dev/shm/epd.frames'
+
+FrameSlot = collections.namedtuple('FrameSlot', ['slot', 'sequence'])
+
+
+def slot_size(width: int, height: int) -> int:
+    """
+    Computes the slot capacity needed by the frames of a display.
+
+    :param width: The width of the display.
+    :type width: int
+    :param height: The height of the display.
+    :type height: int
+    :return The slot capacity (B).
+    :rtype int
+    """
+    return (EPDPacking.PackedFrame.HEADER.size + EPDPacking.packed_size(width, height) + 7) & ~7
+
+
+class FrameRing:
+    def __init__(self, path: str, writable: bool):
+        """
+        Creates a FrameRing object, mapping an existing ring file. A frame ring hands frames from one writer to readers
+        through shared memory: the writer fills the slots in turn, so the frames written just before stay readable
+        while it writes a new one, and readers check the slot's sequence around their copy, so they never get a half
+        written frame. Use create and open rather than this constructor.
+
+        :param path: The path of the ring file.
+        :type path: str
+        :param writable: Maps the file for writing.
+        :type writable: bool
+        :raise ValueError: Raised if the file is not a frame ring.
+        :raise OSError: Raised if the file cannot be mapped.
+        """
+        self.__path = path
+
+        with open(path, 'r+b' if writable else 'rb') as ring_file:
+            self.__map = mmap.mmap(ring_file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+        if len(self.__map) < _HEADER.size:
+            self.close()
+
+            raise ValueError('Truncated frame ring')
+
+        magic, version, self.__slots, self.__slot_size = _HEADER.unpack_from(self.__map)
+
+        if magic != MAGIC or version != VERSION or \
+                len(self.__map) < _HEADER.size + self.__slots * (_SLOT_HEADER.size + self.__slot_size):
+            self.close()
+
+            raise ValueError('Invalid frame ring: ' + path)
+
+        # Sequence of the last frame written, a crashed writer leaving its slot odd.
+        self.__sequence = max((self.__slot_header(slot)[0] + 1) & ~1 for slot in range(self.__slots))
+
+    @classmethod
+    def create(cls, path: str, slots: int, size: int) -> 'FrameRing':
+        """
+        Opens a ring file for writing, creating it if it does not exist or has another geometry. An existing ring is
+        reused as it is, so the sequences keep increasing after a writer restarts. A new file is prepared aside and
+        renamed, readers never see it half initialized.
+
+        :param path: The path of the ring file.
+        :type path: str
+        :param slots: The number of slots, at least 2 so a frame can be written while the previous one is read.
+        :type slots: int
+        :param size: The slot capacity (see slot_size) (B).
+        :type size: int
+        :return The ring.
+        :rtype FrameRing
+        :raise OSError: Raised if the file cannot be created.
+        """
+        try:
+            ring = cls(path, True)
+
+            if ring.slots == slots and ring.slot_size == size:
+                return ring
+
+            ring.close()
+        except (OSError, ValueError):
+            pass
+
+        temporary_path = path + '.' + str(os.getpid())
+
+        with open(temporary_path, 'wb') as ring_file:
+            ring_file.write(_HEADER.pack(MAGIC, VERSION, slots, size))
+            ring_file.truncate(_HEADER.size + slots * (_SLOT_HEADER.size + size))
+
+        os.replace(temporary_path, path)
+
+        return cls(path, True)
+
+    @classmethod
+    def open(cls, path: str) -> 'FrameRing':
+        """
+        Opens a ring file for reading.
+
+        :param path: The path of the ring file.
+        :type path: str
+        :return The ring.
+        :rtype FrameRing
+        :raise ValueError: Raised if the file is not a frame ring.
+        :raise OSError: Raised if the file cannot be mapped.
+        """
+        return cls(path, False)
+
+    @property
+    def path(self) -> str:
+        """
+        Getter for the path of the ring file.
+
+        :rtype str
+        """
+        return self.__path
+
+    @property
+    def slots(self) -> int:
+        """
+        Getter for the number of slots.
+
+        :rtype int
+        """
+        return self.__slots
+
+    @property
+    def slot_size(self) -> int:
+        """
+        Getter for the slot capacity (B).
+
+        :rtype int
+        """
+        return self.__slot_size
+
+    def close(self):
+        """
+        Unmaps the ring file.
+        """
+        self.__map.close()
+
+    def __offset(self, slot: int) -> int:
+        """
+        Computes the position of a slot.
+
+        :param slot: The slot.
+        :type slot: int
+        :return The offset of the slot's header in the ring file.
+        :rtype int
+        """
+        return _HEADER.size + slot * (_SLOT_HEADER.size + self.__slot_size)
+
+    def __slot_header(self, slot: int) -> (int, int):
+        """
+        Reads the header of a slot.
+
+        :param slot: The slot.
+        :type slot: int
+        :return The sequence and the frame length.
+        :rtype (int, int)
+        """
+        return _SLOT_HEADER.unpack_from(self.__map, self.__offset(slot))
+
+    def write(self, frame: EPDPacking.PackedFrame) -> FrameSlot:
+        """
+        Writes a frame to the next slot. There is a single writer per ring.
+
+        :param frame: The frame.
+        :type frame: EPDPacking.PackedFrame
+        :return The slot and sequence identifying the frame.
+        :rtype FrameSlot
+        :raise ValueError: Raised if the frame is larger than a slot.
+        """
+        raw = frame.encode()
+
+        if len(raw) > self.__slot_size:
+            raise ValueError('Frame of ' + str(len(raw)) + ' bytes larger than the ' + str(self.__slot_size) +
+                             ' bytes slots')
+
+        sequence = self.__sequence + 2
+        slot = sequence // 2 % self.__slots
+        offset = self.__offset(slot)
+
+        _SLOT_HEADER.pack_into(self.__map, offset, sequence - 1, 0)
+        self.__map[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(raw)] = raw
+        _SLOT_HEADER.pack_into(self.__map, offset, sequence, len(raw))
+        self.__sequence = sequence
+
+        return FrameSlot(slot, sequence)
+
+    def read(self, frame_slot: FrameSlot) -> EPDPacking.PackedFrame:
+        """
+        Reads a frame. The frame is copied once, its slot being reused by the writer afterwards, and the copy is only
+        returned if the slot's sequence did not change meanwhile. The raw frame's checksum is checked as well.
+
+        :param frame_slot: The slot and sequence identifying the frame, as returned by write.
+        :type frame_slot: FrameSlot
+        :return The frame.
+        :rtype EPDPacking.PackedFrame
+        :raise ValueError: Raised if the frame is not in its slot anymore, is being written or is invalid.
+        """
+        slot, sequence = frame_slot
+
+        if not 0 <= slot < self.__slots:
+            raise ValueError('Invalid frame slot: ' + str(slot))
+
+        offset = self.__offset(slot) + _SLOT_HEADER.size
+        slot_sequence, length = self.__slot_header(slot)
+
+        if slot_sequence == sequence and length <= self.__slot_size:
+            # Slicing the map copies the frame, which is then kept as is by the packed frame.
+            header_size = min(length, EPDPacking.PackedFrame.HEADER.size)
+            header = self.__map[offset:offset + header_size]
+            data = self.__map[offset + header_size:offset + length]
+
+            if self.__slot_header(slot)[0] == sequence:
+                return EPDPacking.PackedFrame.decode_parts(header, data)
+
+        raise ValueError('Frame ' + str(sequence) + ' not in slot ' + str(slot) + ' anymore')
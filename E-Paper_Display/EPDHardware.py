@@ -0,0 +1,206 @@
+import time
+
+# Pin levels.
+LOW = 0
+HIGH = 1
+
+
+class Backend:
+    """
+    Hardware used by the display interface: GPIO pins, the SPI device and the clock. The default clock is the system
+    clock, the other methods must be implemented by the backends.
+    """
+
+    def setup_output(self, pin: int):
+        """
+        Sets a pin up as an output.
+
+        :param pin: The pin number.
+        :type pin: int
+        """
+        raise NotImplementedError
+
+    def setup_input(self, pin: int):
+        """
+        Sets a pin up as an input.
+
+        :param pin: The pin number.
+        :type pin: int
+        """
+        raise NotImplementedError
+
+    def input(self, pin: int) -> int:
+        """
+        Reads the level of a pin.
+
+        :param pin: The pin number.
+        :type pin: int
+        :return The level, LOW or HIGH.
+        :rtype int
+        """
+        raise NotImplementedError
+
+    def output(self, pin: int, value: int):
+        """
+        Writes the level of a pin.
+
+        :param pin: The pin number.
+        :type pin: int
+        :param value: The level, LOW or HIGH.
+        :type value: int
+        """
+        raise NotImplementedError
+
+    def wait_for_edge(self, pin: int, rising: bool, timeout: float):
+        """
+        Waits for an edge on a pin, or until the timeout expires.
+
+        :param pin: The pin number.
+        :type pin: int
+        :param rising: Waits for a rising edge if True, a falling one otherwise.
+        :type rising: bool
+        :param timeout: The maximum waiting time (s).
+        :type timeout: float
+        :raise NotImplementedError: Raised if the backend has no edge detection.
+        """
+        raise NotImplementedError
+
+    @property
+    def spi_buffer_size(self) -> int:
+        """
+        Getter for the largest SPI transfer accepted by the backend (B).
+
+        :rtype int
+        """
+        raise NotImplementedError
+
+    def spi_write(self, data):
+        """
+        Writes data to the SPI device in a single transfer.
+
+        :param data: The data, no longer than spi_buffer_size.
+        :type data: bytes or bytearray or memoryview
+        """
+        raise NotImplementedError
+
+    def spi_read(self, size: int) -> bytes:
+        """
+        Reads data from the SPI device.
+
+        :param size: The number of bytes to read.
+        :type size: int
+        :return The data read.
+        :rtype bytes
+        """
+        raise NotImplementedError
+
+    def clock(self) -> float:
+        """
+        Reads the backend's monotonic clock.
+
+        :return The time (s).
+        :rtype float
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        """
+        Pauses for a given time on the backend's clock.
+
+        :param seconds: The time to wait (s).
+        :type seconds: float
+        """
+        time.sleep(seconds)
+
+    def close(self):
+        """
+        Releases the hardware.
+        """
+        pass
+
+
+class RPiBackend(Backend):
+    def __init__(self, spi_bus=0, spi_device=0, spi_speed=2000000):
+        """
+        Creates a RPiBackend object, driving the Raspberry Pi's GPIO pins and spidev device. RPi.GPIO and spidev are
+        only imported here so the other backends work without them.
+
+        :param spi_bus: The SPI bus number.
+        :type spi_bus: int
+        :param spi_device: The SPI device (chip select) number.
+        :type spi_device: int
+        :param spi_speed: The SPI clock frequency (Hz).
+        :type spi_speed: int
+        """
+        import RPi.GPIO
+        import spidev
+
+        self.__gpio = RPi.GPIO
+
+        # Set GPIO pins.
+        self.__gpio.setmode(self.__gpio.BCM)
+        self.__gpio.setwarnings(False)
+
+        # SPI device.
+        self.__spi = spidev.SpiDev(spi_bus, spi_device)
+
+        # Set SPI device.
+        self.__spi.max_speed_hz = spi_speed
+        self.__spi.mode = 0b00
+
+        # writebytes2 (spidev >= 3.4) accepts buffers directly, writebytes needs a list.
+        self.__writebytes2 = getattr(self.__spi, 'writebytes2', None)
+
+        self.__spi_buffer_size = self.__read_spi_buffer_size()
+
+    @staticmethod
+    def __read_spi_buffer_size(default=4096) -> int:
+        """
+        Reads the spidev buffer size, which limits the length of a single SPI transfer.
+
+        :param default: The size to use if the driver parameter cannot be read (default is the driver's default).
+        :type default: int
+        :return The buffer size (B).
+        :rtype int
+        """
+        try:
+            with open('/sys/module/spidev/parameters/bufsiz') as bufsiz_file:
+                return int(bufsiz_file.read()) or default
+        except (OSError, ValueError):
+            return default
+
+    def setup_output(self, pin: int):
+        self.__gpio.setup(pin, self.__gpio.OUT)
+
+    def setup_input(self, pin: int):
+        self.__gpio.setup(pin, self.__gpio.IN)
+
+    def input(self, pin: int) -> int:
+        return self.__gpio.input(pin)
+
+    def output(self, pin: int, value: int):
+        self.__gpio.output(pin, value)
+
+    def wait_for_edge(self, pin: int, rising: bool, timeout: float):
+        try:
+            self.__gpio.wait_for_edge(pin, self.__gpio.RISING if rising else self.__gpio.FALLING,
+                                      timeout=max(1, int(timeout * 1000)))
+        except (RuntimeError, AttributeError) as exception:
+            raise NotImplementedError('Edge detection unavailable: ' + str(exception))
+
+    @property
+    def spi_buffer_size(self) -> int:
+        return self.__spi_buffer_size
+
+    def spi_write(self, data):
+        if self.__writebytes2 is not None:
+            self.__writebytes2(data)
+        else:
+            self.__spi.writebytes(list(data))
+
+    def spi_read(self, size: int) -> bytes:
+        return bytes(self.__spi.readbytes(size))
+
+    def close(self):
+        self.__spi.close()
+        self.__gpio.cleanup()
@@ -0,0 +1,276 @@
+import bisect
+import math
+import os
+import threading
+
+# Metric kinds.
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Upper bounds of the histogram buckets (s), from the host's sub-millisecond work to the panel's refreshes.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Quantiles estimated from the histograms in snapshots.
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def format_value(value) -> str:
+    """
+    Formats a sample value in the Prometheus text format.
+
+    :param value: The value.
+    :type value: int or float
+    :return The formatted value.
+    :rtype str
+    """
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+
+        if math.isnan(value):
+            return 'NaN'
+
+    return repr(value)
+
+
+def format_labels(labels) -> str:
+    """
+    Formats the labels of a sample in the Prometheus text format.
+
+    :param labels: The labels, as (name, value) tuples.
+    :return The formatted labels, empty without labels.
+    :rtype str
+    """
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                           .replace('\n', '\\n')) for name, value in labels) + '}'
+
+
+class Metrics:
+    def __init__(self, namespace='epd', buckets=DEFAULT_BUCKETS):
+        """
+        Creates a Metrics object: counters, gauges and histograms, declared as families with one series by set of
+        labels. Recording a sample takes a lock and a few dictionary operations, so it can be done from any thread and
+        on the update path.
+
+        :param namespace: The prefix of the metric names in the Prometheus text format.
+        :type namespace: str
+        :param buckets: The increasing upper bounds of the histogram buckets, an unbounded bucket being added.
+        :type buckets: tuple
+        """
+        self.__namespace = namespace
+        self.__buckets = tuple(buckets)
+        self.__lock = threading.Lock()
+
+        # Kind and description by family name, and series by family name then labels. A histogram series is the count
+        # of each bucket followed by the sum of the samples.
+        self.__families = {}
+        self.__series = {}
+
+    @property
+    def buckets(self) -> tuple:
+        """
+        Getter for the upper bounds of the histogram buckets, the unbounded one excluded.
+
+        :rtype tuple
+        """
+        return self.__buckets
+
+    def describe(self, name: str, kind: str, description: str):
+        """
+        Declares a family of metrics.
+
+        :param name: The name of the family, without the namespace.
+        :type name: str
+        :param kind: COUNTER, GAUGE or HISTOGRAM.
+        :type kind: str
+        :param description: The description of the family.
+        :type description: str
+        """
+        self.__families[name] = (kind, description)
+        self.__series.setdefault(name, {})
+
+    def increment(self, name: str, value=1, **labels):
+        """
+        Increments a counter.
+
+        :param name: The name of the family.
+        :type name: str
+        :param value: The increment.
+        :type value: int or float
+        :param labels: The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+
+        with self.__lock:
+            series = self.__series[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value, **labels):
+        """
+        Sets a gauge, or a counter kept by another object.
+
+        :param name: The name of the family.
+        :type name: str
+        :param value: The value.
+        :type value: int or float
+        :param labels: The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+
+        with self.__lock:
+            self.__series[name][key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Adds a sample to a histogram.
+
+        :param name: The name of the family.
+        :type name: str
+        :param value: The sample.
+        :type value: float
+        :param labels: The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+
+        with self.__lock:
+            series = self.__series[name]
+            histogram = series.get(key)
+
+            if histogram is None:
+                histogram = series[key] = [0] * (len(self.__buckets) + 1) + [0.0]
+
+            histogram[bisect.bisect_left(self.__buckets, value)] += 1
+            histogram[-1] += value
+
+    def __copy(self) -> dict:
+        """
+        Copies the series, so they are read without holding the lock.
+
+        :return The series by family name then labels.
+        :rtype dict
+        """
+        with self.__lock:
+            return {name: {labels: list(value) if isinstance(value, list) else value
+                           for labels, value in series.items()} for name, series in self.__series.items()}
+
+    def quantile(self, histogram: list, quantile: float) -> float:
+        """
+        Estimates a quantile of a histogram series, interpolating linearly inside its bucket as Prometheus does.
+
+        :param histogram: The series: the count of each bucket then the sum.
+        :type histogram: list
+        :param quantile: The quantile, between 0 and 1.
+        :type quantile: float
+        :return The estimate, the largest bucket bound if it falls in the unbounded bucket, None without samples.
+        :rtype float
+        """
+        counts = histogram[:-1]
+        rank = quantile * sum(counts)
+
+        if not rank:
+            return None
+
+        cumulative = 0
+
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.__buckets):
+                    return self.__buckets[-1]
+
+                lower = self.__buckets[index - 1] if index else 0
+
+                return lower + (self.__buckets[index] - lower) * (rank - cumulative) / count
+
+            cumulative += count
+
+        return self.__buckets[-1]
+
+    def snapshot(self) -> dict:
+        """
+        Reads the metrics.
+
+        :return By family name: its kind, its description and its series, each one with its labels and either its
+        value or, for histograms, its count, sum, mean, estimated quantiles and count by bucket upper bound.
+        :rtype dict
+        """
+        families = {}
+
+        for name, series in self.__copy().items():
+            kind, description = self.__families[name]
+            samples = []
+
+            for labels, value in sorted(series.items()):
+                sample = {'labels': dict(labels)}
+
+                if kind == HISTOGRAM:
+                    count = sum(value[:-1])
+                    sample.update({
+                        'count': count,
+                        'sum': value[-1],
+                        'mean': value[-1] / count if count else None,
+                        'quantiles': {str(quantile): self.quantile(value, quantile) for quantile in QUANTILES},
+                        'buckets': {format_value(float(bound)): bucket_count for bound, bucket_count in
+                                    zip(self.__buckets + (math.inf,), value[:-1])}
+                    })
+                else:
+                    sample['value'] = value
+
+                samples.append(sample)
+
+            families[name] = {'kind': kind, 'description': description, 'series': samples}
+
+        return families
+
+    def prometheus(self) -> str:
+        """
+        Formats the metrics in the Prometheus text format.
+
+        :return The metrics.
+        :rtype str
+        """
+        lines = []
+
+        for name, series in self.__copy().items():
+            kind, description = self.__families[name]
+            full_name = self.__namespace + '_' + name if self.__namespace else name
+            lines.append('# HELP ' + full_name + ' ' + description.replace('\\', '\\\\').replace('\n', '\\n'))
+            lines.append('# TYPE ' + full_name + ' ' + kind)
+
+            for labels, value in sorted(series.items()):
+                if kind != HISTOGRAM:
+                    lines.append(full_name + format_labels(labels) + ' ' + format_value(value))
+
+                    continue
+
+                # Buckets are cumulative in the text format.
+                cumulative = 0
+
+                for bound, count in zip(self.__buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    lines.append(full_name + '_bucket' + format_labels(labels + (('le', format_value(float(bound))),))
+                                 + ' ' + str(cumulative))
+
+                lines.append(full_name + '_sum' + format_labels(labels) + ' ' + format_value(value[-1]))
+                lines.append(full_name + '_count' + format_labels(labels) + ' ' + str(cumulative))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """
+        Writes the metrics to a file in the Prometheus text format, typically read by the textfile collector of the
+        node exporter. The file is replaced at once, so it is never read half written.
+
+        :param path: The path of the file.
+        :type path: str
+        :raise OSError: Raised if the file cannot be written.
+        """
+        temporary_path = path + '.tmp'
+
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.prometheus())
+
+        os.replace(temporary_path, path)
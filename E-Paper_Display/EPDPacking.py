@@ -0,0 +1,614 @@
+import hashlib
+import os
+import random
+import struct
+import time
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The panel expects 4 bits per pixel, two pixels per byte (first pixel in the high nibble). A white pixel is sent as
+# 0x3 and a black one as 0x0.
+WHITE_NIBBLE = 0x3
+
+# Environment variable used to force a kernel instead of the automatic selection.
+KERNEL_ENV = 'EPD_PACKING_KERNEL'
+
+
+def _build_tables() -> list:
+    """
+    Builds the four translation tables used by the lookup-table kernel. Table k maps a byte of eight 1 bit pixels to
+    the panel byte holding pixels 2k and 2k + 1.
+
+    :return The translation tables.
+    :rtype list
+    """
+    tables = []
+
+    for k in range(4):
+        table = bytearray(256)
+
+        for value in range(256):
+            if value & (0x80 >> (2 * k)):
+                table[value] |= WHITE_NIBBLE << 4
+            if value & (0x40 >> (2 * k)):
+                table[value] |= WHITE_NIBBLE
+
+        tables.append(bytes(table))
+
+    return tables
+
+
+_TABLES = _build_tables()
+
+# Inverse translation tables: table k maps a panel byte to the bits of pixels 2k and 2k + 1 in a 1 bit per pixel byte.
+_UNPACK_TABLES = [bytes(((0x80 >> (2 * k)) if value & 0xf0 else 0) | ((0x40 >> (2 * k)) if value & 0x0f else 0)
+                        for value in range(256)) for k in range(4)]
+
+# Selected kernel, resolved on first use.
+_selected_kernel = None
+
+
+def stride(width: int) -> int:
+    """
+    Computes the length of a 1 bit per pixel row, rows being padded to a whole byte.
+
+    :param width: The width of the frame.
+    :type width: int
+    :return The row length in bytes.
+    :rtype int
+    """
+    return (width + 7) // 8
+
+
+def packed_size(width: int, height: int) -> int:
+    """
+    Computes the size of a packed frame.
+
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The size in bytes.
+    :rtype int
+    """
+    return width // 2 * height
+
+
+def _check_buffer(bits, width: int, height: int):
+    """
+    Validates a 1 bit per pixel buffer against the frame dimensions.
+
+    :raise ValueError: Raised if the dimensions are not supported or the buffer is too small.
+    """
+    if width <= 0 or height <= 0 or width % 2:
+        raise ValueError('Invalid frame dimensions: ' + str(width) + 'x' + str(height))
+
+    if len(bits) < stride(width) * height:
+        raise ValueError('Frame buffer too small for ' + str(width) + 'x' + str(height))
+
+
+def pack_reference(bits, width: int, height: int) -> bytes:
+    """
+    Pure Python kernel, reading the buffer bit by bit. It is slow but straightforward and is used as the reference for
+    the other kernels.
+
+    :param bits: The frame as 1 bit per pixel rows (MSB first, rows padded to a byte), typically Image.tobytes().
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The packed frame.
+    :rtype bytes
+    """
+    _check_buffer(bits, width, height)
+
+    row_length = stride(width)
+    output = bytearray(packed_size(width, height))
+    index = 0
+
+    for y in range(height):
+        row = y * row_length
+
+        for x in range(0, width, 2):
+            data = 0x00
+
+            if bits[row + (x >> 3)] & (0x80 >> (x & 7)):
+                data += 0x30
+
+            if bits[row + ((x + 1) >> 3)] & (0x80 >> ((x + 1) & 7)):
+                data += 0x03
+
+            output[index] = data
+            index += 1
+
+    return bytes(output)
+
+
+def pack_lut(bits, width: int, height: int) -> bytes:
+    """
+    Lookup-table kernel. Each input byte is translated into four output bytes with bytes.translate and the results are
+    interleaved with extended slices, so the whole frame is processed in C.
+
+    :param bits: The frame as 1 bit per pixel rows (MSB first, rows padded to a byte), typically Image.tobytes().
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The packed frame.
+    :rtype bytes
+    """
+    _check_buffer(bits, width, height)
+
+    row_length = stride(width)
+    bits = bytes(bits[:row_length * height])
+    output = bytearray(len(bits) * 4)
+
+    for k, table in enumerate(_TABLES):
+        output[k::4] = bits.translate(table)
+
+    if width % 8 == 0:
+        return bytes(output)
+
+    # Drops the bytes generated by the row padding.
+    row_output = row_length * 4
+    row_packed = width // 2
+    view = memoryview(output)
+
+    return b''.join(view[y * row_output:y * row_output + row_packed] for y in range(height))
+
+
+def pack_numpy(bits, width: int, height: int) -> bytes:
+    """
+    NumPy kernel, using a (256, 4) lookup table indexed by the whole buffer at once.
+
+    :param bits: The frame as 1 bit per pixel rows (MSB first, rows padded to a byte), typically Image.tobytes().
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The packed frame.
+    :rtype bytes
+    """
+    _check_buffer(bits, width, height)
+
+    row_length = stride(width)
+    rows = numpy.frombuffer(bits, numpy.uint8, row_length * height).reshape(height, row_length)
+    output = _NUMPY_TABLE[rows].reshape(height, row_length * 4)
+
+    if width % 8:
+        output = output[:, :width // 2]
+
+    return output.tobytes()
+
+
+if numpy is not None:
+    _NUMPY_TABLE = numpy.array([[table[value] for table in _TABLES] for value in range(256)], numpy.uint8)
+
+# Available kernels by name.
+kernels = {}
+
+if numpy is not None:
+    kernels['numpy'] = pack_numpy
+
+kernels['lut'] = pack_lut
+kernels['reference'] = pack_reference
+
+
+def check_kernel(kernel, width=38, height=7, seed=0) -> bool:
+    """
+    Cross-checks a kernel against the reference kernel on a random frame.
+
+    :param kernel: The kernel to check.
+    :param width: The width of the test frame, the default one exercises the row padding.
+    :type width: int
+    :param height: The height of the test frame.
+    :type height: int
+    :param seed: The seed for the random frame.
+    :type seed: int
+    :return True if the kernel output matches the reference, False otherwise.
+    :rtype bool
+    """
+    generator = random.Random(seed)
+    bits = bytes(generator.getrandbits(8) for _ in range(stride(width) * height))
+
+    try:
+        return kernel(bits, width, height) == pack_reference(bits, width, height)
+    except Exception:
+        return False
+
+
+def select_kernel(name=None, width=640, height=384):
+    """
+    Selects the kernel used by pack. If no name is given, the EPD_PACKING_KERNEL environment variable is used,
+    otherwise the available kernels that pass the cross-check are timed on a blank frame and the fastest one is kept.
+    The reference kernel is only used as a last resort.
+
+    :param name: The name of the kernel to use.
+    :type name: str
+    :param width: The width of the calibration frame.
+    :type width: int
+    :param height: The height of the calibration frame.
+    :type height: int
+    :return The selected kernel.
+    :raise KeyError: Raised if the requested kernel is not available.
+    """
+    global _selected_kernel
+
+    if name is None:
+        name = os.environ.get(KERNEL_ENV)
+
+    if name is not None:
+        _selected_kernel = kernels[name]
+
+        return _selected_kernel
+
+    bits = bytes(stride(width) * height)
+    best = None
+    _selected_kernel = pack_reference
+
+    for kernel in kernels.values():
+        if kernel is pack_reference or not check_kernel(kernel):
+            continue
+
+        start = time.perf_counter()
+        kernel(bits, width, height)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+            _selected_kernel = kernel
+
+    return _selected_kernel
+
+
+def selected_kernel_name() -> str:
+    """
+    Getter for the name of the kernel used by pack.
+
+    :rtype str
+    """
+    if _selected_kernel is None:
+        select_kernel()
+
+    for name, kernel in kernels.items():
+        if kernel is _selected_kernel:
+            return name
+
+
+def pack(bits, width: int, height: int) -> bytes:
+    """
+    Packs a 1 bit per pixel frame into the panel format with the selected kernel.
+
+    :param bits: The frame as 1 bit per pixel rows (MSB first, rows padded to a byte), typically Image.tobytes().
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The packed frame.
+    :rtype bytes
+    """
+    if _selected_kernel is None:
+        select_kernel()
+
+    return _selected_kernel(bits, width, height)
+
+
+def unpack(data, width: int, height: int) -> bytes:
+    """
+    Converts a packed frame back to 1 bit per pixel rows, any non zero nibble being a white pixel.
+
+    :param data: The packed frame.
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The frame as 1 bit per pixel rows (MSB first, rows padded to a byte).
+    :rtype bytes
+    """
+    data = bytes(data[:packed_size(width, height)])
+    row_length = stride(width)
+
+    if width % 8:
+        # Pads every row to whole 1 bit per pixel bytes.
+        row_packed = width // 2
+        padding = bytes(row_length * 4 - row_packed)
+        data = b''.join(data[y * row_packed:(y + 1) * row_packed] + padding for y in range(height))
+
+    bits = 0
+
+    for k, table in enumerate(_UNPACK_TABLES):
+        bits |= int.from_bytes(data[k::4].translate(table), 'big')
+
+    return bits.to_bytes(row_length * height, 'big')
+
+
+def image_to_bits(image) -> bytes:
+    """
+    Converts a PIL image to 1 bit per pixel rows. Like the per pixel loop it replaces, any non zero pixel is white.
+
+    :param image: The PIL image.
+    :return The 1 bit per pixel rows.
+    :rtype bytes
+    """
+    if image.mode != '1':
+        image = image.convert('L').point([0] + [255] * 255, '1')
+
+    return image.tobytes()
+
+
+def pack_image(image) -> bytes:
+    """
+    Packs a PIL image into the panel format.
+
+    :param image: The PIL image.
+    :return The packed frame.
+    :rtype bytes
+    """
+    return pack(image_to_bits(image), image.size[0], image.size[1])
+
+
+def pack_frame(frame) -> bytes:
+    """
+    Packs a frame into the panel format, packed frames being used as they are.
+
+    :param frame: The frame, a PIL image or a PackedFrame.
+    :return The packed frame.
+    :rtype bytes
+    """
+    if isinstance(frame, PackedFrame):
+        return frame.data
+
+    return pack_image(frame)
+
+
+def crop(data, width: int, box: (int, int, int, int)) -> bytes:
+    """
+    Extracts a box of a packed frame, as the packed frame of the box.
+
+    :param data: The packed frame.
+    :param width: The width of the frame.
+    :type width: int
+    :param box: The box, as left, top, right (excluded) and bottom (excluded). Horizontal bounds must be even, two
+    pixels sharing a byte.
+    :type box: (int, int, int, int)
+    :return The packed box.
+    :rtype bytes
+    """
+    left, top, right, bottom = box
+    row_length = width // 2
+
+    return b''.join(data[y * row_length + left // 2:y * row_length + right // 2] for y in range(top, bottom))
+
+
+def paste(data: bytearray, width: int, box: (int, int, int, int), box_data):
+    """
+    Writes the packed frame of a box into a packed frame.
+
+    :param data: The packed frame, modified in place.
+    :type data: bytearray
+    :param width: The width of the frame.
+    :type width: int
+    :param box: The box, as left, top, right (excluded) and bottom (excluded). Horizontal bounds must be even.
+    :type box: (int, int, int, int)
+    :param box_data: The packed box, as returned by crop.
+    """
+    left, top, right, bottom = box
+    row_length = width // 2
+    box_row_length = (right - left) // 2
+
+    for y in range(top, bottom):
+        start = y * row_length + left // 2
+        box_start = (y - top) * box_row_length
+        data[start:start + box_row_length] = box_data[box_start:box_start + box_row_length]
+
+
+def fingerprint(data) -> str:
+    """
+    Computes the fingerprint of a packed frame, to tell whether two frames are identical without keeping them.
+
+    :param data: The packed frame.
+    :return The fingerprint, as an hexadecimal string.
+    :rtype str
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class PackedFrame:
+    # Raw frame file: header then the packed frame. The header holds the magic, the dimensions, the pixel format and
+    # the CRC-32 of the packed frame.
+    MAGIC = b'EPDF'
+    HEADER = struct.Struct('>4sHHBI')
+
+    # Pixel formats.
+    PANEL_4BPP = 0  # Panel format, see pack.
+
+    def __init__(self, data, width: int, height: int):
+        """
+        Creates a PackedFrame object: a frame already in the panel format, displayed without any conversion.
+
+        :param data: The packed frame, kept as is if given as bytes, copied otherwise.
+        :param width: The width of the frame.
+        :type width: int
+        :param height: The height of the frame.
+        :type height: int
+        :raise ValueError: Raised if the data does not match the dimensions.
+        """
+        if len(data) != packed_size(width, height):
+            raise ValueError('Packed frame of ' + str(len(data)) + ' bytes does not match ' + str(width) + 'x' +
+                             str(height))
+
+        self.__data = bytes(data)
+        self.__width = width
+        self.__height = height
+
+    @classmethod
+    def from_image(cls, image) -> 'PackedFrame':
+        """
+        Packs a PIL image.
+
+        :param image: The PIL image.
+        :return The packed frame.
+        :rtype PackedFrame
+        """
+        return cls(pack_image(image), image.size[0], image.size[1])
+
+    @classmethod
+    def decode(cls, raw) -> 'PackedFrame':
+        """
+        Reads a raw frame file.
+
+        :param raw: The raw frame file, as returned by encode.
+        :return The packed frame.
+        :rtype PackedFrame
+        :raise ValueError: Raised if the file is not a valid raw frame.
+        """
+        view = memoryview(raw)
+
+        return cls.decode_parts(view[:cls.HEADER.size], view[cls.HEADER.size:])
+
+    @classmethod
+    def decode_parts(cls, header, data) -> 'PackedFrame':
+        """
+        Reads a raw frame file given as its header and its packed frame, so a reader copying the frame out of a shared
+        buffer copies it only once.
+
+        :param header: The header of the raw frame file.
+        :param data: The packed frame, kept as is if given as bytes.
+        :return The packed frame.
+        :rtype PackedFrame
+        :raise ValueError: Raised if the file is not a valid raw frame.
+        """
+        if len(header) < cls.HEADER.size:
+            raise ValueError('Truncated raw frame header')
+
+        magic, width, height, pixel_format, checksum = cls.HEADER.unpack_from(header)
+
+        if magic != cls.MAGIC:
+            raise ValueError('Not a raw frame')
+
+        if pixel_format != cls.PANEL_4BPP:
+            raise ValueError('Unknown pixel format: ' + str(pixel_format))
+
+        if zlib.crc32(data) != checksum:
+            raise ValueError('Raw frame checksum mismatch')
+
+        return cls(data, width, height)
+
+    @property
+    def data(self) -> bytes:
+        """
+        Getter for the packed frame.
+
+        :rtype bytes
+        """
+        return self.__data
+
+    @property
+    def size(self) -> (int, int):
+        """
+        Getter for the dimensions of the frame, as PIL images have.
+
+        :rtype (int, int)
+        """
+        return self.__width, self.__height
+
+    def encode(self) -> bytes:
+        """
+        Writes the raw frame file.
+
+        :return The raw frame file.
+        :rtype bytes
+        """
+        return self.HEADER.pack(self.MAGIC, self.__width, self.__height, self.PANEL_4BPP,
+                                zlib.crc32(self.__data)) + self.__data
+
+
+def pack_pixels_legacy(pixels, width: int, height: int) -> bytes:
+    """
+    The per pixel loop previously used by Display.display_frame, kept as the baseline for the benchmark.
+
+    :param pixels: The pixels matrix, typically PIL's PixelAccess object.
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :return The packed frame.
+    :rtype bytes
+    """
+    output = bytearray()
+
+    for y in range(height):
+        x = 0
+
+        while x < width:
+            data = 0x00
+
+            if pixels[x, y]:
+                data += 0x30
+
+            if pixels[x + 1, y]:
+                data += 0x03
+
+            output.append(data)
+
+            x += 2
+
+    return bytes(output)
+
+
+def benchmark(width=640, height=384, repeat=3) -> dict:
+    """
+    Times every available kernel and the legacy loop on a random frame.
+
+    :param width: The width of the frame.
+    :type width: int
+    :param height: The height of the frame.
+    :type height: int
+    :param repeat: The number of runs, the best one is kept.
+    :type repeat: int
+    :return The best time (s) by kernel name.
+    :rtype dict
+    """
+    from PIL import Image
+
+    generator = random.Random(0)
+    bits = bytes(generator.getrandbits(8) for _ in range(stride(width) * height))
+    image = Image.frombytes('1', (width, height), bits)
+    pixels = image.load()
+
+    candidates = dict(kernels)
+    candidates['legacy'] = lambda _bits, _width, _height: pack_pixels_legacy(pixels, _width, _height)
+
+    results = {}
+
+    for name, kernel in candidates.items():
+        best = None
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            kernel(bits, width, height)
+            elapsed = time.perf_counter() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        results[name] = best
+
+    return results
+
+
+if __name__ == '__main__':
+    for kernel_name, kernel_function in kernels.items():
+        print(kernel_name + ': ' + ('ok' if check_kernel(kernel_function) else 'MISMATCH'))
+
+    print('selected: ' + selected_kernel_name())
+
+    timings = benchmark()
+
+    for kernel_name in timings:
+        print('{:<10} {:>10.3f} ms  x{:.0f}'.format(kernel_name, timings[kernel_name] * 1000,
+                                                  timings['legacy'] / timings[kernel_name]))
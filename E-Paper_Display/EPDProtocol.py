@@ -0,0 +1,172 @@
+import struct
+
+# Handshake: the client sends MAGIC then the protocol version it speaks, the service answers the same. Version 1
+# clients send a command byte ('0' to '6') instead, the service tells both apart by the first byte.
+MAGIC = b'EPD'
+VERSION = 2
+
+# Message header: length of the rest of the message, request ID, then opcode (requests) or status (responses). The
+# payload follows.
+HEADER = struct.Struct('>IIB')
+
+# Largest message accepted, header included (B).
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Opcodes.
+INIT = 0
+UPDATE = 1
+SLEEP = 2
+STATUS = 3
+PRIORITY = 4
+DISPLAY = 5  # Update waking the display up if needed, its power being then managed by the service.
+SUBSCRIBE = 6  # Subscribes the connection to the events of the service (payload 1) or unsubscribes it (payload 0).
+STATS = 7  # Metrics of the service, answered as JSON.
+
+# Statuses, numbered as the version 1 result codes. Error responses carry a UTF-8 message as payload.
+OK = 0
+ERROR = 1
+FRAME_ERROR = 2
+SLEEPING = 3
+UNCHANGED = 4
+SUPERSEDED = 5
+PROTOCOL_ERROR = 6
+NOT_CACHED = 7  # The frame of a FORMAT_HASH update is not cached, it has to be sent.
+ACCEPTED = 8  # A NOWAIT update is queued, the payload is its ID, as UPDATE_ID.
+EVENT = 9  # Event sent by the service, not a response (see below).
+
+# Events: JSON objects with an 'event' key, sent with the EVENT status. The 'update' event, sent once an update is
+# done, gives its ID, status, message and timings: queued, started, transferred, refresh_started and refreshed, in
+# seconds on the display's clock (None for the steps that did not happen). A NOWAIT update's 'update' event is sent
+# with the update's request ID. The subscribed connections get every event with the request ID of their subscribe
+# request: 'queued' events, giving the update's ID, 'update' events, and 'power' events giving the new power state.
+UPDATE_ID = struct.Struct('>I')
+
+# Update and display payload: flags, frame format and boxes count, then left, top, right, bottom for each box, then the
+# frame.
+UPDATE_HEADER = struct.Struct('>BBH')
+BOX = struct.Struct('>4H')
+
+# Update flags.
+FORCE = 0x01
+NOWAIT = 0x02  # The service answers ACCEPTED as soon as the update is queued, the update event follows.
+
+# Frame formats.
+FORMAT_FILE = 0  # No frame in the payload, the service reads its frame file.
+FORMAT_IMAGE = 1  # Image file (BMP, PNG...) read by PIL.
+FORMAT_RAW = 2  # Raw frame file, already in the panel format (see EPDPacking.PackedFrame).
+FORMAT_SLOT = 3  # Slot and sequence of a frame in the service's frame ring (see EPDFrameRing), as SLOT.
+FORMAT_HASH = 4  # Hash of a frame cached by the service (see EPDPacking.fingerprint), as HASH_SIZE bytes.
+
+SLOT = struct.Struct('>HQ')
+HASH_SIZE = 16
+
+
+def handshake(version=VERSION) -> bytes:
+    """
+    Encodes a handshake.
+
+    :param version: The protocol version.
+    :type version: int
+    :return The handshake.
+    :rtype bytes
+    """
+    return MAGIC + bytes([version])
+
+
+def encode_message(request_id: int, code: int, payload=b'') -> bytes:
+    """
+    Encodes a message.
+
+    :param request_id: The request ID, chosen by the client and repeated in the response.
+    :type request_id: int
+    :param code: The opcode of a request or the status of a response.
+    :type code: int
+    :param payload: The payload.
+    :type payload: bytes
+    :return The message.
+    :rtype bytes
+    """
+    return HEADER.pack(HEADER.size - 4 + len(payload), request_id, code) + payload
+
+
+def decode_header(header: bytes) -> (int, int, int):
+    """
+    Decodes a message header.
+
+    :param header: The header.
+    :type header: bytes
+    :return The payload length, the request ID and the opcode or status.
+    :rtype (int, int, int)
+    :raise ValueError: Raised if the message length is invalid.
+    """
+    length, request_id, code = HEADER.unpack(header)
+
+    if not HEADER.size - 4 <= length <= MAX_MESSAGE_SIZE - 4:
+        raise ValueError('Invalid message length: ' + str(length))
+
+    return length - HEADER.size + 4, request_id, code
+
+
+def encode_update(boxes=None, force=False, frame_format=FORMAT_FILE, frame=b'', nowait=False) -> bytes:
+    """
+    Encodes the payload of an update request.
+
+    :param boxes: The boxes to refresh, as left, top, right (excluded) and bottom (excluded), None to refresh the whole
+    display.
+    :type boxes: list
+    :param force: Refreshes the whole display with the full waveform even if it already shows the frame.
+    :type force: bool
+    :param frame_format: The format of the frame.
+    :type frame_format: int
+    :param frame: The frame, empty with FORMAT_FILE.
+    :type frame: bytes
+    :param nowait: Asks the service to answer as soon as the update is queued.
+    :type nowait: bool
+    :return The payload.
+    :rtype bytes
+    :raise ValueError: Raised if more than 65535 boxes are given.
+    """
+    boxes = boxes or []
+
+    if len(boxes) > 0xFFFF:
+        raise ValueError('At most 65535 boxes can be refreshed at once')
+
+    return (UPDATE_HEADER.pack((FORCE if force else 0) | (NOWAIT if nowait else 0), frame_format, len(boxes)) +
+            b''.join(BOX.pack(*box) for box in boxes) + frame)
+
+
+def decode_update(payload: bytes) -> (list, bool, int, bytes, bool):
+    """
+    Decodes the payload of an update request.
+
+    :param payload: The payload.
+    :type payload: bytes
+    :return The boxes (None to refresh the whole display), the forcing, the frame format, the frame and the nowait
+    flag.
+    :rtype (list, bool, int, bytes, bool)
+    :raise ValueError: Raised if the payload is invalid.
+    """
+    if len(payload) < UPDATE_HEADER.size:
+        raise ValueError('Truncated update payload')
+
+    flags, frame_format, boxes_count = UPDATE_HEADER.unpack_from(payload)
+    frame_offset = UPDATE_HEADER.size + boxes_count * BOX.size
+
+    if len(payload) < frame_offset:
+        raise ValueError('Truncated update boxes')
+
+    if frame_format not in (FORMAT_FILE, FORMAT_IMAGE, FORMAT_RAW, FORMAT_SLOT, FORMAT_HASH):
+        raise ValueError('Unknown frame format: ' + str(frame_format))
+
+    if frame_format != FORMAT_FILE and len(payload) == frame_offset:
+        raise ValueError('Missing frame')
+
+    if frame_format == FORMAT_SLOT and len(payload) - frame_offset != SLOT.size:
+        raise ValueError('Invalid frame slot')
+
+    if frame_format == FORMAT_HASH and len(payload) - frame_offset != HASH_SIZE:
+        raise ValueError('Invalid frame hash')
+
+    boxes = [BOX.unpack_from(payload, UPDATE_HEADER.size + index * BOX.size) for index in range(boxes_count)]
+
+    return boxes or None, bool(flags & FORCE), frame_format, payload[frame_offset:], bool(flags & NOWAIT)
@@ -0,0 +1,141 @@
+import time
+
+
+class RefreshPolicy:
+    # Refresh kinds.
+    PARTIAL = 'partial'
+    FAST_FULL = 'fast_full'
+    FULL = 'full'
+
+    def __init__(self, width: int, height: int, max_partials=20, max_partial_area=2.0, max_fast_fulls=3,
+                 max_age=6 * 3600, clock=time.monotonic):
+        """
+        Creates a RefreshPolicy object. Partial and fast refreshes leave ghosting on the panel, the policy chooses the
+        cheapest refresh for each update while keeping the ghosting under the given budgets. A full refresh resets all
+        the budgets, a fast full refresh only resets the partial refreshes' ones.
+
+        :param width: The width of the device.
+        :type width: int
+        :param height: The height of the device.
+        :type height: int
+        :param max_partials: The number of partial refreshes allowed between two full or fast full refreshes.
+        :type max_partials: int
+        :param max_partial_area: The area refreshed partially allowed between two full or fast full refreshes, in
+        device surfaces.
+        :type max_partial_area: float
+        :param max_fast_fulls: The number of fast full refreshes allowed between two full refreshes.
+        :type max_fast_fulls: int
+        :param max_age: The maximum time between two full refreshes (s).
+        :type max_age: float
+        :param clock: The clock used to measure the time since the last full refresh (s).
+        """
+        self.__surface = width * height
+
+        self.max_partials = max_partials
+        self.max_partial_area = max_partial_area
+        self.max_fast_fulls = max_fast_fulls
+        self.max_age = max_age
+
+        self.__clock = clock
+
+        # The panel state is unknown until the first full refresh.
+        self.__last_full_time = None
+        self.__partials = 0
+        self.__partial_area = 0
+        self.__fast_fulls = 0
+
+        self.__decisions = {self.PARTIAL: 0, self.FAST_FULL: 0, self.FULL: 0}
+
+    @property
+    def age(self) -> float:
+        """
+        Getter for the time since the last full refresh (s), None if no full refresh has been done.
+
+        :rtype float
+        """
+        if self.__last_full_time is None:
+            return None
+
+        return self.__clock() - self.__last_full_time
+
+    @property
+    def decisions(self) -> dict:
+        """
+        Getter for the number of recorded refreshes by kind.
+
+        :rtype dict
+        """
+        return dict(self.__decisions)
+
+    @property
+    def stats(self) -> dict:
+        """
+        Getter for the policy's state and recorded refreshes.
+
+        :rtype dict
+        """
+        return {
+            'decisions': self.decisions,
+            'partials': self.__partials,
+            'partial_area': self.__partial_area,
+            'fast_fulls': self.__fast_fulls,
+            'age': self.age
+        }
+
+    def decide(self, box=None) -> str:
+        """
+        Chooses the refresh for an update.
+
+        :param box: The window to refresh, as left, top, right (excluded) and bottom (excluded), None for the whole
+        device.
+        :type box: (int, int, int, int)
+        :return The refresh kind: PARTIAL, FAST_FULL or FULL.
+        :rtype str
+        """
+        age = self.age
+
+        if age is None or age >= self.max_age:
+            return self.FULL
+
+        if box is not None and self.__partials < self.max_partials and \
+                self.__partial_area + self.__area(box) <= self.max_partial_area:
+            return self.PARTIAL
+
+        if self.__fast_fulls < self.max_fast_fulls:
+            return self.FAST_FULL
+
+        return self.FULL
+
+    def record(self, refresh: str, box=None):
+        """
+        Records a refresh done on the device.
+
+        :param refresh: The refresh kind.
+        :type refresh: str
+        :param box: The refreshed window for a partial refresh.
+        :type box: (int, int, int, int)
+        """
+        self.__decisions[refresh] += 1
+
+        if refresh == self.PARTIAL:
+            self.__partials += 1
+            self.__partial_area += self.__area(box)
+        else:
+            self.__partials = 0
+            self.__partial_area = 0
+
+            if refresh == self.FAST_FULL:
+                self.__fast_fulls += 1
+            else:
+                self.__fast_fulls = 0
+                self.__last_full_time = self.__clock()
+
+    def __area(self, box: (int, int, int, int)) -> float:
+        """
+        Computes the area of a box, in device surfaces.
+
+        :param box: The box, as left, top, right (excluded) and bottom (excluded).
+        :type box: (int, int, int, int)
+        :rtype float
+        """
+        return (box[2] - box[0]) * (box[3] - box[1]) / self.__surface
@@ -0,0 +1,436 @@
+import time
+
+import EPDHardware
+import EPDPacking
+import SevenFiveEPD
+
+
+class SimulatedBackend(EPDHardware.Backend):
+    # Default timings (s).
+    DEFAULT_TIMINGS = {
+        'reset': 0.002,
+        'power_on': 0.08,
+        'power_off': 0.03,
+        'temperature': 0.005,
+        'full_refresh': 4.5,
+        'partial_refresh': 1.2,
+        'frame': 0.02,  # One frame of a register waveform, 50 Hz PLL.
+        'spi_transaction': 0.00005  # Fixed cost of an SPI transfer, on top of the clock time.
+    }
+
+    def __init__(self, width=SevenFiveEPD.width, height=SevenFiveEPD.height, commands=SevenFiveEPD.commands,
+                 pins=None, realtime=False, timings=None, spi_speed=2000000, spi_buffer_size=4096, temperature=20.0):
+        """
+        Creates a SimulatedBackend object. It decodes the SPI stream like the EPD controller would (commands,
+        registers, frame memory, partial window, power and sleep states) and drives the BUSY pin with a timing model,
+        so the driver can run and be measured without the hardware.
+
+        :param width: The width of the simulated device.
+        :type width: int
+        :param height: The height of the simulated device.
+        :type height: int
+        :param commands: The commands recognized by the device.
+        :type commands: dict
+        :param pins: The pin numbers by role (RST, DC, CS and BUSY), default ones are the display interface's.
+        :type pins: dict
+        :param realtime: Waits actually happen if True, otherwise the backend runs on a virtual clock which only
+        advances when waiting, so simulations run as fast as possible with the same timings.
+        :type realtime: bool
+        :param timings: Timings overriding the default ones (see DEFAULT_TIMINGS) (s).
+        :type timings: dict
+        :param spi_speed: The SPI clock frequency, used to compute transfer times (Hz).
+        :type spi_speed: int
+        :param spi_buffer_size: The largest SPI transfer accepted (B).
+        :type spi_buffer_size: int
+        :param temperature: The temperature returned by the device's sensor (C).
+        :type temperature: float
+        """
+        self.__width = width
+        self.__height = height
+        self.__codes = dict(commands)
+
+        self.__pins = {'RST': 17, 'DC': 25, 'CS': 8, 'BUSY': 24}
+        self.__pins.update(pins or {})
+
+        self.__realtime = realtime
+        self.__virtual_time = 0.0
+
+        self.timings = dict(self.DEFAULT_TIMINGS)
+        self.timings.update(timings or {})
+
+        self.__spi_speed = spi_speed
+        self.__spi_buffer_size = spi_buffer_size
+
+        self.temperature = temperature
+
+        self.__levels = {}
+        self.__busy_until = 0.0
+
+        # Controller state.
+        self.__registers = {}
+        self.__command = None
+        self.__powered = False
+        self.__deep_sleep = False
+        self.__partial = False
+        self.__window = (0, 0, width, height)
+        self.__ram_position = 0
+        self.__read_buffer = b''
+
+        # Frame memory and pixels actually shown on the panel, in the panel format.
+        self.__ram = bytearray(EPDPacking.packed_size(width, height))
+        self.__screen = bytearray(len(self.__ram))
+
+        self.__stats = {}
+        self.reset_stats()
+
+    @property
+    def width(self) -> int:
+        """
+        Getter for the simulated device's width.
+
+        :rtype int
+        """
+        return self.__width
+
+    @property
+    def height(self) -> int:
+        """
+        Getter for the simulated device's height.
+
+        :rtype int
+        """
+        return self.__height
+
+    @property
+    def stats(self) -> dict:
+        """
+        Getter for the counters of the simulation: SPI transactions and bytes, commands, pin writes, resets, refreshes
+        by kind and busy time (s).
+
+        :rtype dict
+        """
+        stats = dict(self.__stats)
+        stats['refreshes'] = dict(self.__stats['refreshes'])
+
+        return stats
+
+    def reset_stats(self):
+        """
+        Resets the counters of the simulation.
+        """
+        self.__stats = {
+            'spi_transactions': 0,
+            'spi_bytes': 0,
+            'commands': 0,
+            'pin_writes': 0,
+            'resets': 0,
+            'refreshes': {'full': 0, 'partial': 0, 'register': 0},
+            'busy_time': 0.0
+        }
+
+    @property
+    def registers(self) -> dict:
+        """
+        Getter for the data last written to each command, by command code.
+
+        :rtype dict
+        """
+        return {code: bytes(data) for code, data in self.__registers.items()}
+
+    @property
+    def is_busy(self) -> bool:
+        """
+        Getter for the simulated BUSY state.
+
+        :rtype bool
+        """
+        return self.clock() < self.__busy_until
+
+    @property
+    def is_deep_sleeping(self) -> bool:
+        """
+        Getter for the deep sleep state.
+
+        :rtype bool
+        """
+        return self.__deep_sleep
+
+    @property
+    def is_powered(self) -> bool:
+        """
+        Getter for the power state.
+
+        :rtype bool
+        """
+        return self.__powered
+
+    @property
+    def screen(self) -> bytes:
+        """
+        Getter for the pixels shown on the panel, in the panel format.
+
+        :rtype bytes
+        """
+        return bytes(self.__screen)
+
+    def screen_bits(self) -> bytes:
+        """
+        Converts the pixels shown on the panel to 1 bit per pixel rows.
+
+        :return The 1 bit per pixel rows.
+        :rtype bytes
+        """
+        return EPDPacking.unpack(self.__screen, self.width, self.height)
+
+    def screen_image(self):
+        """
+        Converts the pixels shown on the panel to an image. PIL is only imported here.
+
+        :return The image, in the orientation of the frames sent to the device.
+        :rtype PIL.Image.Image
+        """
+        from PIL import Image
+
+        return Image.frombytes('1', (self.width, self.height), self.screen_bits())
+
+    def clock(self) -> float:
+        if self.__realtime:
+            return time.monotonic()
+
+        return self.__virtual_time
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+
+        if self.__realtime:
+            time.sleep(seconds)
+        else:
+            self.__virtual_time += seconds
+
+    def __busy(self, duration: float):
+        """
+        Drives the BUSY pin low for a given time.
+
+        :param duration: The busy time (s).
+        :type duration: float
+        """
+        self.__busy_until = max(self.__busy_until, self.clock()) + duration
+        self.__stats['busy_time'] += duration
+
+    def setup_output(self, pin: int):
+        self.__levels[pin] = EPDHardware.LOW
+
+    def setup_input(self, pin: int):
+        pass
+
+    def input(self, pin: int) -> int:
+        if pin == self.__pins['BUSY']:
+            return EPDHardware.LOW if self.is_busy else EPDHardware.HIGH
+
+        return self.__levels.get(pin, EPDHardware.LOW)
+
+    def output(self, pin: int, value: int):
+        self.__stats['pin_writes'] += 1
+
+        previous = self.__levels.get(pin)
+        self.__levels[pin] = value
+
+        if pin == self.__pins['RST'] and previous == EPDHardware.LOW and value == EPDHardware.HIGH:
+            self.__reset()
+
+    def wait_for_edge(self, pin: int, rising: bool, timeout: float):
+        if pin == self.__pins['BUSY']:
+            # Already at the awaited level: like a driver waiting for the level, the wait ends at once.
+            if (self.input(pin) == EPDHardware.HIGH) == rising:
+                return
+
+            if rising:
+                self.sleep(min(self.__busy_until - self.clock(), timeout))
+
+                return
+
+        self.sleep(timeout)
+
+    @property
+    def spi_buffer_size(self) -> int:
+        return self.__spi_buffer_size
+
+    def spi_write(self, data):
+        data = bytes(data)
+
+        if len(data) > self.__spi_buffer_size:
+            raise OSError('SPI transfer of ' + str(len(data)) + ' bytes exceeds the buffer size')
+
+        self.__stats['spi_transactions'] += 1
+        self.__stats['spi_bytes'] += len(data)
+        self.sleep(self.timings['spi_transaction'] + len(data) * 8 / self.__spi_speed)
+
+        if self.__deep_sleep:
+            return
+
+        if self.__levels.get(self.__pins['DC'], EPDHardware.LOW) == EPDHardware.LOW:
+            for code in data:
+                self.__execute(code)
+        else:
+            self.__receive(data)
+
+    def spi_read(self, size: int) -> bytes:
+        data = self.__read_buffer[:size]
+        self.__read_buffer = self.__read_buffer[size:]
+
+        return data + bytes(size - len(data))
+
+    def __reset(self):
+        """
+        Resets the controller. The frame memory and the pixels shown on the panel are kept.
+        """
+        self.__stats['resets'] += 1
+
+        self.__registers = {}
+        self.__command = None
+        self.__powered = False
+        self.__deep_sleep = False
+        self.__partial = False
+        self.__window = (0, 0, self.width, self.height)
+        self.__busy(self.timings['reset'])
+
+    def __execute(self, code: int):
+        """
+        Starts a command.
+
+        :param code: The command code.
+        :type code: int
+        """
+        self.__stats['commands'] += 1
+        self.__command = code
+        self.__registers[code] = bytearray()
+
+        if code == self.__codes['POWER_ON']:
+            self.__powered = True
+            self.__busy(self.timings['power_on'])
+        elif code == self.__codes['POWER_OFF']:
+            self.__powered = False
+            self.__busy(self.timings['power_off'])
+        elif code == self.__codes['DATA_START_TRANSMISSION_1']:
+            self.__ram_position = 0
+        elif code == self.__codes['DISPLAY_REFRESH']:
+            self.__refresh()
+        elif code == self.__codes['PARTIAL_IN']:
+            self.__partial = True
+        elif code == self.__codes['PARTIAL_OUT']:
+            self.__partial = False
+        elif code == self.__codes['TEMPERATURE_SENSOR_COMMAND']:
+            temperature = int(self.temperature // 1)
+            half = 0x80 if self.temperature - temperature >= 0.5 else 0x00
+            self.__read_buffer = bytes([temperature & 0xff, half])
+            self.__busy(self.timings['temperature'])
+
+    def __receive(self, data: bytes):
+        """
+        Receives data for the current command.
+
+        :param data: The data.
+        :type data: bytes
+        """
+        if self.__command is None:
+            return
+
+        if self.__command == self.__codes['DATA_START_TRANSMISSION_1']:
+            self.__write_ram(data)
+
+            return
+
+        register = self.__registers[self.__command]
+        register.extend(data)
+
+        if self.__command == self.__codes['DEEP_SLEEP'] and register[:1] == b'\xa5':
+            self.__deep_sleep = True
+            self.__powered = False
+        elif self.__command == self.__codes['PARTIAL_WINDOW'] and len(register) >= 9:
+            left = (register[0] << 8 | register[1]) & 0x3f8
+            right = ((register[2] << 8 | register[3]) & 0x3f8) + 8
+            top = (register[4] << 8 | register[5]) & 0x3ff
+            bottom = ((register[6] << 8 | register[7]) & 0x3ff) + 1
+            self.__window = (left, top, min(right, self.width), min(bottom, self.height))
+
+    def __active_window(self) -> (int, int, int, int):
+        """
+        Getter for the window addressed by data transmissions and refreshes.
+
+        :rtype (int, int, int, int)
+        """
+        return self.__window if self.__partial else (0, 0, self.width, self.height)
+
+    def __write_ram(self, data: bytes):
+        """
+        Writes frame data into the frame memory, row by row inside the active window.
+
+        :param data: The frame data, in the panel format.
+        :type data: bytes
+        """
+        left, top, right, bottom = self.__active_window()
+        row_length = (right - left) // 2
+        window_size = row_length * (bottom - top)
+        ram_row_length = self.width // 2
+        offset = 0
+
+        while offset < len(data) and self.__ram_position < window_size:
+            row, column = divmod(self.__ram_position, row_length)
+            count = min(row_length - column, len(data) - offset)
+            start = (top + row) * ram_row_length + left // 2 + column
+
+            self.__ram[start:start + count] = data[offset:offset + count]
+            offset += count
+            self.__ram_position += count
+
+    def __waveform_duration(self) -> float:
+        """
+        Computes the duration of the register waveform from the LUT registers: the longest LUT sets the duration.
+
+        :return The duration (s).
+        :rtype float
+        """
+        frames = 0
+
+        for name in ('LUT_FOR_VCOM', 'LUT_BLUE', 'LUT_WHITE', 'LUT_GRAY_1', 'LUT_GRAY_2'):
+            lut = self.__registers.get(self.__codes[name], b'')
+            lut_frames = 0
+
+            # Groups of a level select byte, 4 phase lengths and a repeat count.
+            for index in range(0, len(lut) - 5, 6):
+                lut_frames += sum(lut[index + 1:index + 5]) * max(1, lut[index + 5])
+
+            frames = max(frames, lut_frames)
+
+        return frames * self.timings['frame']
+
+    def __refresh(self):
+        """
+        Refreshes the panel with the frame memory inside the active window.
+        """
+        if not self.__powered:
+            return
+
+        panel_setting = self.__registers.get(self.__codes['PANEL_SETTING'], b'')
+        left, top, right, bottom = self.__active_window()
+
+        if panel_setting[:1] and panel_setting[0] & 0x20:
+            kind = 'register'
+            duration = self.__waveform_duration()
+        elif self.__partial:
+            kind = 'partial'
+            duration = self.timings['partial_refresh']
+        else:
+            kind = 'full'
+            duration = self.timings['full_refresh']
+
+        ram_row_length = self.width // 2
+
+        for y in range(top, bottom):
+            start = y * ram_row_length + left // 2
+            end = y * ram_row_length + right // 2
+            self.__screen[start:end] = self.__ram[start:end]
+
+        self.__stats['refreshes'][kind] += 1
+        self.__busy(duration)
@@ -0,0 +1,286 @@
+import struct
+
+import EPD
+import EPDHardware
+
+# Trace file header: magic and format version.
+MAGIC = b'EPDT'
+VERSION = 1
+
+# Event types.
+SETUP_OUTPUT = 1
+SETUP_INPUT = 2
+OUTPUT = 3
+INPUT = 4
+SPI_WRITE = 5
+SPI_READ = 6
+WAIT_EDGE = 7
+SLEEP = 8
+
+EVENT_NAMES = {
+    SETUP_OUTPUT: 'setup_output',
+    SETUP_INPUT: 'setup_input',
+    OUTPUT: 'output',
+    INPUT: 'input',
+    SPI_WRITE: 'spi_write',
+    SPI_READ: 'spi_read',
+    WAIT_EDGE: 'wait_edge',
+    SLEEP: 'sleep'
+}
+
+# Record header: event type, time since the trace start (s) and payload length. The length is 32 bits wide, as a
+# SPI transfer is as large as the spidev buffer (4096 bytes by default, often raised to 65536 bytes or more).
+_RECORD = struct.Struct('<BdI')
+_PIN = struct.Struct('<B')
+_PIN_VALUE = struct.Struct('<BB')
+_WAIT_EDGE = struct.Struct('<BBdd')
+_SECONDS = struct.Struct('<d')
+
+
+class TraceRecorder(EPDHardware.Backend):
+    def __init__(self, backend: EPDHardware.Backend, path: str):
+        """
+        Creates a TraceRecorder object. It forwards every call to a backend and records it with a timestamp in a
+        binary trace file: pin setups, writes and reads, SPI transfers (the DC pin writes telling commands from data),
+        edge waits and sleeps.
+
+        :param backend: The recorded backend.
+        :type backend: EPDHardware.Backend
+        :param path: The path of the trace file.
+        :type path: str
+        """
+        self.__backend = backend
+        self.__file = open(path, 'wb')
+        self.__file.write(MAGIC + bytes([VERSION]))
+        self.__start = backend.clock()
+
+    @property
+    def backend(self) -> EPDHardware.Backend:
+        """
+        Getter for the recorded backend.
+
+        :rtype EPDHardware.Backend
+        """
+        return self.__backend
+
+    def __record(self, event: int, payload: bytes, timestamp=None):
+        """
+        Writes an event to the trace file.
+
+        :param event: The event type.
+        :type event: int
+        :param payload: The event's data.
+        :type payload: bytes
+        :param timestamp: The backend time of the event (default is now) (s).
+        :type timestamp: float
+        """
+        if timestamp is None:
+            timestamp = self.__backend.clock()
+
+        self.__file.write(_RECORD.pack(event, timestamp - self.__start, len(payload)))
+        self.__file.write(payload)
+
+    def setup_output(self, pin: int):
+        self.__backend.setup_output(pin)
+        self.__record(SETUP_OUTPUT, _PIN.pack(pin))
+
+    def setup_input(self, pin: int):
+        self.__backend.setup_input(pin)
+        self.__record(SETUP_INPUT, _PIN.pack(pin))
+
+    def input(self, pin: int) -> int:
+        value = self.__backend.input(pin)
+        self.__record(INPUT, _PIN_VALUE.pack(pin, value))
+
+        return value
+
+    def output(self, pin: int, value: int):
+        self.__record(OUTPUT, _PIN_VALUE.pack(pin, value))
+        self.__backend.output(pin, value)
+
+    def wait_for_edge(self, pin: int, rising: bool, timeout: float):
+        start = self.__backend.clock()
+
+        try:
+            self.__backend.wait_for_edge(pin, rising, timeout)
+        finally:
+            self.__record(WAIT_EDGE, _WAIT_EDGE.pack(pin, rising, timeout, self.__backend.clock() - start), start)
+
+    @property
+    def spi_buffer_size(self) -> int:
+        return self.__backend.spi_buffer_size
+
+    def spi_write(self, data):
+        self.__record(SPI_WRITE, bytes(data))
+        self.__backend.spi_write(data)
+
+    def spi_read(self, size: int) -> bytes:
+        data = self.__backend.spi_read(size)
+        self.__record(SPI_READ, data)
+
+        return data
+
+    def clock(self) -> float:
+        return self.__backend.clock()
+
+    def sleep(self, seconds: float):
+        self.__record(SLEEP, _SECONDS.pack(seconds))
+        self.__backend.sleep(seconds)
+
+    def flush(self):
+        """
+        Writes the buffered events to the trace file.
+        """
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+        self.__backend.close()
+
+
+def read_trace(path: str):
+    """
+    Reads the events of a trace file.
+
+    :param path: The path of the trace file.
+    :type path: str
+    :return A generator of (event type, time since the trace start (s), data) tuples. The data is a tuple of the pin
+    and value for pin events, the bytes for SPI events, the pin, rising flag, timeout and waiting time for edge waits,
+    and the time for sleeps.
+    :raise ValueError: Raised if the file is not a trace file.
+    """
+    with open(path, 'rb') as trace_file:
+        header = trace_file.read(len(MAGIC) + 1)
+
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC):] != bytes([VERSION]):
+            raise ValueError('Not a version ' + str(VERSION) + ' trace file: ' + path)
+
+        while True:
+            record = trace_file.read(_RECORD.size)
+
+            if len(record) < _RECORD.size:
+                return
+
+            event, timestamp, length = _RECORD.unpack(record)
+            payload = trace_file.read(length)
+
+            if event in (SETUP_OUTPUT, SETUP_INPUT):
+                data = _PIN.unpack(payload)
+            elif event in (OUTPUT, INPUT):
+                data = _PIN_VALUE.unpack(payload)
+            elif event == WAIT_EDGE:
+                pin, rising, timeout, elapsed = _WAIT_EDGE.unpack(payload)
+                data = (pin, bool(rising), timeout, elapsed)
+            elif event == SLEEP:
+                data = _SECONDS.unpack(payload)[0]
+            else:
+                data = payload
+
+            yield event, timestamp, data
+
+
+def summarize(events, commands: dict, dc_pin=25, busy_pin=24) -> dict:
+    """
+    Computes statistics over trace events.
+
+    :param events: The events, as yielded by read_trace.
+    :param commands: The commands recognized by the device, to name the command codes.
+    :type commands: dict
+    :param dc_pin: The DC pin number.
+    :type dc_pin: int
+    :param busy_pin: The BUSY pin number.
+    :type busy_pin: int
+    :return The duration (s), the number of events by type, the SPI transactions and bytes, the data bytes, the
+    commands by name, the time spent waiting for edges and sleeping (s) and the BUSY reads.
+    :rtype dict
+    """
+    names = {code: name for name, code in commands.items()}
+    dc_level = EPDHardware.LOW
+
+    summary = {
+        'duration': 0.0,
+        'events': {name: 0 for name in EVENT_NAMES.values()},
+        'spi_transactions': 0,
+        'spi_bytes': 0,
+        'data_bytes': 0,
+        'commands': {},
+        'wait_time': 0.0,
+        'sleep_time': 0.0,
+        'busy_reads': 0
+    }
+
+    for event, timestamp, data in events:
+        summary['duration'] = timestamp
+        summary['events'][EVENT_NAMES[event]] += 1
+
+        if event == OUTPUT and data[0] == dc_pin:
+            dc_level = data[1]
+        elif event == INPUT and data[0] == busy_pin:
+            summary['busy_reads'] += 1
+        elif event == SPI_WRITE:
+            summary['spi_transactions'] += 1
+            summary['spi_bytes'] += len(data)
+
+            if dc_level == EPDHardware.LOW:
+                for code in data:
+                    name = names.get(code, hex(code))
+                    summary['commands'][name] = summary['commands'].get(name, 0) + 1
+            else:
+                summary['data_bytes'] += len(data)
+        elif event == WAIT_EDGE:
+            summary['wait_time'] += data[3]
+            summary['duration'] = timestamp + data[3]
+        elif event == SLEEP:
+            summary['sleep_time'] += data
+
+    return summary
+
+
+def replay(events, interface: EPD.DisplayInterface) -> int:
+    """
+    Replays trace events through a display interface, typically one driving a simulated backend, so the replay goes
+    through the driver's code paths. Pin writes, commands, data, reads and sleeps are replayed as recorded, the
+    interface writing the DC pin itself for the commands and data, and setting the pins up when created. Edge waits are
+    replayed as waits for the awaited level. When the trace reads BUSY idle while the device is still busy, the replay
+    waits for it so later events find the device in the recorded state.
+
+    :param events: The events, as yielded by read_trace.
+    :param interface: The display interface to replay the events through.
+    :type interface: EPD.DisplayInterface
+    :return The number of BUSY reads that did not match the trace.
+    :rtype int
+    """
+    dc_level = EPDHardware.LOW
+    divergences = 0
+
+    for event, timestamp, data in events:
+        if event == OUTPUT:
+            pin, value = data
+
+            if pin == interface.DC_PIN:
+                dc_level = value
+            else:
+                interface.write_pin(pin, value)
+        elif event == INPUT:
+            pin, value = data
+
+            if interface.read_pin(pin) != value:
+                divergences += 1
+
+                if pin == interface.BUSY_PIN and value == EPDHardware.HIGH:
+                    interface.wait_for_pin(pin, value, interface.WT_BUSY_TIMEOUT)
+        elif event == SPI_WRITE:
+            if dc_level == EPDHardware.LOW:
+                for code in data:
+                    interface.send_command(code, False)
+            else:
+                interface.send_data_buffer(data)
+        elif event == SPI_READ:
+            interface.read_data(len(data))
+        elif event == WAIT_EDGE:
+            pin, rising, timeout, _ = data
+            interface.wait_for_pin(pin, rising, timeout)
+        elif event == SLEEP:
+            interface.sleep(data)
+
+    return divergences
@@ -0,0 +1,239 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# Active tracer, None while tracing is disabled (see enable).
+_tracer = None
+
+
+class Tracer:
+    def __init__(self, path: str, clock=time.monotonic, process_name=None):
+        """
+        Creates a Tracer object. Spans are written to a file in the Chrome trace event format as they end, as complete
+        events in a JSON array, so a trace can be opened in Perfetto (ui.perfetto.dev) or chrome://tracing even if the
+        process did not close it: both accept the array without its closing bracket.
+
+        :param path: The path of the trace file.
+        :type path: str
+        :param clock: Reads the time of the spans (s). The default monotonic clock is shared by the processes of the
+        machine, so their traces can be merged.
+        :param process_name: The name of the process in the trace, default is none.
+        :type process_name: str
+        """
+        self.__clock = clock
+        self.__pid = os.getpid()
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'w')
+        self.__file.write('[\n')
+
+        # Threads named in the trace, by native ID.
+        self.__threads = set()
+
+        if process_name is not None:
+            self.__write({'name': 'process_name', 'ph': 'M', 'pid': self.__pid, 'args': {'name': process_name}})
+
+    @property
+    def clock(self):
+        """
+        Getter for the clock of the spans.
+        """
+        return self.__clock
+
+    def __write(self, event: dict):
+        """
+        Writes an event to the trace file, the lock being held.
+
+        :param event: The trace event.
+        :type event: dict
+        """
+        self.__file.write(json.dumps(event, separators=(',', ':')) + ',\n')
+
+    def record(self, name: str, category: str, start: float, end: float, args=None):
+        """
+        Writes a span to the trace file, from any thread.
+
+        :param name: The name of the span.
+        :type name: str
+        :param category: The category of the span.
+        :type category: str
+        :param start: The start of the span, on the tracer's clock (s).
+        :type start: float
+        :param end: The end of the span, on the tracer's clock (s).
+        :type end: float
+        :param args: The arguments shown with the span, default is none.
+        :type args: dict
+        """
+        thread_id = threading.get_native_id()
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                 'pid': self.__pid, 'tid': thread_id}
+
+        if args:
+            event['args'] = args
+
+        with self.__lock:
+            if self.__file.closed:
+                return
+
+            if thread_id not in self.__threads:
+                self.__threads.add(thread_id)
+                self.__write({'name': 'thread_name', 'ph': 'M', 'pid': self.__pid, 'tid': thread_id,
+                              'args': {'name': threading.current_thread().name}})
+
+            self.__write(event)
+
+    def flush(self):
+        """
+        Flushes the trace file.
+        """
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.flush()
+
+    def close(self):
+        """
+        Closes the JSON array and the trace file.
+        """
+        with self.__lock:
+            if self.__file.closed:
+                return
+
+            # An empty metadata event, so the last event is not followed by a comma.
+            self.__file.write(json.dumps({'name': 'trace_end', 'ph': 'M', 'pid': self.__pid}) + '\n]\n')
+            self.__file.close()
+
+
+class Span:
+    __slots__ = ('__tracer', '__name', '__category', '__args', '__start')
+
+    def __init__(self, tracer: Tracer, name: str, category: str, args: dict):
+        """
+        Creates a Span object: a context manager recording the time spent in its block. A block left by an exception
+        records the exception's type.
+
+        :param tracer: The tracer the span is written to.
+        :type tracer: Tracer
+        :param name: The name of the span.
+        :type name: str
+        :param category: The category of the span.
+        :type category: str
+        :param args: The arguments shown with the span.
+        :type args: dict
+        """
+        self.__tracer = tracer
+        self.__name = name
+        self.__category = category
+        self.__args = args
+        self.__start = None
+
+    def __enter__(self) -> 'Span':
+        self.__start = self.__tracer.clock()
+
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is not None:
+            self.__args['error'] = exception_type.__name__
+
+        self.__tracer.record(self.__name, self.__category, self.__start, self.__tracer.clock(), self.__args)
+
+
+class NullSpan:
+    """
+    Span of a disabled tracing: a context manager doing nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        pass
+
+
+# The span returned while tracing is disabled, shared so no object is created.
+_NULL_SPAN = NullSpan()
+
+
+def span(name: str, category='epd', **args):
+    """
+    Creates a span around a block, as a context manager: with EPDTracing.span('name'): ... While tracing is disabled, a
+    shared span doing nothing is returned, so the hooks can stay in place at the cost of a call.
+
+    :param name: The name of the span.
+    :type name: str
+    :param category: The category of the span.
+    :type category: str
+    :param args: The arguments shown with the span.
+    :return The span.
+    :rtype Span or NullSpan
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+
+    return Span(_tracer, name, category, args)
+
+
+def traced(name: str, category='epd'):
+    """
+    Decorates a function so its calls are spans (see span).
+
+    :param name: The name of the spans.
+    :type name: str
+    :param category: The category of the spans.
+    :type category: str
+    :return The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+
+            with Span(_tracer, name, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable(path: str, clock=time.monotonic, process_name=None) -> Tracer:
+    """
+    Enables tracing, closing the trace of a previous tracer.
+
+    :param path: The path of the trace file (see Tracer).
+    :type path: str
+    :param clock: Reads the time of the spans (s).
+    :param process_name: The name of the process in the trace.
+    :type process_name: str
+    :return The tracer.
+    :rtype Tracer
+    """
+    global _tracer
+
+    disable()
+    _tracer = Tracer(path, clock, process_name)
+
+    return _tracer
+
+
+def disable():
+    """
+    Disables tracing and closes the trace file, if tracing is enabled.
+    """
+    global _tracer
+
+    tracer, _tracer = _tracer, None
+
+    if tracer is not None:
+        tracer.close()
+
+
+def flush():
+    """
+    Flushes the trace file, if tracing is enabled.
+    """
+    if _tracer is not None:
+        _tracer.flush()
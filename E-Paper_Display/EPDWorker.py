@@ -0,0 +1,107 @@
+import concurrent.futures
+import itertools
+import queue
+import threading
+
+# Priority classes, lower runs first: user triggered operations go ahead of periodic ones.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+PRIORITIES = {
+    'interactive': INTERACTIVE,
+    'background': BACKGROUND
+}
+
+
+class HardwareWorker:
+    def __init__(self, name='EPDHardware'):
+        """
+        Creates a HardwareWorker object. The worker owns the display: every operation touching the hardware is queued
+        and run by its single thread, so the callers (typically the service's event loop) never block on the device.
+        Operations run by priority class, then in submission order. Queued operations can be cancelled through their
+        future.
+
+        :param name: The name of the worker's thread.
+        :type name: str
+        """
+        self.__queue = queue.PriorityQueue()
+        self.__sequence = itertools.count()
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__current = None
+
+    @property
+    def pending(self) -> int:
+        """
+        Getter for the number of queued operations, cancelled ones included and the running one excluded.
+
+        :rtype int
+        """
+        return self.__queue.qsize()
+
+    @property
+    def current(self) -> str:
+        """
+        Getter for the name of the running operation, None if the worker is idle.
+
+        :rtype str
+        """
+        return self.__current
+
+    def start(self):
+        """
+        Starts the worker's thread.
+        """
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the worker once the queued operations are done.
+
+        :param timeout: The maximum waiting time, None to wait until the worker stops (s).
+        :type timeout: float
+        """
+        # After every queued operation, whatever its class.
+        self.__queue.put((BACKGROUND + 1, next(self.__sequence), None))
+        self.__thread.join(timeout)
+
+    def submit(self, name: str, function, *args, priority=BACKGROUND) -> concurrent.futures.Future:
+        """
+        Queues an operation.
+
+        :param name: The name of the operation, reported by current while it runs.
+        :type name: str
+        :param function: The operation.
+        :param args: The arguments of the operation.
+        :param priority: The priority class, INTERACTIVE or BACKGROUND.
+        :type priority: int
+        :return The future of the operation's result, usable from asyncio with asyncio.wrap_future.
+        :rtype concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        self.__queue.put((priority, next(self.__sequence), (name, function, args, future)))
+
+        return future
+
+    def __run(self):
+        """
+        Runs the queued operations until stopped.
+        """
+        while True:
+            operation = self.__queue.get()[2]
+
+            if operation is None:
+                return
+
+            name, function, args, future = operation
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.__current = name
+
+            try:
+                future.set_result(function(*args))
+            except BaseException as exception:
+                future.set_exception(exception)
+            finally:
+                self.__current = None
@@ -0,0 +1,370 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import PIL
+from PIL import Image
+
+import EPD
+import EPDClient
+import EPDPacking
+import EPDRefreshPolicy
+import EPDSimulator
+import EPD_service
+import SevenFiveEPD
+
+# The application's directory goes first so its EPDFrame module is used, the SevenFiveEPD and EPDExceptions modules
+# both directories have are already loaded from this one.
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'EPDApp')
+sys.path.insert(0, APP_PATH)
+
+from frames.time import TimeFrame
+from frames.wallpaper import WallpaperFrame
+
+# Stages, in pipeline order. Simulated stages are measured on the simulated panel's clock, the other ones on the host.
+STAGES = [
+    ('render', 'Frame.render: regions drawing'),
+    ('save', 'Frame.save: BMP encoding'),
+    ('decode', 'Image.open and load in the service'),
+    ('pack', 'EPDPacking.pack_image'),
+    ('encode_raw', 'raw frame packing and encoding in the client'),
+    ('decode_raw', 'raw frame decoding in the service'),
+    ('transfer', 'SPI transfer calls'),
+    ('transfer_bus', 'SPI bus time (simulated)'),
+    ('refresh', 'panel refresh (simulated)'),
+    ('command', 'EPDClient.update round trip, forced, frame file'),
+    ('end_to_end', 'Frame.display round trip, inline frame'),
+    ('end_to_end_panel', 'panel time of Frame.display (simulated)')
+]
+
+# Regressions smaller than this are ignored, whatever the threshold (s).
+MIN_REGRESSION = 0.0002
+
+
+def frame_factories(frame_path: str, client: EPDClient.EPDClient) -> dict:
+    """
+    Lists the benchmarked frames.
+
+    :param frame_path: The path of the frame file, None to send the frames with the updates.
+    :type frame_path: str
+    :param client: The client the frames send their updates with.
+    :type client: EPDClient.EPDClient
+    :return (frame, prepare) factories by frame name, prepare updating the frame's content before an iteration.
+    :rtype dict
+    """
+    size = (SevenFiveEPD.width, SevenFiveEPD.height)
+
+    def time_frame():
+        frame = TimeFrame.TimeFrame(size, client, frame_path)
+
+        # A different minute each iteration, so the digits are actually redrawn.
+        return frame, lambda iteration: frame.update_regions(iteration * 60)
+
+    def wallpaper_frame():
+        return WallpaperFrame.WallpaperFrame(size, client, frame_path), lambda iteration: None
+
+    return {
+        'time': time_frame,
+        'wallpaper': wallpaper_frame
+    }
+
+
+def summarize(samples: list) -> dict:
+    """
+    Computes the statistics of a stage's samples.
+
+    :param samples: The samples (s).
+    :type samples: list
+    :return The median, mean, min and max (s).
+    :rtype dict
+    """
+    return {
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'min': min(samples),
+        'max': max(samples)
+    }
+
+
+def measure_stages(frame, prepare, frame_path: str, iterations: int) -> dict:
+    """
+    Times the stages of the pipeline one by one, in process, against a simulated panel on a virtual clock.
+
+    :param frame: The frame.
+    :type frame: EPDFrame.Frame
+    :param prepare: Updates the frame's content before an iteration.
+    :param frame_path: The path of the frame file.
+    :type frame_path: str
+    :param iterations: The number of iterations.
+    :type iterations: int
+    :return The samples by stage (s).
+    :rtype dict
+    """
+    simulator = EPDSimulator.SimulatedBackend()
+    interface = EPD.DisplayInterface(SevenFiveEPD.commands, simulator)
+    display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, interface, SevenFiveEPD.init_script,
+                          SevenFiveEPD.refresh_modes)
+    display.init()
+    display.set_refresh_mode(EPD.Display.DEFAULT_REFRESH_MODE)
+
+    samples = {name: [] for name in ('render', 'save', 'decode', 'pack', 'encode_raw', 'decode_raw', 'transfer',
+                                     'transfer_bus', 'refresh')}
+
+    for iteration in range(iterations):
+        prepare(iteration)
+
+        start = time.perf_counter()
+        frame.render(False)
+        rendered = time.perf_counter()
+        frame.save()
+        saved = time.perf_counter()
+        image = Image.open(frame_path)
+        image.load()
+        decoded = time.perf_counter()
+        data = EPDPacking.pack_image(image)
+        packed = time.perf_counter()
+
+        # The path of raw frames, replacing the save, decode and pack stages.
+        raw = EPDPacking.PackedFrame.from_image(image).encode()
+        raw_encoded = time.perf_counter()
+        EPDPacking.PackedFrame.decode(raw)
+        raw_decoded = time.perf_counter()
+
+        # Same sequence as Display.display_frame, split between the transfer and the refresh.
+        simulated_start = simulator.clock()
+        transfer_start = time.perf_counter()
+        interface.send_command('DATA_START_TRANSMISSION_1')
+        interface.send_data_buffer(data)
+        transferred = time.perf_counter()
+        simulated_transferred = simulator.clock()
+        interface.send_command('DISPLAY_REFRESH')
+        display.wait_until_idle()
+
+        samples['render'].append(rendered - start)
+        samples['save'].append(saved - rendered)
+        samples['decode'].append(decoded - saved)
+        samples['pack'].append(packed - decoded)
+        samples['encode_raw'].append(raw_encoded - packed)
+        samples['decode_raw'].append(raw_decoded - raw_encoded)
+        samples['transfer'].append(transferred - transfer_start)
+        samples['transfer_bus'].append(simulated_transferred - simulated_start)
+        samples['refresh'].append(simulator.clock() - simulated_transferred)
+
+    simulator.close()
+
+    return samples
+
+
+def measure_end_to_end(frame_name: str, frame_path: str, socket_path: str, iterations: int) -> dict:
+    """
+    Times the whole pipeline through the service, run in a thread against a simulated panel on a virtual clock.
+
+    :param frame_name: The name of the frame (see frame_factories).
+    :type frame_name: str
+    :param frame_path: The path of the frame file.
+    :type frame_path: str
+    :param socket_path: The path of the service socket.
+    :type socket_path: str
+    :param iterations: The number of iterations.
+    :type iterations: int
+    :return The samples by stage (s).
+    :rtype dict
+    """
+    simulator = EPDSimulator.SimulatedBackend()
+    interface = EPD.DisplayInterface(SevenFiveEPD.commands, simulator)
+    display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, interface, SevenFiveEPD.init_script,
+                          SevenFiveEPD.refresh_modes)
+    refresh_policy = EPDRefreshPolicy.RefreshPolicy(display.width, display.height, clock=interface.clock,
+                                                    **EPD_service.refresh_budgets)
+
+    epd_socket = EPD_service.create_socket(socket_path)
+    service = EPD_service.EPDService(display, refresh_policy, frame_path)
+    service_thread = threading.Thread(target=service.serve, args=(epd_socket,), daemon=True)
+    service_thread.start()
+
+    client = EPDClient.EPDClient(socket_path)
+    client.connect()
+    client.init()
+
+    # Frames sent with the updates, the forced updates read the frame file left by measure_stages.
+    frame, prepare = frame_factories(None, client)[frame_name]()
+    samples = {name: [] for name in ('command', 'end_to_end', 'end_to_end_panel')}
+
+    # Shown before each iteration, so the frame is never skipped as unchanged, even if its content is static.
+    blank = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 0)
+
+    for iteration in range(iterations):
+        prepare(iteration)
+        blank.save(frame_path)
+        client.update()
+
+        # The service is idle between commands, so its clock can be read from here.
+        simulated_start = simulator.clock()
+        start = time.perf_counter()
+        frame.display(False)
+        displayed = time.perf_counter()
+        simulated_displayed = simulator.clock()
+        client.update(True)
+        updated = time.perf_counter()
+
+        samples['end_to_end'].append(displayed - start)
+        samples['end_to_end_panel'].append(simulated_displayed - simulated_start)
+        samples['command'].append(updated - displayed)
+
+    client.disconnect()
+    service.stop()
+    service_thread.join()
+    simulator.close()
+
+    return samples
+
+
+def run(frame_names: list, iterations: int, seed: int) -> dict:
+    """
+    Runs the benchmark.
+
+    :param frame_names: The names of the benchmarked frames (see frame_factories).
+    :type frame_names: list
+    :param iterations: The number of iterations of each measurement.
+    :type iterations: int
+    :param seed: The seed of the wallpaper choice.
+    :type seed: int
+    :return The environment and the statistics of each stage by frame name.
+    :rtype dict
+    """
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'machine': platform.machine(),
+            'packing_kernel': EPDPacking.selected_kernel_name(),
+            'iterations': iterations
+        },
+        'frames': {}
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        frame_path = os.path.join(directory, 'frame.bmp')
+        socket_path = os.path.join(directory, 'epd.sock')
+
+        for frame_name in frame_names:
+            random.seed(seed)
+            frame, prepare = frame_factories(frame_path, None)[frame_name]()
+            samples = measure_stages(frame, prepare, frame_path, iterations)
+
+            random.seed(seed)
+            samples.update(measure_end_to_end(frame_name, frame_path, socket_path, iterations))
+
+            results['frames'][frame_name] = {name: summarize(samples[name]) for name, _ in STAGES}
+
+    return results
+
+
+def print_results(results: dict):
+    """
+    Prints the median of each stage.
+
+    :param results: The results, as returned by run.
+    :type results: dict
+    """
+    for frame_name, stages in results['frames'].items():
+        print(frame_name)
+
+        for name, description in STAGES:
+            print('  {:<18} {:>10.3f} ms  {}'.format(name, stages[name]['median'] * 1000, description))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares results with a baseline and prints the differences.
+
+    :param results: The results, as returned by run.
+    :type results: dict
+    :param baseline: The baseline results.
+    :type baseline: dict
+    :param threshold: The relative slowdown of a stage's median counted as a regression.
+    :type threshold: float
+    :return The regressed stages, as (frame name, stage name) tuples.
+    :rtype list
+    """
+    regressions = []
+
+    print('{:<28} {:>12} {:>12} {:>9}'.format('', 'baseline ms', 'current ms', 'delta'))
+
+    for frame_name, stages in results['frames'].items():
+        for name, _ in STAGES:
+            baseline_stage = baseline.get('frames', {}).get(frame_name, {}).get(name)
+
+            if baseline_stage is None:
+                continue
+
+            reference = baseline_stage['median']
+            current = stages[name]['median']
+            delta = (current - reference) / reference if reference else 0.0
+            regressed = current - reference > max(reference * threshold, MIN_REGRESSION)
+
+            if regressed:
+                regressions.append((frame_name, name))
+
+            print('{:<28} {:>12.3f} {:>12.3f} {:>+8.1%}{}'.format(frame_name + '.' + name, reference * 1000,
+                                                                 current * 1000, delta,
+                                                                 '  REGRESSION' if regressed else ''))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the update pipeline, from the frame drawing to the '
+                                                 'refresh of a simulated panel, stage by stage and end to end.')
+    parser.add_argument('--frames', nargs='+', choices=['time', 'wallpaper'], default=['time', 'wallpaper'])
+    parser.add_argument('--iterations', type=int, default=20, help='iterations of each measurement')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the wallpaper choice')
+    parser.add_argument('--output', default='bench_results.json', help='file the results are written to')
+    parser.add_argument('--baseline', help='results file the results are compared with')
+    parser.add_argument('--update-baseline', action='store_true', help='writes the results to the baseline file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown of a stage counted as a regression (default is 0.2)')
+
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Fonts and templates are loaded relatively to the application's directory.
+    os.chdir(APP_PATH)
+
+    results = run(args.frames, args.iterations, args.seed)
+    print_results(results)
+
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+
+    if baseline is None:
+        return
+
+    if args.update_baseline or not os.path.exists(baseline):
+        with open(baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+        print('Baseline written to ' + baseline)
+
+        return
+
+    with open(baseline) as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.threshold)
+
+    if regressions:
+        print(str(len(regressions)) + ' stage(s) regressed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
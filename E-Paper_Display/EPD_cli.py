@@ -1,20 +1,389 @@
 #!/usr/bin/python3
 
 import argparse
+import json
+import random
+import statistics
+import threading
+import time
 import EPDClient
+import EPDExceptions
+import EPDPacking
+import SevenFiveEPD
+
+# Commands of the bench mix, run by a bench client with a frame and its boxes (None for the whole display).
+BENCH_COMMANDS = {
+    'display': lambda epd_client, frame, boxes: epd_client.display(frame, boxes),
+    'nowait': lambda epd_client, frame, boxes: epd_client.display_nowait(frame, boxes),
+    'update': lambda epd_client, frame, boxes: epd_client.update_boxes(boxes, frame) if boxes else
+    epd_client.update(image=frame),
+    'status': lambda epd_client, frame, boxes: epd_client.status()
+}
+
+# Commands of the bench mix sending a frame, their outcome is the client's last_update.
+FRAME_COMMANDS = ('display', 'nowait', 'update')
+
+# Failures counted as errors by the bench, the other exceptions stop it.
+BENCH_ERRORS = (EPDClient.EPDClientConnectionException, EPDClient.EPDServiceException,
+                EPDExceptions.InvalidFrameException, EPDExceptions.InvalidDisplayStatusException, OSError)
 
 parser = argparse.ArgumentParser()
-parser.add_argument('command', help='init | update | sleep')
+parser.add_argument('command', help='init | update | display | sleep | status | stats | events | bench')
+parser.add_argument('--force', action='store_true',
+                    help='with update and display, refreshes even if the frame is unchanged')
+parser.add_argument('--socket', default='/var/run/epd.sock', help='path of the service socket')
+parser.add_argument('--timeout', type=float, default=EPDClient.DEFAULT_TIMEOUT, metavar='SECONDS',
+                    help='deadline of each request (default is ' + str(EPDClient.DEFAULT_TIMEOUT) + ' s)')
+
+bench_arguments = parser.add_argument_group('bench', 'load generator, run against a service driving a simulated panel '
+                                                     '(EPD_service.py --simulate --virtual-time)')
+bench_arguments.add_argument('--clients', type=int, default=4, help='number of concurrent clients (default is 4)')
+bench_arguments.add_argument('--duration', type=float, default=10, metavar='SECONDS',
+                             help='duration of the run (default is 10 s)')
+bench_arguments.add_argument('--requests', type=int,
+                             help='number of requests of the run, stopping before the duration if reached')
+bench_arguments.add_argument('--mix', default='display=8,nowait=1,status=1',
+                             help='relative weights of the commands, as command=weight pairs separated by commas, '
+                                  'among ' + ', '.join(BENCH_COMMANDS) + ' (default is display=8,nowait=1,status=1)')
+bench_arguments.add_argument('--frame-sizes', nargs='+', default=['full', '64x64'], metavar='SIZE',
+                             help='sizes of the changed region of the frames, picked at random: full for the whole '
+                                  'display or WIDTHxHEIGHT for a partial update (default is full 64x64)')
+bench_arguments.add_argument('--seed', type=int, default=0, help='seed of the commands and frames')
+bench_arguments.add_argument('--report', help='writes the report to this JSON file, - for the standard output')
 
 args = parser.parse_args()
 
-client = EPDClient.EPDClient()
+client = EPDClient.EPDClient(args.socket, timeout=args.timeout)
 client.connect()
 
+# Commands typed by a user go ahead of the periodic ones.
+client.set_priority(EPDClient.PRIORITY_INTERACTIVE)
+
+
+def print_events(epd_client: EPDClient.EPDClient):
+    """
+    Prints the events of the service as they arrive, until interrupted.
+
+    :param epd_client: The connected client.
+    :type epd_client: EPDClient.EPDClient
+    """
+    epd_client.subscribe()
+
+    try:
+        while True:
+            print(json.dumps(epd_client.next_event(), sort_keys=True), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    Parses the command mix of the bench.
+
+    :param mix: The command=weight pairs, separated by commas.
+    :type mix: str
+    :return The weights by command.
+    :rtype dict
+    """
+    weights = {}
+
+    for pair in mix.split(','):
+        command, _, weight = pair.partition('=')
+
+        if command not in BENCH_COMMANDS:
+            parser.error('Unknown bench command: ' + command)
+
+        try:
+            weights[command] = float(weight or 1)
+        except ValueError:
+            parser.error('Invalid weight: ' + pair)
+
+    if sum(weights.values()) <= 0:
+        parser.error('The mix weights must not all be zero')
+
+    return weights
+
+
+def parse_frame_size(frame_size: str) -> tuple:
+    """
+    Parses a frame size of the bench.
+
+    :param frame_size: full or WIDTHxHEIGHT.
+    :type frame_size: str
+    :return The width and height of the changed region, None for the whole display.
+    :rtype tuple
+    """
+    if frame_size == 'full':
+        return None
+
+    try:
+        width, height = (int(dimension) for dimension in frame_size.split('x'))
+    except ValueError:
+        parser.error('Invalid frame size: ' + frame_size)
+
+    if not (0 < width <= SevenFiveEPD.width and 0 < height <= SevenFiveEPD.height):
+        parser.error('Frame size out of the display: ' + frame_size)
+
+    return width, height
+
+
+def bench_frame(rng: random.Random, frame_size: tuple) -> (EPDPacking.PackedFrame, list):
+    """
+    Draws a bench frame: random pixels in a region at a random position, on a white background.
+
+    :param rng: The random generator of the bench client.
+    :type rng: random.Random
+    :param frame_size: The width and height of the region, None for the whole display.
+    :type frame_size: tuple
+    :return The frame and the boxes to refresh (None for the whole display).
+    :rtype (EPDPacking.PackedFrame, list)
+    """
+    width, height = frame_size or (SevenFiveEPD.width, SevenFiveEPD.height)
+    left = rng.randrange(SevenFiveEPD.width - width + 1)
+    top = rng.randrange(SevenFiveEPD.height - height + 1)
+    row_length = EPDPacking.stride(SevenFiveEPD.width)
+    bits = bytearray(b'\xff' * row_length * SevenFiveEPD.height)
+
+    # The region is widened to whole bytes.
+    first, last = left >> 3, (left + width + 7) >> 3
+
+    for y in range(top, top + height):
+        bits[y * row_length + first:y * row_length + last] = rng.randbytes(last - first)
+
+    frame = EPDPacking.PackedFrame(EPDPacking.pack(bits, SevenFiveEPD.width, SevenFiveEPD.height),
+                                   SevenFiveEPD.width, SevenFiveEPD.height)
+
+    return frame, None if frame_size is None else [(left, top, left + width, top + height)]
+
+
+def bench_client(epd_client: EPDClient.EPDClient, rng: random.Random, mix: dict, frame_sizes: list,
+                 take_request) -> dict:
+    """
+    Sends the requests of a bench client, one at a time.
+
+    :param epd_client: The client, connected.
+    :type epd_client: EPDClient.EPDClient
+    :param rng: The random generator of the client.
+    :type rng: random.Random
+    :param mix: The weights by command.
+    :type mix: dict
+    :param frame_sizes: The sizes of the changed regions (see parse_frame_size).
+    :type frame_sizes: list
+    :param take_request: Returns whether the client sends another request.
+    :return The latencies of the successful requests (s), the outcomes and the errors by command.
+    :rtype dict
+    """
+    samples = {command: {'latencies': [], 'outcomes': {}, 'errors': {}} for command in mix}
+    commands, weights = list(mix), list(mix.values())
+
+    while take_request():
+        command = rng.choices(commands, weights)[0]
+        frame, boxes = bench_frame(rng, rng.choice(frame_sizes)) if command in FRAME_COMMANDS else (None, None)
+        command_samples = samples[command]
+        start = time.perf_counter()
+
+        try:
+            BENCH_COMMANDS[command](epd_client, frame, boxes)
+        except BENCH_ERRORS as exception:
+            error = type(exception).__name__
+            command_samples['errors'][error] = command_samples['errors'].get(error, 0) + 1
+        else:
+            command_samples['latencies'].append(time.perf_counter() - start)
+            outcome = epd_client.last_update if command in FRAME_COMMANDS else 'ok'
+            command_samples['outcomes'][outcome] = command_samples['outcomes'].get(outcome, 0) + 1
+
+    return samples
+
+
+def latency_distribution(latencies: list) -> dict:
+    """
+    Computes the distribution of latency samples.
+
+    :param latencies: The samples (s).
+    :type latencies: list
+    :return The mean, median, 90th, 99th percentiles and max (s), as the app's measurements, None without samples.
+    :rtype dict
+    """
+    if not latencies:
+        return None
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+
+    return {
+        'mean': statistics.mean(latencies),
+        'p50': percentiles[49],
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': max(latencies)
+    }
+
+
+def bench(socket_path: str, clients: int, duration: float, requests: int, mix: dict, frame_sizes: list, seed: int,
+          timeout: float, epd_client=None) -> dict:
+    """
+    Runs concurrent clients, each on its own connection, sending a mix of commands to the service as fast as it
+    answers, and measures the latency of each request from the client's call to its return. The connections are in
+    the interactive priority class, as the other commands of the CLI.
+
+    :param socket_path: The path of the service socket.
+    :type socket_path: str
+    :param clients: The number of clients.
+    :type clients: int
+    :param duration: The duration of the run (s).
+    :type duration: float
+    :param requests: The number of requests of the run, None to run for the whole duration.
+    :type requests: int
+    :param mix: The weights by command.
+    :type mix: dict
+    :param frame_sizes: The sizes of the changed regions (see parse_frame_size).
+    :type frame_sizes: list
+    :param seed: The seed of the commands and frames.
+    :type seed: int
+    :param timeout: The deadline of each request (s).
+    :type timeout: float
+    :param epd_client: A connected client used as the first client, default is a new one.
+    :type epd_client: EPDClient.EPDClient
+    :return The run's parameters, duration and throughput (requests/s), and by command the number of requests, the
+    throughput, the outcomes, the errors and the latency distribution of the successful requests (s).
+    :rtype dict
+    """
+    bench_clients = [] if epd_client is None else [epd_client]
+
+    # The connections are opened before the run, which only measures requests.
+    while len(bench_clients) < clients:
+        bench_clients.append(EPDClient.EPDClient(socket_path, timeout=timeout))
+        bench_clients[-1].connect()
+
+    for load_client in bench_clients:
+        load_client.set_priority(EPDClient.PRIORITY_INTERACTIVE)
+
+    lock = threading.Lock()
+    issued = 0
+    results = []
+    start = time.perf_counter()
+
+    def take_request():
+        nonlocal issued
+
+        with lock:
+            if (requests is not None and issued >= requests) or time.perf_counter() - start >= duration:
+                return False
+
+            issued += 1
+
+            return True
+
+    def run_client(index):
+        rng = random.Random(seed + index)
+        results.append(bench_client(bench_clients[index], rng, mix, frame_sizes, take_request))
+
+    threads = [threading.Thread(target=run_client, args=(index,)) for index in range(clients)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    wall_duration = time.perf_counter() - start
+
+    # The caller's client stays connected.
+    for load_client in bench_clients[epd_client is not None:]:
+        load_client.disconnect()
+
+    report = {
+        'clients': clients,
+        'mix': mix,
+        'frame_sizes': [list(frame_size) if frame_size else 'full' for frame_size in frame_sizes],
+        'duration': wall_duration,
+        'requests': 0,
+        'errors': 0,
+        'commands': {}
+    }
+
+    for command in mix:
+        latencies = [latency for result in results for latency in result[command]['latencies']]
+        outcomes, errors = {}, {}
+
+        for result in results:
+            for outcome, count in result[command]['outcomes'].items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+
+            for error, count in result[command]['errors'].items():
+                errors[error] = errors.get(error, 0) + count
+
+        command_requests = len(latencies) + sum(errors.values())
+        report['requests'] += command_requests
+        report['errors'] += sum(errors.values())
+        report['commands'][command] = {
+            'requests': command_requests,
+            'throughput': command_requests / wall_duration,
+            'outcomes': outcomes,
+            'errors': errors,
+            'latency': latency_distribution(latencies)
+        }
+
+    report['throughput'] = report['requests'] / wall_duration
+
+    return report
+
+
+def print_bench_report(report: dict):
+    """
+    Prints a bench report.
+
+    :param report: The report, as returned by bench.
+    :type report: dict
+    """
+    print('{} requests from {} clients in {:.1f} s: {:.1f} requests/s, {} errors'.format(
+        report['requests'], report['clients'], report['duration'], report['throughput'], report['errors']))
+    print('{:<8} {:>8} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'command', 'requests', 'req/s', 'errors', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+
+    for command, results in report['commands'].items():
+        latency = results['latency'] or dict.fromkeys(('mean', 'p50', 'p90', 'p99', 'max'), float('nan'))
+        print('{:<8} {:>8} {:>8.1f} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}'.format(
+            command, results['requests'], results['throughput'], sum(results['errors'].values()),
+            *(latency[key] * 1000 for key in ('mean', 'p50', 'p90', 'p99', 'max'))))
+
+    for command, results in report['commands'].items():
+        details = sorted(results['outcomes'].items()) + sorted(results['errors'].items())
+
+        if details:
+            print(command + ': ' + ', '.join('{} {}'.format(count, name) for name, count in details))
+
+
+def run_bench():
+    """
+    Runs the bench with the command line arguments and reports it.
+    """
+    if args.clients < 1 or args.duration <= 0 or (args.requests is not None and args.requests < 1):
+        parser.error('The bench needs at least one client, one request and a positive duration')
+
+    report = bench(args.socket, args.clients, args.duration, args.requests, parse_mix(args.mix),
+                   [parse_frame_size(frame_size) for frame_size in args.frame_sizes], args.seed, args.timeout, client)
+
+    if args.report == '-':
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+        return
+
+    print_bench_report(report)
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+
+
 commands = {
     'init': client.init,
-    'update': client.update,
-    'sleep': client.sleep
+    'update': lambda: client.update(args.force) or print('Frame ' + client.last_update),
+    'display': lambda: client.display(force=args.force) or print('Frame ' + client.last_update),
+    'sleep': client.sleep,
+    'status': lambda: print(json.dumps(client.status(), indent=2, sort_keys=True)),
+    'stats': lambda: print(json.dumps(client.stats(), indent=2, sort_keys=True)),
+    'events': lambda: print_events(client),
+    'bench': run_bench
 }
 
 commands[args.command]()
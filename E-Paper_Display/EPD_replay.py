@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+
+import EPD
+import EPDSimulator
+import EPDTrace
+import SevenFiveEPD
+
+
+def print_summary(summary: dict):
+    """
+    Prints a trace summary.
+
+    :param summary: The summary, as returned by EPDTrace.summarize.
+    :type summary: dict
+    """
+    print(json.dumps(summary, indent=2, sort_keys=True))
+
+
+def flatten(summary: dict, prefix='') -> dict:
+    """
+    Flattens the nested counters of a trace summary.
+
+    :param summary: The summary, as returned by EPDTrace.summarize.
+    :type summary: dict
+    :param prefix: The prefix of the keys.
+    :type prefix: str
+    :return The counters by dotted key.
+    :rtype dict
+    """
+    values = {}
+
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + '.'))
+        else:
+            values[prefix + key] = value
+
+    return values
+
+
+parser = argparse.ArgumentParser(description='Inspects, replays and compares EPD driver traces.')
+subparsers = parser.add_subparsers(dest='action')
+subparsers.required = True
+
+summary_parser = subparsers.add_parser('summary', help='prints the statistics of a trace')
+summary_parser.add_argument('trace')
+
+replay_parser = subparsers.add_parser('replay', help='replays a trace against a simulated panel')
+replay_parser.add_argument('trace')
+replay_parser.add_argument('--realtime', action='store_true', help='replays in real time instead of a virtual clock')
+replay_parser.add_argument('--record', help='records the replay to this trace file')
+replay_parser.add_argument('--screen', help='saves the simulated panel to this image')
+
+compare_parser = subparsers.add_parser('compare', help='compares the statistics of two traces')
+compare_parser.add_argument('trace')
+compare_parser.add_argument('other_trace')
+
+args = parser.parse_args()
+
+if args.action == 'summary':
+    print_summary(EPDTrace.summarize(EPDTrace.read_trace(args.trace), SevenFiveEPD.commands))
+elif args.action == 'replay':
+    simulator = EPDSimulator.SimulatedBackend(realtime=args.realtime)
+    backend = EPDTrace.TraceRecorder(simulator, args.record) if args.record else simulator
+
+    start = simulator.clock()
+    divergences = EPDTrace.replay(EPDTrace.read_trace(args.trace), EPD.DisplayInterface(SevenFiveEPD.commands, backend))
+
+    print_summary({
+        'duration': simulator.clock() - start,
+        'busy_divergences': divergences,
+        'simulator': simulator.stats
+    })
+
+    if args.screen:
+        simulator.screen_image().save(args.screen)
+
+    backend.close()
+elif args.action == 'compare':
+    first = flatten(EPDTrace.summarize(EPDTrace.read_trace(args.trace), SevenFiveEPD.commands))
+    second = flatten(EPDTrace.summarize(EPDTrace.read_trace(args.other_trace), SevenFiveEPD.commands))
+
+    print('{:<40} {:>14} {:>14} {:>14}'.format('', 'first', 'second', 'delta'))
+
+    for key in sorted(set(first) | set(second)):
+        first_value = first.get(key, 0)
+        second_value = second.get(key, 0)
+
+        print('{:<40} {:>14.6g} {:>14.6g} {:>+14.6g}'.format(key, first_value, second_value,
+                                                           second_value - first_value))
@@ -1,126 +1,1329 @@
 #!/usr/bin/python3
 
-from PIL import Image
-
+import argparse
+import asyncio
+import io
+import itertools
+import json
 import os
 import logging
 import socket
 import stat
+import struct
+import time
 
 import EPD
 import EPDExceptions
+import EPDFrameCache
+import EPDFrameRing
+import EPDHardware
+import EPDMetrics
+import EPDPacking
+import EPDProtocol
+import EPDRefreshPolicy
+import EPDTracing
+import EPDWorker
 import SevenFiveEPD
 
 paths = {
     'frame': '/var/epd/frame.bmp',
+    'frame_ring': EPDFrameRing.DEFAULT_PATH,
+    'fingerprint': '/var/epd/panel.fingerprint',
     'socket': '/var/run/epd.sock',
-    'log': '/var/log/epd.log'
+    'log': '/var/log/epd.log',
+    'metrics': '/var/epd/metrics.prom'
 }
 epdGID = 1000
 
-display_interface = EPD.DisplayInterface(SevenFiveEPD.commands)
-display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, display_interface)
+# Ghosting budgets of the refresh policy (see EPDRefreshPolicy.RefreshPolicy).
+refresh_budgets = {
+    'max_partials': 20,
+    'max_partial_area': 2.0,
+    'max_fast_fulls': 3,
+    'max_age': 6 * 3600
+}
+
+# Idle power tiers, as (idle time (s), power state) tuples: once a display command is done, the display is powered
+# off, keeping its registers for a fast wake up, then put in deep sleep if it stays idle.
+power_tiers = [
+    (10, EPD.Display.POWERED_OFF),
+    (600, EPD.Display.DEEP_SLEEP)
+]
+
+# Steps timed in the update events (see EPDProtocol), None for the steps that did not happen.
+update_timings = ('queued', 'started', 'transferred', 'refresh_started', 'refreshed')
+
+# Metrics of the service, as (name, kind, description) tuples (see EPDMetrics). The host phases of the updates are
+# timed on the host's clock, the panel ones on the display's clock.
+metric_families = [
+    ('requests_total', EPDMetrics.COUNTER, 'Requests served, by command and status'),
+    ('request_duration_seconds', EPDMetrics.HISTOGRAM,
+     'Time from the reception of a request to its response, by command'),
+    ('update_phase_seconds', EPDMetrics.HISTOGRAM,
+     'Duration of the phases of the updates, by phase: queue, decode, pack (host), wake, transfer, refresh and busy '
+     '(panel)'),
+    ('refreshes_total', EPDMetrics.COUNTER, 'Display refreshes, by refresh of the refresh policy'),
+    ('power_transitions_total', EPDMetrics.COUNTER,
+     'Power operations of the display, by operation: init, power_on, power_off and sleep'),
+    ('superseded_updates_total', EPDMetrics.COUNTER, 'Queued updates superseded by newer ones'),
+    ('busy_seconds_total', EPDMetrics.COUNTER, 'Time spent waiting for the display\'s BUSY pin'),
+    ('transferred_bytes_total', EPDMetrics.COUNTER, 'Bytes sent to the display'),
+    ('frame_cache_lookups_total', EPDMetrics.COUNTER, 'Frame cache lookups, by result: hit or miss'),
+    ('frame_cache_frames', EPDMetrics.GAUGE, 'Frames in the frame cache'),
+    ('connections', EPDMetrics.GAUGE, 'Open connections'),
+    ('subscribers', EPDMetrics.GAUGE, 'Connections subscribed to the events'),
+    ('worker_pending', EPDMetrics.GAUGE, 'Operations queued in the hardware worker'),
+    ('power_state', EPDMetrics.GAUGE, 'Power state of the display: 1 for the current state, by state')
+]
+
+# Interval between two writes of the metrics file (s).
+metrics_interval = 15
+
+# Names of the commands and statuses in the metrics.
+command_names = {
+    EPDProtocol.INIT: 'init',
+    EPDProtocol.UPDATE: 'update',
+    EPDProtocol.SLEEP: 'sleep',
+    EPDProtocol.STATUS: 'status',
+    EPDProtocol.PRIORITY: 'priority',
+    EPDProtocol.DISPLAY: 'display',
+    EPDProtocol.SUBSCRIBE: 'subscribe',
+    EPDProtocol.STATS: 'stats'
+}
+legacy_command_names = {
+    b'0': 'init',
+    b'1': 'update',
+    b'2': 'sleep',
+    b'3': 'update',
+    b'4': 'update',
+    b'5': 'status',
+    b'6': 'priority'
+}
+status_names = {
+    EPDProtocol.OK: 'ok',
+    EPDProtocol.ERROR: 'error',
+    EPDProtocol.FRAME_ERROR: 'frame_error',
+    EPDProtocol.SLEEPING: 'sleeping',
+    EPDProtocol.UNCHANGED: 'unchanged',
+    EPDProtocol.SUPERSEDED: 'superseded',
+    EPDProtocol.PROTOCOL_ERROR: 'protocol_error',
+    EPDProtocol.NOT_CACHED: 'not_cached',
+    EPDProtocol.ACCEPTED: 'accepted'
+}
 
 logger = logging.getLogger('EPDService')
-logger.setLevel(logging.DEBUG)
 
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
 
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.INFO)
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
+def bounding_box(boxes: list) -> (int, int, int, int):
+    """
+    Computes the smallest box containing all the given boxes. Refreshing a single window is faster than refreshing
+    each box on its own since the refresh time does not depend on the window's size.
+
+    :param boxes: The boxes, as left, top, right (excluded) and bottom (excluded).
+    :type boxes: list
+    :return The bounding box.
+    :rtype (int, int, int, int)
+    """
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def load_frame(frame: bytes, frame_format: int):
+    """
+    Reads a frame. Raw frames are displayed as they are, the other formats are decoded by PIL, only imported then.
+
+    :param frame: The frame file.
+    :type frame: bytes
+    :param frame_format: The format of the frame file (see EPDProtocol), FORMAT_FILE to guess it from the file.
+    :type frame_format: int
+    :return The frame, a PackedFrame or a PIL image.
+    :raise ValueError: Raised if the frame cannot be read.
+    """
+    if frame_format == EPDProtocol.FORMAT_RAW or (frame_format == EPDProtocol.FORMAT_FILE and
+                                                  frame.startswith(EPDPacking.PackedFrame.MAGIC)):
+        return EPDPacking.PackedFrame.decode(frame)
 
-file_handler = logging.FileHandler(paths['log'])
-file_handler.setLevel(logging.WARNING)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+    from PIL import Image
 
-epd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        image = Image.open(io.BytesIO(frame))
+        image.load()
+    except OSError as exception:
+        raise ValueError(str(exception))
 
-try:
-    os.remove(paths['socket'])
-except OSError:
-    pass
+    return image
 
-epd_socket.bind(paths['socket'])
-os.chmod(paths['socket'], stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP | stat.S_IWGRP)
-os.chown(paths['socket'], -1, epdGID)
-epd_socket.listen(1)
 
-logger.info('Socket ready')
+def create_socket(path: str, gid=None, backlog=16) -> socket.socket:
+    """
+    Creates the listening socket of the service.
 
-# Waits for connection.
-while True:
-    connection_socket, connection_address = epd_socket.accept()
-    logger.info('New connection')
+    :param path: The path of the socket.
+    :type path: str
+    :param gid: The group allowed to use the socket, None to keep the default one.
+    :type gid: int
+    :param backlog: The number of connections waiting to be accepted.
+    :type backlog: int
+    :return The listening socket.
+    :rtype socket.socket
+    """
+    epd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
 
     try:
-        # Executes connection's commands.
-        while True:
-            command = connection_socket.recv(1)
+        os.remove(path)
+    except OSError:
+        pass
 
-            if not command:
-                break
+    epd_socket.bind(path)
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP | stat.S_IWGRP)
 
-            if command == b'0': # Init command.
-                logger.debug('Initializing display')
+    if gid is not None:
+        try:
+            os.chown(path, -1, gid)
+        except PermissionError:
+            logger.warning('Cannot change the socket group to ' + str(gid))
 
-                try:
-                    display.init()
-                except BaseException as exception:
-                    logger.error('Initialization failed: ' + str(exception))
-                    connection_socket.send(b'1') # Error code.
+    epd_socket.listen(backlog)
 
-                    continue
+    return epd_socket
 
-                connection_socket.send(b'0') # Success code.
-            elif command == b'1': # Update command.
-                logger.debug('Updating display')
 
-                try:
-                    frame = Image.open(paths['frame'])
-                except IOError as exception:
-                    logger.error('Error loading frame file: ' + str(exception))
-                    connection_socket.send(b'2') # Frame error code.
+class EPDService:
+    def __init__(self, display: EPD.Display, refresh_policy: EPDRefreshPolicy.RefreshPolicy, frame_path: str,
+                 on_update=None, fingerprint_path=None, worker=None, frame_ring_path=None, frame_cache=None,
+                 power_tiers=None, metrics=None, metrics_path=None, metrics_interval=None):
+        """
+        Creates an EPDService object. The service executes the commands received from its clients on the display,
+        serving many clients at once.
+        Updates of a frame the display already shows are skipped, the fingerprint of the shown frame being persisted
+        so this survives restarts. The frames are packed once and cached, clients can send the hash of a cached frame
+        instead of the frame.
+        Display commands wake the display up and leave its power to the service, which lowers it tier by tier while
+        the display is idle. The other commands leave the power to the client.
+        Updates can be answered as soon as they are queued, an event following once they are done, and connections can
+        subscribe to the events of the service (see EPDProtocol).
+        The service measures its commands and the phases of its updates (see stats), and can write its metrics to a
+        file periodically.
+
+        :param display: The display.
+        :type display: EPD.Display
+        :param refresh_policy: The policy choosing the refresh of each update.
+        :type refresh_policy: EPDRefreshPolicy.RefreshPolicy
+        :param frame_path: The path of the frame file.
+        :type frame_path: str
+        :param on_update: Called without argument after each successful update.
+        :param fingerprint_path: The path of the file keeping the fingerprint of the shown frame, None to keep it in
+        memory only.
+        :type fingerprint_path: str
+        :param worker: The worker running the hardware operations, default is a new one.
+        :type worker: EPDWorker.HardwareWorker
+        :param frame_ring_path: The path of the frame ring the clients write their frames to, None to only accept
+        frames sent with the updates or in the frame file.
+        :type frame_ring_path: str
+        :param frame_cache: The cache of the packed frames, default is a new one.
+        :type frame_cache: EPDFrameCache.FrameCache
+        :param power_tiers: The idle power tiers, as (idle time (s), power state) tuples sorted by time, default is the
+        module's power_tiers. An empty list keeps the display powered.
+        :type power_tiers: list
+        :param metrics: The metrics the families of the module's metric_families are declared in, default is new ones.
+        :type metrics: EPDMetrics.Metrics
+        :param metrics_path: The path of the file the metrics are written to in the Prometheus text format, None not to
+        write them.
+        :type metrics_path: str
+        :param metrics_interval: The interval between two writes of the metrics file, default is the module's
+        metrics_interval (s).
+        :type metrics_interval: float
+        """
+        self.__display = display
+        self.__refresh_policy = refresh_policy
+        self.__frame_path = frame_path
+        self.__on_update = on_update
+        self.__fingerprint_path = fingerprint_path
+        self.__frame_ring_path = frame_ring_path
+        self.__worker = worker or EPDWorker.HardwareWorker()
+        self.__frame_cache = EPDFrameCache.FrameCache() if frame_cache is None else frame_cache
+        self.__power_tiers = power_tiers if power_tiers is not None else globals()['power_tiers']
+        self.__metrics = EPDMetrics.Metrics() if metrics is None else metrics
+        self.__metrics_path = metrics_path
+        self.__metrics_interval = metrics_interval if metrics_interval is not None else globals()['metrics_interval']
+
+        for name, kind, description in metric_families:
+            self.__metrics.describe(name, kind, description)
+
+        # Open connections: the task serving each connection, by writer.
+        self.__connections = {}
+
+        # Timer of the next idle power tier, number of hardware commands received, telling a timer whether the display
+        # was used since it was armed, and number of wake ups by power state.
+        self.__power_timer = None
+        self.__activity = 0
+        self.__wakes = {EPD.Display.POWERED_OFF: 0, EPD.Display.DEEP_SLEEP: 0}
+
+        # Queued update that newer updates can supersede, and number of superseded updates.
+        self.__pending_update = None
+        self.__superseded = 0
+
+        # IDs of the updates, identifying their events, writers of the subscribed connections with the request ID of
+        # their subscribe request, and last published power state.
+        self.__update_ids = itertools.count(1)
+        self.__subscribers = {}
+        self.__power_state = display.power_state
+
+        # Set when serving, with the timer of the next write of the metrics file.
+        self.__loop = None
+        self.__stopped = None
+        self.__metrics_timer = None
+
+        if fingerprint_path is not None:
+            try:
+                with open(fingerprint_path) as fingerprint_file:
+                    display.fingerprint = fingerprint_file.read().strip() or None
+            except OSError:
+                pass
+
+    def __save_fingerprint(self):
+        """
+        Writes the fingerprint of the shown frame to the fingerprint file. An unknown fingerprint empties the file.
+        """
+        if self.__fingerprint_path is None:
+            return
+
+        try:
+            with open(self.__fingerprint_path, 'w') as fingerprint_file:
+                fingerprint_file.write(self.__display.fingerprint or '')
+        except OSError as exception:
+            logger.warning('Cannot save the frame fingerprint: ' + str(exception))
+
+    def status(self) -> dict:
+        """
+        Reads the state of the service without touching the hardware, so it answers even while the display refreshes.
+
+        :return The display's sleep and power states, wake ups by power state, refresh mode, frame fingerprint and busy
+        times (s), the worker's running operation and queue length, the number of superseded updates, the open and
+        subscribed connections, the refresh policy's state and the frame cache's statistics.
+        :rtype dict
+        """
+        return {
+            'sleeping': self.__display.is_sleeping,
+            'power_state': self.__display.power_state,
+            'wakes': dict(self.__wakes),
+            'refresh_mode': self.__display.refresh_mode,
+            'fingerprint': self.__display.fingerprint,
+            'last_busy_time': self.__display.last_busy_time,
+            'busy_time': self.__display.busy_time,
+            'worker': {
+                'current': self.__worker.current,
+                'pending': self.__worker.pending
+            },
+            'superseded': self.__superseded,
+            'connections': len(self.__connections),
+            'subscribers': len(self.__subscribers),
+            'refresh_policy': self.__refresh_policy.stats,
+            'frame_cache': self.__frame_cache.stats
+        }
+
+    def stats(self) -> dict:
+        """
+        Reads the metrics of the service (see the module's metric_families) without touching the hardware.
+
+        :return The metrics (see EPDMetrics.Metrics.snapshot).
+        :rtype dict
+        """
+        self.__collect_metrics()
+
+        return self.__metrics.snapshot()
+
+    def __collect_metrics(self):
+        """
+        Copies the counters and the states kept by the display, the frame cache and the service to the metrics.
+        """
+        frame_cache_stats = self.__frame_cache.stats
+
+        self.__metrics.set('superseded_updates_total', self.__superseded)
+        self.__metrics.set('busy_seconds_total', self.__display.busy_time)
+        self.__metrics.set('transferred_bytes_total', self.__display.bytes_sent)
+        self.__metrics.set('frame_cache_lookups_total', frame_cache_stats['hits'], result='hit')
+        self.__metrics.set('frame_cache_lookups_total', frame_cache_stats['misses'], result='miss')
+        self.__metrics.set('frame_cache_frames', frame_cache_stats['frames'])
+        self.__metrics.set('connections', len(self.__connections))
+        self.__metrics.set('subscribers', len(self.__subscribers))
+        self.__metrics.set('worker_pending', self.__worker.pending)
+
+        for power_state in (EPD.Display.POWERED, EPD.Display.POWERED_OFF, EPD.Display.DEEP_SLEEP):
+            self.__metrics.set('power_state', int(power_state == self.__display.power_state), state=power_state)
+
+    def __write_metrics(self):
+        """
+        Writes the metrics file from a thread of the event loop's executor, so the event loop does not wait for the
+        storage, then arms the timer of the next write.
+        """
+        self.__collect_metrics()
+        self.__loop.run_in_executor(None, self.__save_metrics)
+        self.__metrics_timer = self.__loop.call_later(self.__metrics_interval, self.__write_metrics)
+
+    def __save_metrics(self):
+        """
+        Writes the metrics to the metrics file.
+        """
+        try:
+            self.__metrics.write(self.__metrics_path)
+        except OSError as exception:
+            logger.warning('Cannot write the metrics: ' + str(exception))
+
+    def serve(self, epd_socket: socket.socket):
+        """
+        Serves clients until stopped (see serve_forever).
+
+        :param epd_socket: The listening socket.
+        :type epd_socket: socket.socket
+        """
+        asyncio.run(self.serve_forever(epd_socket))
+
+    async def serve_forever(self, epd_socket: socket.socket):
+        """
+        Accepts connections and executes their commands concurrently until stopped. The hardware operations of all the
+        connections are run in order by the hardware worker, the event loop only handles the connections.
+
+        :param epd_socket: The listening socket.
+        :type epd_socket: socket.socket
+        """
+        self.__loop = asyncio.get_running_loop()
+        self.__stopped = asyncio.Event()
+        self.__worker.start()
+
+        server = await asyncio.start_unix_server(self.__handle_connection, sock=epd_socket)
+
+        if self.__metrics_path is not None and self.__metrics_interval > 0:
+            self.__write_metrics()
+
+        try:
+            await self.__stopped.wait()
+        finally:
+            if self.__power_timer is not None:
+                self.__power_timer.cancel()
+
+            if self.__metrics_timer is not None:
+                self.__metrics_timer.cancel()
+
+            server.close()
+
+            # The clients see their connection closed and can reconnect to the next service.
+            for writer, task in list(self.__connections.items()):
+                writer.close()
+
+            if self.__connections:
+                await asyncio.wait(list(self.__connections.values()))
+
+            await server.wait_closed()
+            self.__worker.stop()
+
+            # Last metrics, once the worker is done.
+            if self.__metrics_timer is not None:
+                self.__collect_metrics()
+                self.__save_metrics()
+
+    def stop(self):
+        """
+        Stops serving, from any thread.
+        """
+        self.__loop.call_soon_threadsafe(self.__stopped.set)
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves a connection with the protocol chosen by its first byte: the handshake of the version 2 protocol (see
+        EPDProtocol), or a version 1 command.
+
+        :param reader: The connection's reader.
+        :type reader: asyncio.StreamReader
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        """
+        logger.info('New connection')
+        self.__connections[writer] = asyncio.current_task()
+
+        # Priority class of the connection's operations.
+        session = {'priority': EPDWorker.BACKGROUND}
 
-                    continue
+        try:
+            command = await reader.read(1)
+
+            if command == EPDProtocol.MAGIC[:1]:
+                await self.__serve_messages(reader, writer, session)
+            elif command:
+                await self.__serve_commands(command, reader, writer, session)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Also done when the connection's task is cancelled or fails, so a dead connection is never counted.
+            del self.__connections[writer]
+            writer.close()
+
+        logger.info('Connection closed')
+
+    async def __serve_commands(self, command: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               session: dict):
+        """
+        Executes a version 1 connection's commands, one at a time, until the connection is closed.
+
+        :param command: The first command.
+        :type command: bytes
+        :param reader: The connection's reader.
+        :type reader: asyncio.StreamReader
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        :param session: The connection's state.
+        :type session: dict
+        """
+        while command:
+            writer.write(await self.execute(command, reader, session))
+            await writer.drain()
+
+            command = await reader.read(1)
+
+    async def __serve_messages(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, session: dict):
+        """
+        Completes the handshake of a version 2 connection, then executes its requests concurrently until the
+        connection is closed. Requests start in the order they are received, so the hardware operations of a
+        pipeline run in order, and each response is sent as soon as it is ready.
+
+        :param reader: The connection's reader, its first byte read.
+        :type reader: asyncio.StreamReader
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        :param session: The connection's state.
+        :type session: dict
+        """
+        handshake = EPDProtocol.MAGIC[:1] + await reader.readexactly(len(EPDProtocol.MAGIC))
+
+        if handshake != EPDProtocol.handshake():
+            logger.warning('Unsupported handshake: ' + repr(handshake))
+
+            return
+
+        writer.write(EPDProtocol.handshake())
+        requests = set()
+
+        # Pending requests and updates, the connection's writer for the events.
+        session['tasks'] = requests
+        session['writer'] = writer
+
+        try:
+            while True:
+                header = await reader.readexactly(EPDProtocol.HEADER.size)
 
                 try:
-                    display.display_frame(frame.load())
+                    payload_length, request_id, opcode = EPDProtocol.decode_header(header)
                 except ValueError as exception:
-                    logger.error('Error processing frame: ' + str(exception))
-                    connection_socket.send(b'2') # Frame error code.
+                    # The next message cannot be found, the connection is closed.
+                    logger.warning(str(exception))
+                    writer.write(EPDProtocol.encode_message(EPDProtocol.HEADER.unpack(header)[1],
+                                                            EPDProtocol.PROTOCOL_ERROR, str(exception).encode()))
 
-                    continue
-                except EPDExceptions.InvalidDisplayStatusException as exception:
-                    logger.debug('Update attempted while display was sleeping')
-                    connection_socket.send(b'3') # Display status error code.
+                    break
 
-                    continue
-                except BaseException as exception:
-                    logger.error('Update failed: ' + str(exception))
-                    connection_socket.send(b'1') # Error code.
+                payload = await reader.readexactly(payload_length)
+                request = asyncio.create_task(self.__respond(writer, request_id, opcode, payload, session))
+                requests.add(request)
+                request.add_done_callback(requests.discard)
+        except asyncio.IncompleteReadError as exception:
+            if exception.partial:
+                logger.warning('Connection closed in the middle of a message')
+        finally:
+            self.__subscribers.pop(writer, None)
 
-                    continue
+            # Operations already queued run anyway, their responses are sent if the client still listens.
+            while requests:
+                await asyncio.wait(set(requests))
 
-                connection_socket.send(b'0') # Success code.
-            elif command == b'2': # Sleep command.
-                logger.debug('Powering off display')
+    async def __respond(self, writer: asyncio.StreamWriter, request_id: int, opcode: int, payload: bytes,
+                        session: dict):
+        """
+        Executes a version 2 request and sends the response.
 
-                try:
-                    display.sleep()
-                except BaseException as exception:
-                    logger.error('Powering off failed: ' + str(exception))
-                    connection_socket.send(b'1') # Error code.
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        :param request_id: The request ID.
+        :type request_id: int
+        :param opcode: The opcode.
+        :type opcode: int
+        :param payload: The payload.
+        :type payload: bytes
+        :param session: The connection's state.
+        :type session: dict
+        """
+        status, response_payload = await self.execute_request(opcode, payload, session, request_id)
+
+        if writer.is_closing():
+            return
+
+        try:
+            writer.write(EPDProtocol.encode_message(request_id, status, response_payload))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def __run(self, name: str, function, *args, priority=EPDWorker.BACKGROUND):
+        """
+        Runs an operation in the hardware worker.
+
+        :param name: The name of the operation.
+        :type name: str
+        :param function: The operation.
+        :param args: The arguments of the operation.
+        :param priority: The priority class of the operation.
+        :type priority: int
+        :return The operation's result.
+        """
+        self.__touch()
+        result = await asyncio.wrap_future(self.__worker.submit(name, function, *args, priority=priority))
+        self.__publish_power_state()
+
+        return result
+
+    def __send_update_event(self, writer: asyncio.StreamWriter, request_id: int, update_id: int, task: asyncio.Task):
+        """
+        Sends the update event of a NOWAIT update once its task is done. A cancelled or failed task is reported with the
+        ERROR status, so the client is not left waiting for the event.
+
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        :param request_id: The request ID of the update.
+        :type request_id: int
+        :param update_id: The ID of the update.
+        :type update_id: int
+        :param task: The task waiting for the update (see __update).
+        :type task: asyncio.Task
+        """
+        if task.cancelled():
+            status, message = EPDProtocol.ERROR, 'Update cancelled'
+        elif task.exception() is not None:
+            logger.error('Update failed: ' + str(task.exception()))
+            status, message = EPDProtocol.ERROR, 'Update failed: ' + str(task.exception())
+        else:
+            self.__send_event(writer, request_id, task.result())
+
+            return
+
+        event = {'event': 'update', 'update': update_id, 'status': status, 'message': message,
+                 'timings': dict.fromkeys(update_timings)}
+        self.__publish(event)
+        self.__send_event(writer, request_id, event)
+
+    @staticmethod
+    def __send_event(writer: asyncio.StreamWriter, request_id: int, event: dict):
+        """
+        Sends an event to a connection, unless it is closed or does not read its messages fast enough.
+
+        :param writer: The connection's writer.
+        :type writer: asyncio.StreamWriter
+        :param request_id: The request ID the event is sent with.
+        :type request_id: int
+        :param event: The event (see EPDProtocol).
+        :type event: dict
+        """
+        if writer.is_closing():
+            return
+
+        if writer.transport.get_write_buffer_size() > EPDProtocol.MAX_MESSAGE_SIZE:
+            logger.warning('Event dropped for a slow connection: ' + event['event'])
+
+            return
+
+        writer.write(EPDProtocol.encode_message(request_id, EPDProtocol.EVENT, json.dumps(event).encode()))
+
+    def __publish(self, event: dict):
+        """
+        Sends an event to the subscribed connections.
+
+        :param event: The event (see EPDProtocol).
+        :type event: dict
+        """
+        for writer, request_id in list(self.__subscribers.items()):
+            self.__send_event(writer, request_id, event)
+
+    def __publish_power_state(self):
+        """
+        Publishes the power state of the display if it changed since it was last published.
+        """
+        power_state = self.__display.power_state
+
+        if power_state != self.__power_state:
+            self.__power_state = power_state
+            self.__publish({'event': 'power', 'power_state': power_state})
+
+    def __touch(self):
+        """
+        Records a hardware command, cancelling the idle power timer.
+        """
+        self.__activity += 1
+
+        if self.__power_timer is not None:
+            self.__power_timer.cancel()
+            self.__power_timer = None
+
+    def __arm_power_timer(self, tier=0):
+        """
+        Arms the timer of an idle power tier.
+
+        :param tier: The index of the tier, the timer counting from the previous tier.
+        :type tier: int
+        """
+        if tier >= len(self.__power_tiers):
+            return
+
+        delay = self.__power_tiers[tier][0] - (self.__power_tiers[tier - 1][0] if tier else 0)
+        self.__power_timer = self.__loop.call_later(delay, self.__enter_power_tier, tier, self.__activity)
+
+    def __enter_power_tier(self, tier: int, activity: int):
+        """
+        Queues the power change of an idle power tier and arms the timer of the next one.
+
+        :param tier: The index of the tier.
+        :type tier: int
+        :param activity: The number of hardware commands when the timer was armed.
+        :type activity: int
+        """
+        self.__power_timer = None
+        future = self.__worker.submit('power', self.set_power_state, self.__power_tiers[tier][1], activity,
+                                      priority=EPDWorker.BACKGROUND)
+        asyncio.wrap_future(future).add_done_callback(lambda _: self.__publish_power_state())
+        self.__arm_power_timer(tier + 1)
+
+    def __update(self, boxes: list, force: bool, priority: int, frame=None, frame_format=EPDProtocol.FORMAT_FILE,
+                 wake=False, update_id=None) -> asyncio.Task:
+        """
+        Queues an update, latest wins: the newest frame is the one to show, so an update still queued is superseded by
+        a newer one. The newer update inherits its boxes, forcing and priority class, and the superseded one is done
+        right away. The update is queued before this returns, so updates queued in a row run in order.
+
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes even if the display already shows the frame.
+        :type force: bool
+        :param priority: The priority class of the update.
+        :type priority: int
+        :param frame: The frame as sent in the update request, or the cached frame of a FORMAT_HASH update (see update),
+        None to read the service's frame file.
+        :type frame: bytes or EPDPacking.PackedFrame
+        :param frame_format: The format of the frame (see EPDProtocol).
+        :type frame_format: int
+        :param wake: Wakes the display up if needed, then arms the idle power timer once done.
+        :type wake: bool
+        :param update_id: The ID of the update, default is a new one.
+        :type update_id: int
+        :return The task waiting for the update, its result being the update event (see EPDProtocol).
+        :rtype asyncio.Task
+        """
+        update_id = next(self.__update_ids) if update_id is None else update_id
+        timings = dict.fromkeys(update_timings)
+        timings['queued'] = self.__display.clock()
+
+        self.__touch()
+        activity = self.__activity
+        pending = self.__pending_update
+
+        # Cancelling fails once the worker started the update.
+        if pending is not None and pending['future'].cancel():
+            boxes = None if boxes is None or pending['boxes'] is None else pending['boxes'] + boxes
+            force = force or pending['force']
+            priority = min(priority, pending['priority'])
+            wake = wake or pending['wake']
+
+            pending['superseded'].set_result((EPDProtocol.SUPERSEDED, 'Superseded by a newer update'))
+            self.__superseded += 1
+            logger.debug('Update superseded')
+
+        future = self.__worker.submit('update', self.update, boxes, force, frame, frame_format, wake, timings,
+                                      priority=priority)
+        superseded = self.__loop.create_future()
+        self.__pending_update = {
+            'future': future,
+            'boxes': boxes,
+            'force': force,
+            'priority': priority,
+            'wake': wake,
+            'superseded': superseded
+        }
+
+        self.__publish({'event': 'queued', 'update': update_id})
+
+        return asyncio.create_task(self.__complete_update(update_id, timings, asyncio.wrap_future(future), superseded,
+                                                          wake, activity))
+
+    async def __complete_update(self, update_id: int, timings: dict, result: asyncio.Future,
+                                superseded: asyncio.Future, wake: bool, activity: int) -> dict:
+        """
+        Waits for a queued update and publishes its event.
+
+        :param update_id: The ID of the update.
+        :type update_id: int
+        :param timings: The timings of the update, filled by the worker.
+        :type timings: dict
+        :param result: The result of the update's operation.
+        :type result: asyncio.Future
+        :param superseded: Set if a newer update supersedes this one.
+        :type superseded: asyncio.Future
+        :param wake: Arms the idle power timer once done.
+        :type wake: bool
+        :param activity: The number of hardware commands when the update was queued.
+        :type activity: int
+        :return The update event (see EPDProtocol).
+        :rtype dict
+        """
+        await asyncio.wait((result, superseded), return_when=asyncio.FIRST_COMPLETED)
+
+        if superseded.done():
+            status, message = superseded.result()
+        else:
+            status, message = result.result()
+
+            # Unless another command used the display meanwhile.
+            if wake and activity == self.__activity:
+                self.__arm_power_timer()
+
+        event = {'event': 'update', 'update': update_id, 'status': status, 'message': message, 'timings': timings}
+        self.__publish_power_state()
+        self.__publish(event)
+
+        return event
+
+    async def execute(self, command: bytes, reader: asyncio.StreamReader, session: dict) -> bytes:
+        """
+        Executes a version 1 command, measured as its version 2 counterpart.
+
+        :param command: The command.
+        :type command: bytes
+        :param reader: The connection's reader, used to receive the command's payload.
+        :type reader: asyncio.StreamReader
+        :param session: The connection's state: its priority class.
+        :type session: dict
+        :return The response: the result code, followed by a payload for some commands.
+        :rtype bytes
+        :raise asyncio.IncompleteReadError: Raised if the connection is closed before the command's payload is read.
+        """
+        start = time.perf_counter()
+        response = await self.__execute(command, reader, session)
+        self.__record_request(legacy_command_names.get(command, 'unknown'), int(response[:1]), start)
 
-                    continue
+        return response
 
-                connection_socket.send(b'0') # Success code.
+    def __record_request(self, command: str, status: int, start: float):
+        """
+        Records a served request in the metrics.
+
+        :param command: The name of the command.
+        :type command: str
+        :param status: The status of the response (see EPDProtocol).
+        :type status: int
+        :param start: The time the request was received, on the host's clock (s).
+        :type start: float
+        """
+        self.__metrics.observe('request_duration_seconds', time.perf_counter() - start, command=command)
+        self.__metrics.increment('requests_total', command=command, status=status_names.get(status, str(status)))
+
+    async def __execute(self, command: bytes, reader: asyncio.StreamReader, session: dict) -> bytes:
+        """
+        Executes a version 1 command.
+
+        :param command: The command.
+        :type command: bytes
+        :param reader: The connection's reader, used to receive the command's payload.
+        :type reader: asyncio.StreamReader
+        :param session: The connection's state: its priority class.
+        :type session: dict
+        :return The response: the result code, followed by a payload for some commands.
+        :rtype bytes
+        :raise asyncio.IncompleteReadError: Raised if the connection is closed before the command's payload is read.
+        """
+        if command == b'0': # Init command.
+            return self.__result_code(await self.__run('init', self.init, priority=session['priority']))
+        elif command == b'1' or command == b'3' or command == b'4': # Update, partial and forced update commands.
+            boxes = None
+
+            if command == b'3':
+                # Partial update payload: boxes count then left, top, right, bottom for each box.
+                boxes_count = (await reader.readexactly(1))[0]
+                boxes_data = await reader.readexactly(boxes_count * 8)
+                boxes = [struct.unpack_from('>4H', boxes_data, index * 8) for index in range(boxes_count)]
+
+            event = await self.__update(boxes, command == b'4', session['priority'])
+
+            return self.__result_code((event['status'], event['message']))
+        elif command == b'2': # Sleep command.
+            return self.__result_code(await self.__run('sleep', self.sleep, priority=session['priority']))
+        elif command == b'5': # Status command.
+            status = json.dumps(self.status()).encode()
+
+            # Success code, then the JSON status and its length.
+            return b'0' + struct.pack('>I', len(status)) + status
+        elif command == b'6': # Priority command.
+            priority = (await reader.readexactly(1))[0]
+
+            if priority not in EPDWorker.PRIORITIES.values():
+                return b'1' # Error code.
+
+            session['priority'] = priority
+
+            return b'0' # Success code.
+
+        return b'1' # Error code.
+
+    @staticmethod
+    def __result_code(result: (int, str)) -> bytes:
+        """
+        Converts the result of an operation to a version 1 result code, the message being dropped. Version 1 clients
+        fail on any code but success, so the unchanged and superseded updates, which are no failures, answer success
+        and their outcome is only logged.
+
+        :param result: The status (see EPDProtocol) and the message.
+        :type result: (int, str)
+        :return The result code.
+        :rtype bytes
+        """
+        status, message = result
+
+        if status in (EPDProtocol.UNCHANGED, EPDProtocol.SUPERSEDED):
+            logger.info('Version 1 update answered as successful: ' + message)
+            status = EPDProtocol.OK
+
+        return str(status).encode()
+
+    async def execute_request(self, opcode: int, payload: bytes, session: dict, request_id=0) -> (int, bytes):
+        """
+        Executes a version 2 request and records it in the metrics.
+
+        :param opcode: The opcode (see EPDProtocol).
+        :type opcode: int
+        :param payload: The request's payload.
+        :type payload: bytes
+        :param session: The connection's state: its priority class, pending tasks and writer.
+        :type session: dict
+        :param request_id: The request ID, the events of the request being sent with it.
+        :type request_id: int
+        :return The status and the response's payload (see __execute_request).
+        :rtype (int, bytes)
+        """
+        start = time.perf_counter()
+        status, response_payload = await self.__execute_request(opcode, payload, session, request_id)
+        self.__record_request(command_names.get(opcode, 'unknown'), status, start)
+
+        return status, response_payload
+
+    async def __execute_request(self, opcode: int, payload: bytes, session: dict, request_id: int) -> (int, bytes):
+        """
+        Executes a version 2 request.
+
+        :param opcode: The opcode (see EPDProtocol).
+        :type opcode: int
+        :param payload: The request's payload.
+        :type payload: bytes
+        :param session: The connection's state: its priority class, pending tasks and writer.
+        :type session: dict
+        :param request_id: The request ID, the events of the request being sent with it.
+        :type request_id: int
+        :return The status and the response's payload: the JSON status or metrics for the status and stats requests, the
+        update ID for accepted updates, the message for errors.
+        :rtype (int, bytes)
+        """
+        if opcode == EPDProtocol.INIT:
+            result = await self.__run('init', self.init, priority=session['priority'])
+        elif opcode == EPDProtocol.UPDATE or opcode == EPDProtocol.DISPLAY:
+            try:
+                boxes, force, frame_format, frame, nowait = EPDProtocol.decode_update(payload)
+            except ValueError as exception:
+                return EPDProtocol.PROTOCOL_ERROR, str(exception).encode()
+
+            # Looked up before queueing: an update whose frame is not cached never supersedes the pending one, and its
+            # client learns it right away. The frame is then held by the update, even if evicted before it runs.
+            if frame_format == EPDProtocol.FORMAT_HASH:
+                frame = self.__frame_cache.get(frame.hex())
+
+                if frame is None:
+                    return EPDProtocol.NOT_CACHED, b'Frame not cached'
+
+            update_id = next(self.__update_ids)
+            update = self.__update(boxes, force, session['priority'],
+                                   None if frame_format == EPDProtocol.FORMAT_FILE else frame, frame_format,
+                                   opcode == EPDProtocol.DISPLAY, update_id)
+
+            if nowait:
+                session['tasks'].add(update)
+                update.add_done_callback(session['tasks'].discard)
+                update.add_done_callback(lambda task: self.__send_update_event(session['writer'], request_id, update_id,
+                                                                               task))
+
+                return EPDProtocol.ACCEPTED, EPDProtocol.UPDATE_ID.pack(update_id)
+
+            event = await update
+            result = event['status'], event['message']
+        elif opcode == EPDProtocol.SLEEP:
+            result = await self.__run('sleep', self.sleep, priority=session['priority'])
+        elif opcode == EPDProtocol.STATUS:
+            return EPDProtocol.OK, json.dumps(self.status()).encode()
+        elif opcode == EPDProtocol.STATS:
+            return EPDProtocol.OK, json.dumps(self.stats()).encode()
+        elif opcode == EPDProtocol.PRIORITY:
+            if len(payload) != 1 or payload[0] not in EPDWorker.PRIORITIES.values():
+                return EPDProtocol.PROTOCOL_ERROR, b'Invalid priority class'
+
+            session['priority'] = payload[0]
+
+            return EPDProtocol.OK, b''
+        elif opcode == EPDProtocol.SUBSCRIBE:
+            if len(payload) != 1 or payload[0] not in (0, 1):
+                return EPDProtocol.PROTOCOL_ERROR, b'Invalid subscription'
+
+            if payload[0]:
+                self.__subscribers[session['writer']] = request_id
             else:
-                connection_socket.send(b'1') # Error code.
-    except BrokenPipeError:
-        pass
+                self.__subscribers.pop(session['writer'], None)
+
+            return EPDProtocol.OK, b''
+        else:
+            return EPDProtocol.PROTOCOL_ERROR, ('Unknown opcode: ' + str(opcode)).encode()
+
+        return result[0], result[1].encode()
+
+    def init(self) -> (int, str):
+        """
+        Initializes the display.
+
+        :return The status (see EPDProtocol) and a message.
+        :rtype (int, str)
+        """
+        logger.debug('Initializing display')
+
+        try:
+            self.__display.init()
+        except BaseException as exception:
+            logger.error('Initialization failed: ' + str(exception))
+
+            return EPDProtocol.ERROR, 'Initialization failed: ' + str(exception)
+
+        self.__metrics.increment('power_transitions_total', operation='init')
+
+        return EPDProtocol.OK, ''
+
+    def sleep(self) -> (int, str):
+        """
+        Powers the display off.
+
+        :return The status (see EPDProtocol) and a message.
+        :rtype (int, str)
+        """
+        logger.debug('Powering off display')
+        power_state = self.__display.power_state
+
+        try:
+            self.__display.sleep()
+        except BaseException as exception:
+            logger.error('Powering off failed: ' + str(exception))
+
+            return EPDProtocol.ERROR, 'Powering off failed: ' + str(exception)
+
+        if power_state != EPD.Display.DEEP_SLEEP:
+            self.__metrics.increment('power_transitions_total', operation='sleep')
+
+        return EPDProtocol.OK, ''
+
+    def set_power_state(self, power_state: str, activity=None) -> (int, str):
+        """
+        Lowers the power of the display.
+
+        :param power_state: The power state, EPD.Display.POWERED_OFF or DEEP_SLEEP.
+        :type power_state: str
+        :param activity: The number of hardware commands when the change was decided, the change is dropped if another
+        command was received since. None to change the power anyway.
+        :type activity: int
+        :return The status (see EPDProtocol) and a message.
+        :rtype (int, str)
+        """
+        if activity is not None and activity != self.__activity:
+            return EPDProtocol.OK, 'Display used meanwhile'
+
+        logger.debug('Idle display: ' + power_state)
+        previous_power_state = self.__display.power_state
+
+        try:
+            if power_state == EPD.Display.POWERED_OFF:
+                self.__display.power_off()
+            elif power_state == EPD.Display.DEEP_SLEEP:
+                self.__display.sleep()
+        except BaseException as exception:
+            logger.error('Power change failed: ' + str(exception))
+
+            return EPDProtocol.ERROR, 'Power change failed: ' + str(exception)
+
+        if self.__display.power_state != previous_power_state:
+            self.__metrics.increment('power_transitions_total',
+                                     operation='power_off' if power_state == EPD.Display.POWERED_OFF else 'sleep')
+
+        return EPDProtocol.OK, ''
+
+    def __read_frame_slot(self, frame_slot: EPDFrameRing.FrameSlot) -> EPDPacking.PackedFrame:
+        """
+        Reads a frame from the frame ring. The ring is mapped for each read, so a ring recreated by its writer is
+        picked up.
+
+        :param frame_slot: The slot and sequence of the frame.
+        :type frame_slot: EPDFrameRing.FrameSlot
+        :return The frame.
+        :rtype EPDPacking.PackedFrame
+        :raise ValueError: Raised if there is no frame ring or the frame cannot be read from it.
+        :raise OSError: Raised if the frame ring cannot be mapped.
+        """
+        if self.__frame_ring_path is None:
+            raise ValueError('No frame ring')
+
+        frame_ring = EPDFrameRing.FrameRing.open(self.__frame_ring_path)
+
+        try:
+            return frame_ring.read(frame_slot)
+        finally:
+            frame_ring.close()
+
+    @EPDTracing.traced('EPDService.update', 'service')
+    def update(self, boxes=None, force=False, frame=None, frame_format=EPDProtocol.FORMAT_FILE, wake=False,
+               timings=None) -> (int, str):
+        """
+        Displays a frame. Nothing is sent to the display if it already shows the frame, unless forced. The frame is
+        packed and cached, unless it comes from the cache.
+
+        :param boxes: The boxes to refresh, None to refresh the whole display.
+        :type boxes: list
+        :param force: Refreshes the whole display with the full waveform even if it already shows the frame, to clear
+        ghosting.
+        :type force: bool
+        :param frame: The frame file, the packed slot of a frame of the ring, the hash of a cached frame or the cached
+        frame itself, None to read the service's frame file.
+        :type frame: bytes or EPDPacking.PackedFrame
+        :param frame_format: The format of the frame (see EPDProtocol).
+        :type frame_format: int
+        :param wake: Wakes the display up if needed, by the shortest path (see EPD.Display.wake). An unchanged frame
+        does not wake the display.
+        :type wake: bool
+        :param timings: Filled with the time the update started and the times of its refresh (see
+        EPD.Display.last_refresh), on the display's clock.
+        :type timings: dict
+        :return The status (see EPDProtocol) and a message.
+        :rtype (int, str)
+        """
+        if timings is not None:
+            timings['started'] = self.__display.clock()
+
+            if timings['queued'] is not None:
+                self.__metrics.observe('update_phase_seconds', timings['started'] - timings['queued'], phase='queue')
+
+        logger.debug('Updating display' + (' (forced)' if force else '') +
+                     ('' if boxes is None else ' partially: ' + str(boxes)))
+
+        try:
+            start = time.perf_counter()
+
+            if frame is None:
+                with open(self.__frame_path, 'rb') as frame_file:
+                    frame = frame_file.read()
+
+            if frame_format == EPDProtocol.FORMAT_HASH:
+                if not isinstance(frame, EPDPacking.PackedFrame):
+                    frame = self.__frame_cache.get(frame.hex())
+
+                if frame is None:
+                    logger.debug('Frame not cached')
+
+                    return EPDProtocol.NOT_CACHED, 'Frame not cached'
+
+                fingerprint = EPDPacking.fingerprint(frame.data)
+            else:
+                if frame_format == EPDProtocol.FORMAT_SLOT:
+                    frame = self.__read_frame_slot(EPDFrameRing.FrameSlot(*EPDProtocol.SLOT.unpack(frame)))
+                else:
+                    frame = load_frame(frame, frame_format)
+
+                self.__metrics.observe('update_phase_seconds', time.perf_counter() - start, phase='decode')
+
+                if not isinstance(frame, EPDPacking.PackedFrame):
+                    start = time.perf_counter()
+                    frame = EPDPacking.PackedFrame.from_image(frame)
+                    self.__metrics.observe('update_phase_seconds', time.perf_counter() - start, phase='pack')
+
+                fingerprint = self.__frame_cache.put(frame)
+        except (OSError, ValueError) as exception:
+            logger.error('Error loading frame: ' + str(exception))
+
+            return EPDProtocol.FRAME_ERROR, 'Error loading frame: ' + str(exception)
+
+        if wake and not force and fingerprint == self.__display.fingerprint:
+            logger.debug('Frame unchanged')
+
+            return EPDProtocol.UNCHANGED, 'Frame unchanged'
+
+        try:
+            if wake:
+                start = self.__display.clock()
+                power_state = self.__display.wake()
+
+                if power_state != EPD.Display.POWERED:
+                    logger.debug('Display woken up from ' + power_state)
+                    self.__wakes[power_state] += 1
+                    self.__metrics.observe('update_phase_seconds', self.__display.clock() - start, phase='wake')
+                    self.__metrics.increment('power_transitions_total',
+                                             operation='power_on' if power_state == EPD.Display.POWERED_OFF else 'init')
+
+            window = self.__display.window(bounding_box(boxes)) if boxes and not force else None
+            refresh = EPDRefreshPolicy.RefreshPolicy.FULL if force else self.__refresh_policy.decide(window)
+            logger.debug('Refresh: ' + refresh)
+            busy_time = self.__display.busy_time
+            start = self.__display.clock()
+
+            if refresh == EPDRefreshPolicy.RefreshPolicy.PARTIAL:
+                refreshed = self.__display.display_partial(frame, window, not force)
+            else:
+                refreshed = self.__display.display_frame(frame, refresh == EPDRefreshPolicy.RefreshPolicy.FAST_FULL,
+                                                         not force)
+
+            if not refreshed:
+                logger.debug('Frame unchanged')
+
+                return EPDProtocol.UNCHANGED, 'Frame unchanged'
+
+            self.__refresh_policy.record(refresh, window)
+            self.__save_fingerprint()
+
+            last_refresh = self.__display.last_refresh
+            self.__metrics.increment('refreshes_total', refresh=refresh)
+            self.__metrics.observe('update_phase_seconds', last_refresh['transferred'] - start, phase='transfer')
+            self.__metrics.observe('update_phase_seconds', last_refresh['refreshed'] - last_refresh['refresh_started'],
+                                   phase='refresh')
+            self.__metrics.observe('update_phase_seconds', self.__display.busy_time - busy_time, phase='busy')
+
+            if timings is not None:
+                timings.update(last_refresh)
+        except ValueError as exception:
+            logger.error('Error processing frame: ' + str(exception))
+
+            return EPDProtocol.FRAME_ERROR, 'Error processing frame: ' + str(exception)
+        except EPDExceptions.InvalidDisplayStatusException as exception:
+            logger.debug('Update attempted while display was sleeping')
+
+            return EPDProtocol.SLEEPING, 'Display is sleeping'
+        except BaseException as exception:
+            logger.error('Update failed: ' + str(exception))
+
+            return EPDProtocol.ERROR, 'Update failed: ' + str(exception)
+
+        if self.__on_update is not None:
+            self.__on_update()
+
+        return EPDProtocol.OK, ''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--simulate', action='store_true', help='drive a simulated panel instead of the hardware')
+    parser.add_argument('--screen', help='with --simulate, saves the simulated panel to this image after each update')
+    parser.add_argument('--virtual-time', action='store_true',
+                        help='with --simulate, runs the simulated panel on a virtual clock so commands return '
+                             'without waiting for the panel')
+    parser.add_argument('--trace', help='records the hardware calls to this trace file (see EPD_replay.py)')
+    parser.add_argument('--trace-spans', metavar='PATH',
+                        help='records spans of the service, the driver and its transactions to this Chrome trace file, '
+                             'viewed as a timeline in Perfetto or chrome://tracing')
+    parser.add_argument('--socket', default=paths['socket'], help='path of the service socket')
+    parser.add_argument('--frame', default=paths['frame'], help='path of the frame file')
+    parser.add_argument('--frame-ring', default=paths['frame_ring'],
+                        help='path of the shared memory frame ring written by the clients')
+    parser.add_argument('--frame-cache', type=int, default=32, metavar='FRAMES',
+                        help='number of packed frames kept for the clients sending frame hashes (default is 32)')
+    parser.add_argument('--power-off-after', type=float, default=power_tiers[0][0], metavar='SECONDS',
+                        help='idle time after a display command before the display is powered off, its registers '
+                             'being kept (default is ' + str(power_tiers[0][0]) + ', a negative time disables it)')
+    parser.add_argument('--deep-sleep-after', type=float, default=power_tiers[1][0], metavar='SECONDS',
+                        help='idle time after a display command before the display is put in deep sleep (default is '
+                             + str(power_tiers[1][0]) + ', a negative time disables it)')
+    parser.add_argument('--temperature', type=float, metavar='CELSIUS',
+                        help='temperature the waveforms are chosen for, instead of reading the panel\'s sensor, which '
+                             'the Waveshare HAT does not connect')
+    parser.add_argument('--fingerprint', default=paths['fingerprint'],
+                        help='path of the file keeping the fingerprint of the displayed frame')
+    parser.add_argument('--log', default=paths['log'], help='path of the log file')
+    parser.add_argument('--metrics', default=paths['metrics'],
+                        help='path of the file the metrics are written to, in the Prometheus text format')
+    parser.add_argument('--metrics-interval', type=float, default=metrics_interval, metavar='SECONDS',
+                        help='interval between two writes of the metrics file (default is ' + str(metrics_interval) +
+                             ', 0 disables the file)')
+
+    args = parser.parse_args()
+    paths.update(socket=args.socket, frame=args.frame, frame_ring=args.frame_ring, fingerprint=args.fingerprint,
+                 log=args.log, metrics=args.metrics)
+
+    logger.setLevel(logging.DEBUG)
+
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(formatter)
+
+    file_handler = logging.FileHandler(paths['log'])
+    file_handler.setLevel(logging.WARNING)
+    file_handler.setFormatter(formatter)
+
+    # The driver's warnings, such as invalid temperature readings, go to the service's log.
+    for handled_logger in (logger, EPD.logger):
+        handled_logger.addHandler(stream_handler)
+        handled_logger.addHandler(file_handler)
+
+    if args.simulate:
+        import EPDSimulator
+
+        # Real time by default, so clients see the panel's actual latencies.
+        simulator = EPDSimulator.SimulatedBackend(realtime=not args.virtual_time)
+        backend = simulator
+    else:
+        simulator = None
+        backend = EPDHardware.RPiBackend()
+
+    if args.trace:
+        import EPDTrace
+
+        backend = EPDTrace.TraceRecorder(backend, args.trace)
+
+    def on_update():
+        if simulator is not None and args.screen:
+            simulator.screen_image().save(args.screen)
+
+        if args.trace:
+            backend.flush()
+
+        EPDTracing.flush()
+
+    if args.trace_spans:
+        # On the panel's clock, so the spans of a simulated panel on a virtual clock show its times.
+        EPDTracing.enable(args.trace_spans, backend.clock, 'EPD service')
+
+    display_interface = EPD.DisplayInterface(SevenFiveEPD.commands, backend)
+    display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, display_interface, SevenFiveEPD.init_script,
+                          SevenFiveEPD.refresh_modes, args.temperature)
+    refresh_policy = EPDRefreshPolicy.RefreshPolicy(display.width, display.height, clock=display_interface.clock,
+                                                    **refresh_budgets)
+
+    tiers = [(args.power_off_after, EPD.Display.POWERED_OFF), (args.deep_sleep_after, EPD.Display.DEEP_SLEEP)]
+    tiers = sorted(tier for tier in tiers if tier[0] >= 0)
+
+    epd_socket = create_socket(paths['socket'], epdGID)
+    logger.info('Socket ready')
+
+    try:
+        EPDService(display, refresh_policy, paths['frame'], on_update, paths['fingerprint'],
+                   frame_ring_path=paths['frame_ring'],
+                   frame_cache=EPDFrameCache.FrameCache(args.frame_cache), power_tiers=tiers,
+                   metrics_path=paths['metrics'], metrics_interval=args.metrics_interval).serve(epd_socket)
+    except KeyboardInterrupt:
+        logger.info('Service stopped')
+    finally:
+        EPDTracing.disable()
+
 
-    connection_socket.close()
-    logger.info('Connection closed')
+if __name__ == '__main__':
+    main()
@@ -37,5 +37,71 @@ commands = {
     'GET_STATUS': 0x71,
     'AUTO_MEASUREMENT_VCOM': 0x80,
     'READ_VCOM_VALUE': 0x81,
-    'VCM_DC_SETTING': 0x82
+    'VCM_DC_SETTING': 0x82,
+    'PARTIAL_WINDOW': 0x90,
+    'PARTIAL_IN': 0x91,
+    'PARTIAL_OUT': 0x92
+}
+
+# Power-on sequence. Each step is a command (name or code) followed by its data bytes, the WAIT_IDLE step waits for
+# the device to be idle.
+init_script = [
+    ('POWER_SETTING', 0x37, 0x00),
+    ('PANEL_SETTING', 0xCF, 0x08),
+    ('BOOSTER_SOFT_START', 0xc7, 0xcc, 0x28),
+    ('POWER_ON',),
+    ('WAIT_IDLE',),
+    ('PLL_CONTROL', 0x3c),
+    ('TEMPERATURE_CALIBRATION', 0x00),
+    ('VCOM_AND_DATA_INTERVAL_SETTING', 0x77),
+    ('TCON_SETTING', 0x22),
+    ('TCON_RESOLUTION', 0x02, 0x80, 0x01, 0x80),  # Source 640, gate 384.
+    ('VCM_DC_SETTING', 0x1E),  # Decided by LUT file.
+    (0xe5, 0x03)  # Flash mode.
+]
+
+
+def _lut(*groups) -> tuple:
+    """
+    Builds LUT register data from groups of a level select byte (2 bits per phase, first phase in the MSBs: 00 VCOM_DC,
+    01 VDH, 10 VDL, 11 VDHR), 4 phase lengths (frames) and a repeat count. The 10 groups of the register are padded with
+    zeros.
+
+    :return The LUT register data.
+    :rtype tuple
+    """
+    data = [byte for group in groups for byte in group]
+
+    return tuple(data + [0x00] * (60 - len(data)))
+
+
+def _fast_waveform(frames: int) -> list:
+    """
+    Builds the register script of a fast two-phase waveform.
+
+    :param frames: The length of each phase (frames), longer at low temperatures.
+    :type frames: int
+    :return The register script.
+    :rtype list
+    """
+    return [
+        ('PANEL_SETTING', 0xEF, 0x08),  # LUTs from registers.
+        ('LUT_FOR_VCOM', *_lut((0x00, frames, frames, 0x00, 0x00, 0x01))),
+        ('LUT_BLUE', *_lut((0x60, frames, frames, 0x00, 0x00, 0x01))),  # Black: VDH then VDL.
+        ('LUT_WHITE', *_lut((0x90, frames, frames, 0x00, 0x00, 0x01)))  # White: VDL then VDH.
+    ]
+
+
+# Waveforms by refresh mode, as (minimum temperature (included), maximum temperature (excluded), register script)
+# tuples (see EPD.Display). The full mode uses the OTP waveform set up by init_script. The fast waveforms must only be
+# used inside their temperature range.
+refresh_modes = {
+    'full': [
+        (None, None, [('PANEL_SETTING', 0xCF, 0x08)])  # LUTs from OTP.
+    ],
+    'fast': [
+        (5, 15, _fast_waveform(0x20)),
+        (15, 25, _fast_waveform(0x14)),
+        (25, 40, _fast_waveform(0x0C))
+    ]
 }
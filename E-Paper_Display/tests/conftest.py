@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# The service's modules are imported from their directory, as the scripts do.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import EPD
+import EPDClient
+import EPDRefreshPolicy
+import EPDSimulator
+import EPDWorker
+import EPD_service
+import SevenFiveEPD
+
+
+@pytest.fixture
+def simulator():
+    """
+    Simulated panel on a virtual clock.
+    """
+    backend = EPDSimulator.SimulatedBackend()
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def display(simulator):
+    """
+    Display driving the simulated panel.
+    """
+    return EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, EPD.DisplayInterface(SevenFiveEPD.commands, simulator),
+                       SevenFiveEPD.init_script, SevenFiveEPD.refresh_modes)
+
+
+class RunningService:
+    def __init__(self, directory, display: EPD.Display, clock, **options):
+        """
+        Creates a RunningService object: a service serving a display in a thread, without idle power tiers unless
+        given.
+
+        :param directory: The directory of the socket and frame file.
+        :param display: The display.
+        :type display: EPD.Display
+        :param clock: The clock of the display, returning the time in seconds.
+        :param options: The options of the service (see EPD_service.EPDService).
+        """
+        options.setdefault('power_tiers', [])
+
+        self.socket_path = str(directory / 'epd.sock')
+        self.frame_path = str(directory / 'frame.bmp')
+        self.worker = options.setdefault('worker', EPDWorker.HardwareWorker())
+        refresh_policy = EPDRefreshPolicy.RefreshPolicy(display.width, display.height, clock=clock,
+                                                        **EPD_service.refresh_budgets)
+        self.service = EPD_service.EPDService(display, refresh_policy, self.frame_path, **options)
+        self.__thread = threading.Thread(target=self.service.serve,
+                                         args=(EPD_service.create_socket(self.socket_path),), daemon=True)
+        self.__thread.start()
+        self.__clients = []
+        self.__stopped = False
+
+    def client(self, **options) -> EPDClient.EPDClient:
+        """
+        Creates a client connected to the service, disconnected when the service stops.
+
+        :param options: The options of the client (see EPDClient.EPDClient).
+        :return The client.
+        :rtype EPDClient.EPDClient
+        """
+        client = EPDClient.EPDClient(self.socket_path, **options)
+        client.connect()
+        self.__clients.append(client)
+
+        return client
+
+    def hold_worker(self) -> threading.Event:
+        """
+        Keeps the hardware worker busy, so the operations queued meanwhile stay pending.
+
+        :return The event releasing the worker.
+        :rtype threading.Event
+        """
+        release = threading.Event()
+        self.worker.submit('hold', release.wait, 10, priority=EPDWorker.INTERACTIVE)
+
+        while self.worker.current != 'hold':
+            time.sleep(0.001)
+
+        return release
+
+    def stop(self):
+        """
+        Disconnects the clients and stops the service, if not stopped yet.
+        """
+        if self.__stopped:
+            return
+
+        self.__stopped = True
+
+        for client in self.__clients:
+            client.disconnect()
+
+        self.service.stop()
+        self.__thread.join(10)
+
+
+@pytest.fixture
+def start_service(tmp_path, simulator, display):
+    """
+    Starts services serving the simulated display (see RunningService), stopped after the test.
+    """
+    services = []
+
+    def start(**options) -> RunningService:
+        services.append(RunningService(tmp_path, display, simulator.clock, **options))
+
+        return services[-1]
+
+    yield start
+
+    for running_service in services:
+        running_service.stop()
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+import EPD_bench
+
+
+@pytest.mark.parametrize('frame_name', ['time', 'wallpaper'])
+def test_end_to_end_refreshes_the_panel(tmp_path, monkeypatch, frame_name):
+    # The frames load their templates relative to the application's directory.
+    monkeypatch.chdir(EPD_bench.APP_PATH)
+    frame_path = str(tmp_path / 'frame.bmp')
+
+    # Same wallpaper in both measurements, as in EPD_bench.run.
+    random.seed(0)
+    frame, prepare = EPD_bench.frame_factories(frame_path, None)[frame_name]()
+    EPD_bench.measure_stages(frame, prepare, frame_path, 1)
+
+    random.seed(0)
+    samples = EPD_bench.measure_end_to_end(frame_name, frame_path, str(tmp_path / 'epd.sock'), 2)
+
+    assert all(sample > 0 for sample in samples['end_to_end_panel'])
+    assert len(samples['command']) == 2
+
+
+def test_run_summarizes_every_stage(monkeypatch):
+    monkeypatch.chdir(EPD_bench.APP_PATH)
+
+    results = EPD_bench.run(['time'], 2, 0)
+    stages = results['frames']['time']
+
+    assert results['environment']['iterations'] == 2
+    assert set(stages) == {name for name, _ in EPD_bench.STAGES}
+    assert all(stage['min'] <= stage['median'] <= stage['max'] for stage in stages.values())
+    # Simulated stages follow the panel's timing model.
+    assert stages['refresh']['min'] > stages['transfer_bus']['min'] > 0
+
+
+def test_summarize():
+    assert EPD_bench.summarize([3, 1, 2, 6]) == {'median': 2.5, 'mean': 3, 'min': 1, 'max': 6}
+
+
+def results(**medians) -> dict:
+    return {'frames': {'time': {name: {'median': median} for name, median in medians.items()}}}
+
+
+def test_compare_reports_regressions_above_the_threshold(capsys):
+    baseline = results(render=0.010, save=0.010, decode=0.010, pack=0)
+    current = results(render=0.013, save=0.0105, decode=0.008, pack=0.0001, transfer=0.010)
+
+    assert EPD_bench.compare(current, baseline, 0.2) == [('time', 'render')]
+    assert 'REGRESSION' in capsys.readouterr().out
+
+
+def test_compare_ignores_small_regressions():
+    # Far above the threshold, but under the minimal regression.
+    baseline = results(render=0.00001)
+    current = results(render=0.0001)
+
+    assert EPD_bench.compare(current, baseline, 0.1) == []
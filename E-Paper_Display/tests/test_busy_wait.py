@@ -0,0 +1,88 @@
+import pytest
+
+import EPD
+import EPDExceptions
+import EPDSimulator
+import SevenFiveEPD
+
+
+class PollingBackend(EPDSimulator.SimulatedBackend):
+    """
+    Simulated panel without GPIO edge detection, counting the pin reads.
+    """
+    def __init__(self):
+        super().__init__()
+        self.inputs = 0
+
+    def input(self, pin: int) -> int:
+        self.inputs += 1
+
+        return super().input(pin)
+
+    def wait_for_edge(self, pin: int, rising: bool, timeout: float):
+        raise NotImplementedError
+
+
+def start_refresh(backend) -> (EPD.Display, EPD.DisplayInterface):
+    interface = EPD.DisplayInterface(SevenFiveEPD.commands, backend)
+    display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, interface, SevenFiveEPD.init_script,
+                          SevenFiveEPD.refresh_modes)
+    display.init()
+    interface.send_command('DISPLAY_REFRESH')
+
+    return display, interface
+
+
+def refresh_duration() -> float:
+    backend = EPDSimulator.SimulatedBackend()
+    display, _ = start_refresh(backend)
+    start = backend.clock()
+    display.wait_until_idle()
+
+    return backend.clock() - start
+
+
+def test_edge_detection_returns_at_the_edge():
+    backend = EPDSimulator.SimulatedBackend()
+    display, _ = start_refresh(backend)
+    start = backend.clock()
+
+    assert display.is_busy
+
+    display.wait_until_idle()
+
+    assert not backend.is_busy
+    assert display.last_busy_time == pytest.approx(backend.clock() - start)
+    assert display.busy_time >= display.last_busy_time > 0
+
+
+def test_polling_overshoots_by_one_interval_at_most():
+    duration = refresh_duration()
+    backend = PollingBackend()
+    display, interface = start_refresh(backend)
+    backend.inputs = 0
+
+    display.wait_until_idle()
+
+    assert duration <= display.last_busy_time <= duration + interface.WT_STATE_LOOKUP
+    assert backend.inputs <= duration / interface.WT_STATE_LOOKUP + 16
+
+
+def test_busy_timeout():
+    backend = EPDSimulator.SimulatedBackend()
+    display, _ = start_refresh(backend)
+
+    with pytest.raises(EPDExceptions.DisplayBusyTimeoutException):
+        display.wait_until_idle(0.05)
+
+    assert display.last_busy_time == pytest.approx(0.05)
+    assert display.is_busy
+
+
+def test_idle_display_does_not_wait(simulator, display):
+    start = simulator.clock()
+
+    display.wait_until_idle()
+
+    assert simulator.clock() == start
+    assert display.last_busy_time == 0
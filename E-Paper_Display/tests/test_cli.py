@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'EPD_cli.py')
+
+
+def run_cli(socket_path: str, *arguments) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, CLI_PATH, '--socket', socket_path, *arguments], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
+
+
+def test_bench_opens_one_connection_per_client(start_service):
+    running_service = start_service()
+    bench = run_cli(running_service.socket_path, 'bench', '--clients', '2', '--duration', '1', '--report', '-')
+    connections = 0
+
+    while bench.poll() is None:
+        connections = max(connections, running_service.service.status()['connections'])
+        time.sleep(0.005)
+
+    report = json.loads(bench.stdout.read())
+
+    assert bench.returncode == 0
+    assert connections == 2
+    assert report['clients'] == 2
+    assert report['requests'] > 0 and report['errors'] == 0
+    assert set(report['commands']) <= {'display', 'nowait', 'status'}
+
+
+def test_bench_rejects_an_invalid_mix(start_service):
+    running_service = start_service()
+    bench = run_cli(running_service.socket_path, 'bench', '--mix', 'display=1,reboot=1')
+    bench.wait(10)
+
+    assert bench.returncode == 2
+    assert 'Unknown bench command: reboot' in bench.stderr.read()
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+
+import pytest
+from PIL import Image
+
+import EPDAsyncClient
+import EPDClient
+import EPDProtocol
+import SevenFiveEPD
+
+
+def create_image(index: int) -> Image:
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (index * 50, 0, index * 50 + 40, 40))
+
+    return image
+
+
+def test_requests_are_multiplexed_between_threads(start_service):
+    running_service = start_service()
+    client = running_service.client()
+    results = []
+
+    def request():
+        for _ in range(20):
+            results.append(client.status()['connections'])
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join(10)
+
+    assert results == [1] * 160
+
+
+def test_request_deadline(start_service):
+    running_service = start_service()
+    client = running_service.client(timeout=0.1)
+    release = running_service.hold_worker()
+
+    try:
+        with pytest.raises(EPDClient.EPDClientTimeoutException):
+            client.init()
+
+        # Requests not touching the hardware are still answered.
+        assert client.status()['worker']['current'] == 'hold'
+    finally:
+        release.set()
+
+    # The late response is dropped, the next requests are answered.
+    client.init()
+    assert client.status()['sleeping'] is False
+
+
+def test_client_reconnects_and_restores_its_session(start_service):
+    running_service = start_service()
+    client = EPDClient.EPDClient(running_service.socket_path, timeout=10)
+    client.connect()
+
+    try:
+        client.set_priority(EPDClient.PRIORITY_INTERACTIVE)
+        client.subscribe()
+        running_service.stop()
+
+        # The next service takes over the socket.
+        other_client = start_service().client()
+
+        assert client.status()['subscribers'] == 1
+        assert client.connected
+
+        other_client.display(create_image(0))
+
+        assert client.next_event(10)['event'] == 'queued'
+    finally:
+        client.disconnect()
+
+
+def test_client_without_reconnection_fails(start_service):
+    running_service = start_service()
+    client = EPDClient.EPDClient(running_service.socket_path, timeout=10, reconnect=False)
+    client.connect()
+    running_service.stop()
+
+    try:
+        with pytest.raises(EPDClient.EPDClientConnectionException):
+            client.status()
+    finally:
+        client.disconnect()
+
+
+def test_reconnection_deadline(start_service):
+    running_service = start_service()
+    client = EPDClient.EPDClient(running_service.socket_path, timeout=0.2)
+    client.connect()
+    running_service.stop()
+
+    try:
+        with pytest.raises(EPDClient.EPDClientTimeoutException):
+            client.status()
+    finally:
+        client.disconnect()
+
+
+def test_disconnected_client_fails():
+    client = EPDClient.EPDClient('/nonexistent/epd.sock')
+
+    with pytest.raises(EPDClient.EPDClientConnectionException):
+        client.status()
+
+    with pytest.raises(OSError):
+        client.connect()
+
+
+def test_async_client(start_service):
+    running_service = start_service()
+
+    async def run():
+        client = EPDAsyncClient.EPDAsyncClient(running_service.socket_path, timeout=10)
+        await client.connect()
+
+        try:
+            statuses = await asyncio.gather(*(client.status() for _ in range(8)))
+            updated = await client.display(create_image(0))
+            unchanged = await client.display(create_image(0))
+            update_id = await client.display_nowait(create_image(1))
+            event = await client.wait(update_id, 10)
+        finally:
+            await client.disconnect()
+
+        return statuses, updated, unchanged, event
+
+    statuses, updated, unchanged, event = asyncio.run(run())
+
+    assert all(status['connections'] == 1 for status in statuses)
+    assert updated and not unchanged
+    assert event['status'] == EPDProtocol.OK
+
+
+def test_async_client_deadline(start_service):
+    running_service = start_service()
+    release = running_service.hold_worker()
+
+    async def run():
+        client = EPDAsyncClient.EPDAsyncClient(running_service.socket_path, timeout=0.1)
+        await client.connect()
+
+        try:
+            await client.init()
+        finally:
+            await client.disconnect()
+
+    try:
+        with pytest.raises(EPDClient.EPDClientTimeoutException):
+            asyncio.run(run())
+    finally:
+        release.set()
@@ -0,0 +1,90 @@
+import threading
+
+from PIL import Image
+
+import EPDClient
+import EPDProtocol
+import EPDWorker
+import SevenFiveEPD
+
+SIZE = (SevenFiveEPD.width, SevenFiveEPD.height)
+FIRST_BOX = (0, 0, 64, 40)
+SECOND_BOX = (128, 0, 192, 40)
+
+
+def create_image(*boxes) -> Image:
+    image = Image.new('1', SIZE, 1)
+
+    for box in boxes:
+        image.paste(0, box)
+
+    return image
+
+
+def test_queued_update_is_superseded_by_a_newer_one(start_service, simulator):
+    running_service = start_service()
+    client = running_service.client()
+    client.display(create_image())
+    release = running_service.hold_worker()
+
+    first = client.display_nowait(create_image(FIRST_BOX), [FIRST_BOX])
+    second = client.display_nowait(create_image(FIRST_BOX, SECOND_BOX), [SECOND_BOX])
+    release.set()
+    first_event = client.wait(first, 10)
+    second_event = client.wait(second, 10)
+
+    assert first_event['status'] == EPDProtocol.SUPERSEDED
+    assert first_event['timings']['started'] is None
+    assert second_event['status'] == EPDProtocol.OK
+    # The newer update refreshes the boxes of the superseded one too.
+    assert simulator.screen_image().tobytes() == create_image(FIRST_BOX, SECOND_BOX).tobytes()
+    assert client.status()['superseded'] == 1
+
+
+def test_running_update_is_not_superseded(start_service):
+    started = threading.Event()
+    release = threading.Event()
+    running_service = start_service(on_update=lambda: started.set() or release.wait(10))
+    client = running_service.client()
+
+    first = client.display_nowait(create_image(FIRST_BOX))
+    # The first update is held by the worker, past the point it could be cancelled.
+    started.wait(10)
+    second = client.display_nowait(create_image(SECOND_BOX))
+    release.set()
+
+    assert client.wait(first, 10)['status'] == EPDProtocol.OK
+    assert client.wait(second, 10)['status'] == EPDProtocol.OK
+    assert client.status()['superseded'] == 0
+
+
+def test_interactive_updates_run_before_background_operations(start_service):
+    order = []
+    running_service = start_service(on_update=lambda: order.append('update'))
+    client = running_service.client()
+    client.set_priority(EPDClient.PRIORITY_INTERACTIVE)
+    release = running_service.hold_worker()
+
+    background = running_service.worker.submit('background', order.append, 'background', priority=EPDWorker.BACKGROUND)
+    update_id = client.display_nowait(create_image(FIRST_BOX))
+    release.set()
+
+    assert client.wait(update_id, 10)['status'] == EPDProtocol.OK
+    background.result(10)
+    assert order == ['update', 'background']
+
+
+def test_background_updates_run_in_order(start_service):
+    order = []
+    running_service = start_service(on_update=lambda: order.append('update'))
+    client = running_service.client()
+    client.set_priority(EPDClient.PRIORITY_BACKGROUND)
+    release = running_service.hold_worker()
+
+    background = running_service.worker.submit('background', order.append, 'background', priority=EPDWorker.BACKGROUND)
+    update_id = client.display_nowait(create_image(FIRST_BOX))
+    release.set()
+
+    assert client.wait(update_id, 10)['status'] == EPDProtocol.OK
+    background.result(10)
+    assert order == ['background', 'update']
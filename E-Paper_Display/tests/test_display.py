@@ -0,0 +1,67 @@
+import logging
+
+import pytest
+
+import EPD
+import EPDSimulator
+import SevenFiveEPD
+
+
+class UnwiredSensorBackend(EPDSimulator.SimulatedBackend):
+    """
+    Simulated panel whose data line is not connected, as on the Waveshare HAT: every read returns the same level.
+    """
+    def __init__(self, level: int):
+        super().__init__()
+        self.__level = level
+
+    def spi_read(self, size: int) -> bytes:
+        return bytes([self.__level]) * size
+
+
+def create_display(backend, temperature=None) -> EPD.Display:
+    return EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, EPD.DisplayInterface(SevenFiveEPD.commands, backend),
+                       SevenFiveEPD.init_script, SevenFiveEPD.refresh_modes, temperature)
+
+
+@pytest.mark.parametrize('temperature,mode', [(20.0, 'fast'), (10.5, 'fast'), (2.0, 'full'), (45.0, 'full')])
+def test_refresh_mode_follows_the_sensor(temperature, mode):
+    display = create_display(EPDSimulator.SimulatedBackend(temperature=temperature))
+
+    assert display.temperature == temperature
+    assert display.set_refresh_mode('fast') == mode
+
+
+@pytest.mark.parametrize('level', [0x00, 0xFF])
+def test_floating_sensor_reading_is_rejected(level, caplog):
+    display = create_display(UnwiredSensorBackend(level))
+
+    with pytest.raises(ValueError):
+        display.read_temperature()
+
+    with caplog.at_level(logging.WARNING, logger='EPD'):
+        assert display.temperature is None
+
+    assert 'No temperature sensor reading' in caplog.text
+    assert display.set_refresh_mode('fast') == 'full'
+
+
+def test_out_of_range_reading_is_rejected(caplog):
+    display = create_display(EPDSimulator.SimulatedBackend(temperature=80))
+
+    with caplog.at_level(logging.WARNING, logger='EPD'):
+        assert display.temperature is None
+
+    assert 'out of the sensor' in caplog.text
+
+
+def test_configured_temperature_overrides_the_sensor():
+    display = create_display(UnwiredSensorBackend(0xFF), temperature=20.0)
+
+    assert display.temperature == 20.0
+    assert display.set_refresh_mode('fast') == 'fast'
+
+    display.temperature_override = None
+    display.set_refresh_mode('full')
+
+    assert display.set_refresh_mode('fast') == 'full'
@@ -0,0 +1,149 @@
+import sys
+import threading
+import time
+
+from PIL import Image
+
+import EPDFrameCache
+import EPDPacking
+import EPDProtocol
+import SevenFiveEPD
+
+
+def create_frame(index: int) -> EPDPacking.PackedFrame:
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (index * 50, 0, index * 50 + 40, 40))
+
+    return EPDPacking.PackedFrame.from_image(image)
+
+
+def frame_hash(frame: EPDPacking.PackedFrame) -> bytes:
+    return bytes.fromhex(EPDPacking.fingerprint(frame.data))
+
+
+def test_least_recently_used_frame_is_evicted():
+    cache = EPDFrameCache.FrameCache(2)
+    first = cache.put(create_frame(0))
+    second = cache.put(create_frame(1))
+
+    assert cache.get(first) is not None
+
+    third = cache.put(create_frame(2))
+
+    assert second not in cache
+    assert first in cache and third in cache
+    assert cache.get(second) is None
+    assert cache.stats == {'frames': 2, 'capacity': 2, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = EPDFrameCache.FrameCache(0)
+    frame = create_frame(0)
+
+    assert cache.put(frame) == EPDPacking.fingerprint(frame.data)
+    assert len(cache) == 0
+    assert cache.stats['hit_rate'] is None
+
+
+def test_cache_is_shared_between_threads():
+    cache = EPDFrameCache.FrameCache(2)
+    frames = [EPDPacking.PackedFrame(bytes([index]), 2, 1) for index in range(4)]
+    keys = [cache.put(frame) for frame in frames]
+    errors = []
+    lookups = 100000
+
+    def put():
+        for iteration in range(lookups):
+            cache.put(frames[iteration % len(frames)])
+
+    def get():
+        try:
+            for iteration in range(lookups):
+                cache.get(keys[iteration % len(keys)])
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=put), threading.Thread(target=get)]
+    switch_interval = sys.getswitchinterval()
+
+    # Switches threads as often as possible, for the lookups to interleave with the evictions.
+    sys.setswitchinterval(1e-6)
+
+    try:
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join(60)
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert cache.stats['hits'] + cache.stats['misses'] == lookups
+    assert len(cache) == 2
+
+
+def update_in_thread(client, payload: bytes) -> (threading.Thread, list):
+    """
+    Sends an update waiting for its result in a thread.
+
+    :return The thread and the list receiving the status and payload of the update.
+    """
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(client.pipeline([(EPDProtocol.UPDATE, payload)])))
+    thread.start()
+
+    return thread, results
+
+
+def wait_pending(running_service):
+    """
+    Waits for the service to queue an update on the held worker.
+    """
+    while running_service.service.status()['worker']['pending'] == 0:
+        time.sleep(0.001)
+
+
+def test_uncached_hash_does_not_supersede_the_pending_update(start_service):
+    running_service = start_service(frame_cache=EPDFrameCache.FrameCache(4))
+    client = running_service.client(hash_first=False)
+    other_client = running_service.client()
+    client.init()
+
+    release = running_service.hold_worker()
+    thread, results = update_in_thread(client, EPDProtocol.encode_update(
+        [(0, 0, 40, 40)], frame_format=EPDProtocol.FORMAT_RAW, frame=create_frame(0).encode()))
+    wait_pending(running_service)
+    status, _ = other_client.pipeline([(EPDProtocol.UPDATE, EPDProtocol.encode_update(
+        frame_format=EPDProtocol.FORMAT_HASH, frame=frame_hash(create_frame(1))))])[0]
+    release.set()
+    thread.join(10)
+
+    assert status == EPDProtocol.NOT_CACHED
+    assert results[0][0] == EPDProtocol.OK
+    assert running_service.service.status()['superseded'] == 0
+
+
+def test_cached_frame_is_held_until_displayed(start_service):
+    frame_cache = EPDFrameCache.FrameCache(2)
+    running_service = start_service(frame_cache=frame_cache)
+    client = running_service.client(hash_first=False)
+    client.init()
+    frames = [create_frame(index) for index in range(4)]
+    client.update(image=frames[0])
+    client.update(image=frames[1])
+
+    release = running_service.hold_worker()
+    thread, results = update_in_thread(client, EPDProtocol.encode_update(frame_format=EPDProtocol.FORMAT_HASH,
+                                                                         frame=frame_hash(frames[0])))
+    wait_pending(running_service)
+
+    # Evicts the frame before the update runs.
+    frame_cache.put(frames[2])
+    frame_cache.put(frames[3])
+    release.set()
+    thread.join(10)
+
+    assert results[0][0] == EPDProtocol.OK
+    assert client.status()['fingerprint'] == EPDPacking.fingerprint(frames[0].data)
+    assert frame_cache.stats['hits'] == 1
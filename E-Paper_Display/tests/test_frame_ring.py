@@ -0,0 +1,169 @@
+import struct
+import threading
+
+import pytest
+from PIL import Image
+
+import EPDFrameRing
+import EPDPacking
+import SevenFiveEPD
+
+# Small frames, so the rings stay small.
+WIDTH = 16
+HEIGHT = 2
+
+
+def create_frame(value: int) -> EPDPacking.PackedFrame:
+    return EPDPacking.PackedFrame(bytes([value & 0xFF]) * EPDPacking.packed_size(WIDTH, HEIGHT), WIDTH, HEIGHT)
+
+
+@pytest.fixture
+def ring_path(tmp_path):
+    return str(tmp_path / 'epd.frames')
+
+
+def test_frames_round_trip(ring_path):
+    writer = EPDFrameRing.FrameRing.create(ring_path, 3, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+    reader = EPDFrameRing.FrameRing.open(ring_path)
+    frame_slots = [writer.write(create_frame(value)) for value in range(3)]
+
+    assert [frame_slot.slot for frame_slot in frame_slots] == [1, 2, 0]
+    assert [frame_slot.sequence for frame_slot in frame_slots] == [2, 4, 6]
+    assert [reader.read(frame_slot).data for frame_slot in frame_slots] == [create_frame(value).data
+                                                                            for value in range(3)]
+
+    writer.close()
+    reader.close()
+
+
+def test_frame_read_is_copied_once():
+    frame = create_frame(1)
+    raw = frame.encode()
+    header, data = raw[:EPDPacking.PackedFrame.HEADER.size], raw[EPDPacking.PackedFrame.HEADER.size:]
+
+    # The packed frame keeps the copy made out of the ring.
+    assert EPDPacking.PackedFrame.decode_parts(header, data).data is data
+
+
+def test_overwritten_frames_are_rejected(ring_path):
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+    reader = EPDFrameRing.FrameRing.open(ring_path)
+    first = writer.write(create_frame(1))
+    writer.write(create_frame(2))
+    third = writer.write(create_frame(3))
+
+    assert third.slot == first.slot
+
+    with pytest.raises(ValueError, match='not in slot'):
+        reader.read(first)
+
+    with pytest.raises(ValueError, match='Invalid frame slot'):
+        reader.read(EPDFrameRing.FrameSlot(2, third.sequence))
+
+    assert reader.read(third).data == create_frame(3).data
+
+
+def test_frame_being_written_is_rejected(ring_path):
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+    frame_slot = writer.write(create_frame(1))
+    writer.close()
+
+    # The writer made the slot's sequence odd and crashed.
+    with open(ring_path, 'r+b') as ring_file:
+        ring_file.seek(EPDFrameRing._HEADER.size + frame_slot.slot * (EPDFrameRing._SLOT_HEADER.size +
+                                                                        EPDFrameRing.slot_size(WIDTH, HEIGHT)))
+        ring_file.write(struct.pack('>Q', frame_slot.sequence + 1))
+
+    reader = EPDFrameRing.FrameRing.open(ring_path)
+
+    with pytest.raises(ValueError):
+        reader.read(frame_slot)
+
+    # A restarted writer goes past the odd sequence.
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+
+    assert writer.write(create_frame(2)).sequence == frame_slot.sequence + 4
+
+
+def test_concurrent_reads_never_return_torn_frames(ring_path):
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+    reader = EPDFrameRing.FrameRing.open(ring_path)
+    frame_slots = []
+    done = threading.Event()
+
+    def write():
+        for value in range(1, 5000):
+            frame_slots.append(writer.write(create_frame(value)))
+
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    reads = 0
+
+    # Reading at least once, the last frame staying in its slot once the writer is done.
+    while not done.is_set() or not reads:
+        if not frame_slots:
+            continue
+
+        frame_slot = frame_slots[-1]
+
+        try:
+            frame = reader.read(frame_slot)
+        except ValueError:
+            continue
+
+        # The frame written with this sequence, the n-th frame getting the sequence 2n.
+        assert frame.data == create_frame(frame_slot.sequence // 2).data
+        reads += 1
+
+    thread.join()
+
+
+def test_ring_is_reused_unless_its_geometry_changes(ring_path):
+    size = EPDFrameRing.slot_size(WIDTH, HEIGHT)
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, size)
+    frame_slot = writer.write(create_frame(1))
+    writer.close()
+
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, size)
+
+    assert writer.read(frame_slot).data == create_frame(1).data
+
+    writer.close()
+    writer = EPDFrameRing.FrameRing.create(ring_path, 3, size)
+
+    with pytest.raises(ValueError):
+        writer.read(frame_slot)
+
+
+def test_invalid_rings(ring_path, tmp_path):
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(WIDTH, HEIGHT))
+
+    with pytest.raises(ValueError, match='larger than'):
+        writer.write(EPDPacking.PackedFrame(bytes(EPDPacking.packed_size(WIDTH, 4)), WIDTH, 4))
+
+    invalid_path = tmp_path / 'invalid.frames'
+    invalid_path.write_bytes(b'EPDS')
+
+    with pytest.raises(ValueError, match='Truncated'):
+        EPDFrameRing.FrameRing.open(str(invalid_path))
+
+    invalid_path.write_bytes(bytes(64))
+
+    with pytest.raises(ValueError, match='Invalid frame ring'):
+        EPDFrameRing.FrameRing.open(str(invalid_path))
+
+
+def test_service_reads_frames_from_the_ring(start_service, simulator, tmp_path):
+    ring_path = str(tmp_path / 'epd.frames')
+    running_service = start_service(frame_ring_path=ring_path)
+    client = running_service.client()
+    writer = EPDFrameRing.FrameRing.create(ring_path, 2, EPDFrameRing.slot_size(SevenFiveEPD.width,
+                                                                                 SevenFiveEPD.height))
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (0, 0, 64, 64))
+    frame = EPDPacking.PackedFrame.from_image(image)
+
+    assert client.display(writer.write(frame))
+    assert simulator.screen == frame.data
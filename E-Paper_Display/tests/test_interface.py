@@ -0,0 +1,105 @@
+import array
+
+import pytest
+
+import EPD
+import EPDHardware
+import EPDSimulator
+import EPDTrace
+import SevenFiveEPD
+
+
+@pytest.fixture
+def recorded_interface(tmp_path):
+    """
+    Interface driving a simulated panel with 4096 bytes SPI transfers, its calls being recorded to a trace, and a
+    function reading the events recorded so far.
+    """
+    path = str(tmp_path / 'interface.trace')
+    recorder = EPDTrace.TraceRecorder(EPDSimulator.SimulatedBackend(spi_buffer_size=4096), path)
+    interface = EPD.DisplayInterface(SevenFiveEPD.commands, recorder)
+
+    def events():
+        recorder.flush()
+
+        return [(event, data) for event, _, data in EPDTrace.read_trace(path)]
+
+    yield interface, events
+    recorder.close()
+
+
+def spi_writes(events: list) -> list:
+    return [data for event, data in events if event == EPDTrace.SPI_WRITE]
+
+
+def dc_writes(events: list, interface: EPD.DisplayInterface) -> list:
+    return [data[1] for event, data in events if event == EPDTrace.OUTPUT and data[0] == interface.DC_PIN]
+
+
+def test_buffer_is_sent_in_chunks(recorded_interface):
+    interface, events = recorded_interface
+    buffer = bytes(range(256)) * 40
+
+    interface.send_command('DATA_START_TRANSMISSION_1')
+    interface.send_data_buffer(buffer)
+
+    writes = spi_writes(events())
+
+    assert [len(data) for data in writes] == [1, 4096, 4096, 2048]
+    assert b''.join(writes[1:]) == buffer
+    assert dc_writes(events(), interface) == [EPDHardware.LOW, EPDHardware.HIGH]
+    assert interface.bytes_sent == 1 + len(buffer)
+
+
+def test_dc_pin_is_written_on_level_changes_only(recorded_interface):
+    interface, events = recorded_interface
+
+    interface.send_data(1)
+    interface.send_data(2)
+    interface.send_command(0x10, False)
+    interface.send_data_buffer(b'\x03\x04')
+
+    assert spi_writes(events()) == [b'\x01', b'\x02', b'\x10', b'\x03\x04']
+    assert dc_writes(events(), interface) == [EPDHardware.HIGH, EPDHardware.LOW, EPDHardware.HIGH]
+
+
+def test_wide_items_are_sent_as_bytes(recorded_interface):
+    interface, events = recorded_interface
+    buffer = array.array('H', range(3000))
+
+    interface.send_data_buffer(buffer)
+
+    assert b''.join(spi_writes(events())) == buffer.tobytes()
+    assert interface.bytes_sent == len(buffer.tobytes())
+
+
+def test_script_is_compiled_to_merged_transactions(recorded_interface):
+    interface, _ = recorded_interface
+    script = [('POWER_SETTING', 0x37, 0x00), ('POWER_ON',), ('DATA_STOP',), (interface.WAIT_IDLE,),
+              (0xe5, 0x03)]
+
+    assert interface.compile_script(script) == [
+        (EPDHardware.LOW, b'\x01'), (EPDHardware.HIGH, b'\x37\x00'), (EPDHardware.LOW, b'\x04\x11'),
+        interface.WAIT_IDLE, (EPDHardware.LOW, b'\xe5'), (EPDHardware.HIGH, b'\x03')]
+
+    with pytest.raises(KeyError):
+        interface.compile_script([('NO_SUCH_COMMAND', 0x00)])
+
+
+def test_script_run_waits_on_wait_idle_steps(recorded_interface):
+    interface, events = recorded_interface
+    waits = []
+
+    interface.run_script(interface.compile_script([('POWER_ON',), (interface.WAIT_IDLE,), ('PLL_CONTROL', 0x3c)]),
+                         lambda: waits.append(len(spi_writes(events()))))
+
+    assert waits == [1]
+    assert spi_writes(events()) == [b'\x04', b'\x30', b'\x3c']
+
+
+def test_init_script_sets_the_registers(simulator, display):
+    display.init()
+
+    assert simulator.registers[SevenFiveEPD.commands['TCON_RESOLUTION']] == b'\x02\x80\x01\x80'
+    assert simulator.registers[0xe5] == b'\x03'
+    assert simulator.is_powered and not display.is_sleeping
@@ -0,0 +1,113 @@
+import math
+
+import pytest
+from PIL import Image
+
+import EPDMetrics
+import SevenFiveEPD
+
+
+@pytest.fixture
+def metrics():
+    epd_metrics = EPDMetrics.Metrics('test', buckets=(1, 2, 4))
+    epd_metrics.describe('requests_total', EPDMetrics.COUNTER, 'Requests')
+    epd_metrics.describe('connections', EPDMetrics.GAUGE, 'Open connections')
+    epd_metrics.describe('duration_seconds', EPDMetrics.HISTOGRAM, 'Durations')
+
+    return epd_metrics
+
+
+def test_snapshot(metrics):
+    metrics.increment('requests_total', command='init')
+    metrics.increment('requests_total', 2, command='init')
+    metrics.increment('requests_total', command='status')
+    metrics.set('connections', 3)
+
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        metrics.observe('duration_seconds', value, phase='refresh')
+
+    snapshot = metrics.snapshot()
+    histogram = snapshot['duration_seconds']['series'][0]
+
+    assert snapshot['requests_total']['series'] == [{'labels': {'command': 'init'}, 'value': 3},
+                                                    {'labels': {'command': 'status'}, 'value': 1}]
+    assert snapshot['connections'] == {'kind': EPDMetrics.GAUGE, 'description': 'Open connections',
+                                       'series': [{'labels': {}, 'value': 3}]}
+    assert histogram['labels'] == {'phase': 'refresh'}
+    assert histogram['count'] == 5 and histogram['sum'] == 16.5 and histogram['mean'] == 3.3
+    assert histogram['buckets'] == {'1.0': 1, '2.0': 2, '4.0': 1, '+Inf': 1}
+
+
+def test_quantiles(metrics):
+    # Four samples in (1, 2], four in (2, 4].
+    histogram = [0, 4, 4, 0, 20.0]
+
+    assert metrics.quantile(histogram, 0.5) == 2
+    assert metrics.quantile(histogram, 0.25) == 1.5
+    assert metrics.quantile(histogram, 0.75) == 3
+    # Falls in the unbounded bucket.
+    assert metrics.quantile([0, 0, 0, 1, 5.0], 0.5) == 4
+    assert metrics.quantile([0, 0, 0, 0, 0.0], 0.5) is None
+
+
+def test_prometheus_text(metrics):
+    metrics.increment('requests_total', command='say "hi"\n')
+    metrics.observe('duration_seconds', 1.5)
+    metrics.observe('duration_seconds', 5)
+
+    lines = metrics.prometheus().splitlines()
+
+    assert lines[:3] == ['# HELP test_requests_total Requests', '# TYPE test_requests_total counter',
+                         'test_requests_total{command="say \\"hi\\"\\n"} 1']
+    assert '# TYPE test_connections gauge' in lines
+    # Buckets are cumulative.
+    assert lines[-6:] == ['test_duration_seconds_bucket{le="1.0"} 0', 'test_duration_seconds_bucket{le="2.0"} 1',
+                          'test_duration_seconds_bucket{le="4.0"} 1', 'test_duration_seconds_bucket{le="+Inf"} 2',
+                          'test_duration_seconds_sum 6.5', 'test_duration_seconds_count 2']
+
+
+def test_format_value():
+    assert EPDMetrics.format_value(math.inf) == '+Inf'
+    assert EPDMetrics.format_value(-math.inf) == '-Inf'
+    assert EPDMetrics.format_value(math.nan) == 'NaN'
+    assert EPDMetrics.format_value(3) == '3'
+
+
+def test_write_replaces_the_file(metrics, tmp_path):
+    path = tmp_path / 'epd.prom'
+    path.write_text('old')
+    metrics.set('connections', 1)
+    metrics.write(str(path))
+
+    assert path.read_text() == metrics.prometheus()
+    assert [file.name for file in tmp_path.iterdir()] == ['epd.prom']
+
+
+def sample_value(stats: dict, name: str, **labels):
+    return next(sample.get('value', sample.get('count')) for sample in stats[name]['series']
+                if sample['labels'] == labels)
+
+
+def test_service_stats(start_service, tmp_path):
+    metrics_path = tmp_path / 'epd.prom'
+    running_service = start_service(metrics_path=str(metrics_path), metrics_interval=60)
+    client = running_service.client()
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (0, 0, 40, 40))
+    client.display(image)
+
+    stats = client.stats()
+
+    # The client sent the frame's hash first.
+    assert sample_value(stats, 'requests_total', command='display', status='not_cached') == 1
+    assert sample_value(stats, 'requests_total', command='display', status='ok') == 1
+    assert sample_value(stats, 'request_duration_seconds', command='display') == 2
+    assert sample_value(stats, 'frame_cache_lookups_total', result='miss') == 1
+    assert sample_value(stats, 'update_phase_seconds', phase='transfer') == 1
+    assert sample_value(stats, 'connections') == 1
+    assert sample_value(stats, 'transferred_bytes_total') > 0
+
+    running_service.stop()
+
+    # The last metrics are written once the service stops.
+    assert 'epd_requests_total{command="display",status="ok"} 1' in metrics_path.read_text()
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+from PIL import Image
+
+import EPDPacking
+
+
+def random_bits(width: int, height: int, seed=0) -> bytes:
+    generator = random.Random(seed)
+
+    return bytes(generator.getrandbits(8) for _ in range(EPDPacking.stride(width) * height))
+
+
+@pytest.fixture
+def restore_kernel(monkeypatch):
+    """
+    Restores the selected kernel after the test.
+    """
+    monkeypatch.setattr(EPDPacking, '_selected_kernel', EPDPacking._selected_kernel)
+    monkeypatch.delenv(EPDPacking.KERNEL_ENV, raising=False)
+
+
+@pytest.mark.parametrize('kernel_name', sorted(EPDPacking.kernels))
+@pytest.mark.parametrize('width,height', [(2, 1), (38, 7), (640, 384), (800, 480)])
+def test_kernels_match_the_reference(kernel_name, width, height):
+    bits = random_bits(width, height, width)
+
+    assert EPDPacking.kernels[kernel_name](bits, width, height) == EPDPacking.pack_reference(bits, width, height)
+
+
+def test_reference_matches_the_legacy_loop():
+    image = Image.frombytes('1', (38, 7), random_bits(38, 7))
+
+    assert EPDPacking.pack_image(image) == EPDPacking.pack_pixels_legacy(image.load(), 38, 7)
+
+
+def test_nibbles():
+    assert EPDPacking.pack_reference(b'\x80', 2, 1) == bytes([EPDPacking.WHITE_NIBBLE << 4])
+    assert EPDPacking.pack_reference(b'\x40', 2, 1) == bytes([EPDPacking.WHITE_NIBBLE])
+
+
+@pytest.mark.parametrize('width,height', [(38, 7), (640, 384)])
+def test_unpack_round_trip(width, height):
+    bits = EPDPacking.image_to_bits(Image.frombytes('1', (width, height), random_bits(width, height)))
+
+    assert EPDPacking.unpack(EPDPacking.pack(bits, width, height), width, height) == bits
+
+
+@pytest.mark.parametrize('kernel_name', sorted(EPDPacking.kernels))
+@pytest.mark.parametrize('width,height,size', [(3, 2, 2), (0, 2, 0), (8, 2, 1)])
+def test_invalid_buffers_are_rejected(kernel_name, width, height, size):
+    with pytest.raises(ValueError):
+        EPDPacking.kernels[kernel_name](bytes(size), width, height)
+
+
+def test_kernel_selection(restore_kernel, monkeypatch):
+    assert EPDPacking.select_kernel('lut') is EPDPacking.pack_lut
+    assert EPDPacking.selected_kernel_name() == 'lut'
+
+    monkeypatch.setenv(EPDPacking.KERNEL_ENV, 'reference')
+
+    assert EPDPacking.select_kernel() is EPDPacking.pack_reference
+
+    monkeypatch.delenv(EPDPacking.KERNEL_ENV)
+
+    assert EPDPacking.select_kernel() is not EPDPacking.pack_reference
+
+    with pytest.raises(KeyError):
+        EPDPacking.select_kernel('simd')
+
+
+def test_failing_kernel_is_not_selected():
+    assert not EPDPacking.check_kernel(lambda bits, width, height: bytes(EPDPacking.packed_size(width, height)))
+    assert not EPDPacking.check_kernel(lambda bits, width, height: 1 / 0)
+
+
+def test_crop_and_paste():
+    width, height = 16, 4
+    data = bytearray(EPDPacking.pack(random_bits(width, height), width, height))
+    box = (4, 1, 10, 3)
+    box_data = EPDPacking.crop(data, width, box)
+
+    assert len(box_data) == EPDPacking.packed_size(6, 2)
+
+    blank = bytearray(len(data))
+    EPDPacking.paste(blank, width, box, box_data)
+
+    assert EPDPacking.crop(blank, width, box) == box_data
@@ -0,0 +1,68 @@
+import pytest
+from PIL import Image
+
+import EPDPacking
+import SevenFiveEPD
+
+SIZE = (SevenFiveEPD.width, SevenFiveEPD.height)
+
+
+@pytest.mark.parametrize('box,window', [
+    ((10, 20, 30, 40), (8, 20, 32, 40)),
+    ((0, 0, 8, 1), (0, 0, 8, 1)),
+    ((-5, -5, 3, 3), (0, 0, 8, 3)),
+    ((630, 380, 700, 400), (624, 380, 640, 384))
+])
+def test_window_is_aligned_and_clipped(display, box, window):
+    assert display.window(box) == window
+
+
+@pytest.mark.parametrize('box', [(16, 10, 16, 20), (700, 0, 800, 10), (0, 390, 10, 400)])
+def test_empty_window_is_rejected(display, box):
+    with pytest.raises(ValueError):
+        display.window(box)
+
+
+def test_partial_refresh_only_sends_the_window(simulator, display):
+    display.init()
+    background = Image.new('1', SIZE, 1)
+    display.display_frame(background)
+
+    frame = background.copy()
+    frame.paste(0, (100, 50, 140, 90))
+    bytes_sent = display.bytes_sent
+
+    assert display.display_partial(frame, (100, 50, 140, 90))
+    assert simulator.screen_image().tobytes() == frame.tobytes()
+    assert display.fingerprint == EPDPacking.fingerprint(EPDPacking.pack_image(frame))
+    assert simulator.stats['refreshes']['full'] == 1
+
+    # The window's pixels and the fast waveform, instead of the whole frame.
+    assert display.bytes_sent - bytes_sent < EPDPacking.packed_size(*SIZE) // 50
+
+
+def test_partial_refresh_leaves_the_pixels_outside_of_the_window(simulator, display):
+    display.init()
+    display.display_frame(Image.new('1', SIZE, 1))
+
+    frame = Image.new('1', SIZE, 0)
+    display.display_partial(frame, (0, 0, 16, 16))
+
+    shown = simulator.screen_image()
+
+    assert shown.getpixel((0, 0)) == 0 and shown.getpixel((15, 15)) == 0
+    assert shown.getpixel((16, 0)) == 255 and shown.getpixel((0, 16)) == 255
+
+
+def test_unchanged_window_is_skipped(simulator, display):
+    display.init()
+    frame = Image.new('1', SIZE, 1)
+    frame.paste(0, (0, 0, 16, 16))
+    display.display_frame(frame)
+
+    changed = frame.copy()
+    changed.paste(0, (300, 300, 310, 310))
+
+    assert not display.display_partial(changed, (0, 0, 16, 16), True)
+    assert display.display_partial(changed, (300, 300, 310, 310), True)
+    assert sum(simulator.stats['refreshes'].values()) == 2
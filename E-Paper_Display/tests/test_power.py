@@ -0,0 +1,83 @@
+from PIL import Image
+
+import EPD
+import EPDProtocol
+import SevenFiveEPD
+
+
+def create_image(index: int) -> Image:
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (index * 50, 0, index * 50 + 40, 40))
+
+    return image
+
+
+def next_power_state(client) -> str:
+    """
+    Waits for the next power event of the client's subscription.
+    """
+    while True:
+        event = client.next_event(10)
+
+        if event is None or event['event'] == 'power':
+            return event and event['power_state']
+
+
+def test_display_wakes_up_by_the_shortest_path(display, simulator):
+    display.init()
+    resets = simulator.stats['resets']
+
+    display.power_off()
+
+    assert display.power_state == EPD.Display.POWERED_OFF and not simulator.is_powered
+    assert display.wake() == EPD.Display.POWERED_OFF
+    assert display.power_state == EPD.Display.POWERED and simulator.stats['resets'] == resets
+
+    display.sleep()
+
+    assert display.wake() == EPD.Display.DEEP_SLEEP
+    assert simulator.stats['resets'] == resets + 1
+    assert display.wake() == EPD.Display.POWERED
+
+
+def test_idle_display_goes_through_the_power_tiers(start_service):
+    running_service = start_service(power_tiers=[(0.05, EPD.Display.POWERED_OFF), (0.1, EPD.Display.DEEP_SLEEP)])
+    client = running_service.client()
+    client.subscribe()
+
+    # The service initialized the display when it started.
+    assert client.status()['power_state'] == EPD.Display.POWERED
+    assert client.display(create_image(0))
+    assert next_power_state(client) == EPD.Display.POWERED_OFF
+    assert next_power_state(client) == EPD.Display.DEEP_SLEEP
+
+    # Woken up by the next display command.
+    assert client.display(create_image(1))
+    assert next_power_state(client) == EPD.Display.POWERED
+
+    status = client.status()
+
+    assert status['wakes'][EPD.Display.DEEP_SLEEP] == 1
+    assert status['wakes'][EPD.Display.POWERED_OFF] == 0
+
+
+def test_unchanged_frame_does_not_wake_the_display(start_service):
+    running_service = start_service(power_tiers=[(0.05, EPD.Display.DEEP_SLEEP)])
+    client = running_service.client()
+    client.subscribe()
+    client.display(create_image(0))
+
+    assert next_power_state(client) == EPD.Display.DEEP_SLEEP
+    assert not client.display(create_image(0))
+    assert client.last_update == 'unchanged'
+    assert client.status()['power_state'] == EPD.Display.DEEP_SLEEP
+
+
+def test_power_change_is_dropped_after_another_command(start_service):
+    running_service = start_service()
+    client = running_service.client()
+    client.display(create_image(0))
+
+    assert running_service.service.set_power_state(EPD.Display.POWERED_OFF, -1) == (EPDProtocol.OK,
+                                                                                     'Display used meanwhile')
+    assert client.status()['power_state'] == EPD.Display.POWERED
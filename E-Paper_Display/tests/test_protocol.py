@@ -0,0 +1,164 @@
+import json
+import logging
+import socket
+import struct
+
+import pytest
+from PIL import Image
+
+import EPDProtocol
+import SevenFiveEPD
+
+
+def test_message_round_trip():
+    message = EPDProtocol.encode_message(0xFFFFFFFF, EPDProtocol.STATUS, b'payload')
+    payload_length, request_id, code = EPDProtocol.decode_header(message[:EPDProtocol.HEADER.size])
+
+    assert (payload_length, request_id, code) == (7, 0xFFFFFFFF, EPDProtocol.STATUS)
+    assert message[EPDProtocol.HEADER.size:] == b'payload'
+
+
+@pytest.mark.parametrize('length', [0, EPDProtocol.MAX_MESSAGE_SIZE])
+def test_invalid_message_length(length):
+    with pytest.raises(ValueError):
+        EPDProtocol.decode_header(EPDProtocol.HEADER.pack(length, 1, EPDProtocol.STATUS))
+
+
+def test_largest_message_is_accepted():
+    header = EPDProtocol.HEADER.pack(EPDProtocol.MAX_MESSAGE_SIZE - 4, 1, EPDProtocol.UPDATE)
+
+    assert EPDProtocol.decode_header(header)[0] == EPDProtocol.MAX_MESSAGE_SIZE - EPDProtocol.HEADER.size
+
+
+@pytest.mark.parametrize('boxes,force,frame_format,frame,nowait', [
+    (None, False, EPDProtocol.FORMAT_FILE, b'', False),
+    ([(0, 0, 8, 8), (16, 8, 640, 384)], True, EPDProtocol.FORMAT_IMAGE, b'BM...', False),
+    (None, False, EPDProtocol.FORMAT_RAW, b'EPDF...', True),
+    (None, False, EPDProtocol.FORMAT_SLOT, EPDProtocol.SLOT.pack(1, 2), True),
+    ([(0, 0, 8, 8)], False, EPDProtocol.FORMAT_HASH, bytes(EPDProtocol.HASH_SIZE), False)
+])
+def test_update_round_trip(boxes, force, frame_format, frame, nowait):
+    payload = EPDProtocol.encode_update(boxes, force, frame_format, frame, nowait)
+
+    assert EPDProtocol.decode_update(payload) == (boxes, force, frame_format, frame, nowait)
+
+
+@pytest.mark.parametrize('payload,message', [
+    (b'\x00\x00', 'Truncated update payload'),
+    (EPDProtocol.UPDATE_HEADER.pack(0, EPDProtocol.FORMAT_FILE, 2) + bytes(8), 'Truncated update boxes'),
+    (EPDProtocol.UPDATE_HEADER.pack(0, 9, 0) + b'frame', 'Unknown frame format'),
+    (EPDProtocol.UPDATE_HEADER.pack(0, EPDProtocol.FORMAT_IMAGE, 0), 'Missing frame'),
+    (EPDProtocol.UPDATE_HEADER.pack(0, EPDProtocol.FORMAT_SLOT, 0) + bytes(4), 'Invalid frame slot'),
+    (EPDProtocol.UPDATE_HEADER.pack(0, EPDProtocol.FORMAT_HASH, 0) + bytes(4), 'Invalid frame hash')
+])
+def test_invalid_update(payload, message):
+    with pytest.raises(ValueError, match=message):
+        EPDProtocol.decode_update(payload)
+
+
+def test_too_many_boxes():
+    with pytest.raises(ValueError):
+        EPDProtocol.encode_update([(0, 0, 8, 8)] * 0x10000)
+
+
+def connect(socket_path: str) -> socket.socket:
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(10)
+    connection.connect(socket_path)
+
+    return connection
+
+
+def receive(connection: socket.socket, size: int) -> bytes:
+    data = b''
+
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+
+        if not chunk:
+            break
+
+        data += chunk
+
+    return data
+
+
+def receive_message(connection: socket.socket) -> (int, int, bytes):
+    payload_length, request_id, status = EPDProtocol.decode_header(receive(connection, EPDProtocol.HEADER.size))
+
+    return request_id, status, receive(connection, payload_length)
+
+
+def test_service_handshake_and_requests(start_service):
+    running_service = start_service()
+
+    with connect(running_service.socket_path) as connection:
+        connection.sendall(EPDProtocol.handshake())
+
+        assert receive(connection, 4) == EPDProtocol.handshake()
+
+        # Pipelined requests, each answered with its request ID.
+        connection.sendall(EPDProtocol.encode_message(7, EPDProtocol.STATUS) +
+                           EPDProtocol.encode_message(8, 0xFF) +
+                           EPDProtocol.encode_message(9, EPDProtocol.PRIORITY, b'\x09'))
+        responses = {request_id: (status, payload) for request_id, status, payload in
+                     (receive_message(connection) for _ in range(3))}
+
+        assert responses[7][0] == EPDProtocol.OK and 'worker' in json.loads(responses[7][1])
+        assert responses[8] == (EPDProtocol.PROTOCOL_ERROR, b'Unknown opcode: 255')
+        assert responses[9] == (EPDProtocol.PROTOCOL_ERROR, b'Invalid priority class')
+
+        # A message too large for the service closes the connection.
+        connection.sendall(EPDProtocol.HEADER.pack(EPDProtocol.MAX_MESSAGE_SIZE, 10, EPDProtocol.UPDATE))
+
+        assert receive_message(connection)[:2] == (10, EPDProtocol.PROTOCOL_ERROR)
+        assert connection.recv(1) == b''
+
+
+def test_service_rejects_unsupported_versions(start_service):
+    running_service = start_service()
+
+    with connect(running_service.socket_path) as connection:
+        connection.sendall(EPDProtocol.handshake(EPDProtocol.VERSION + 1))
+
+        assert connection.recv(1) == b''
+
+
+def test_service_serves_version_1_commands(start_service):
+    running_service = start_service()
+
+    with connect(running_service.socket_path) as connection:
+        connection.sendall(b'5')
+        length = struct.unpack('>I', receive(connection, 5)[1:])[0]
+
+        assert 'worker' in json.loads(receive(connection, length))
+
+        connection.sendall(b'9')
+
+        assert receive(connection, 1) == b'1'
+
+
+def test_service_answers_version_1_unchanged_updates_as_successful(start_service, caplog):
+    running_service = start_service()
+    Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1).save(running_service.frame_path)
+
+    with connect(running_service.socket_path) as connection:
+        with caplog.at_level(logging.INFO, 'EPDService'):
+            for command in (b'0', b'1', b'1'):
+                connection.sendall(command)
+
+                assert receive(connection, 1) == b'0'
+
+    assert 'Version 1 update answered as successful: Frame unchanged' in caplog.messages
+
+
+def test_client_pipeline(start_service):
+    running_service = start_service()
+    client = running_service.client()
+
+    responses = client.pipeline([(EPDProtocol.INIT, b''), (EPDProtocol.STATUS, b''), (EPDProtocol.SLEEP, b'')], 10)
+
+    assert [status for status, _ in responses] == [EPDProtocol.OK] * 3
+    # The status request is answered without waiting for the init.
+    assert json.loads(responses[1][1])['sleeping'] in (True, False)
+    assert client.status()['sleeping']
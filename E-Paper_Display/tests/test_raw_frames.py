@@ -0,0 +1,121 @@
+import io
+import os
+import subprocess
+import sys
+import zlib
+
+import pytest
+from PIL import Image
+
+import EPDPacking
+import EPDProtocol
+import EPD_service
+import SevenFiveEPD
+
+SIZE = (SevenFiveEPD.width, SevenFiveEPD.height)
+
+
+def create_image() -> Image:
+    image = Image.new('1', SIZE, 1)
+    image.paste(0, (8, 8, 100, 60))
+
+    return image
+
+
+def test_raw_frame_round_trip():
+    frame = EPDPacking.PackedFrame.from_image(create_image())
+    decoded = EPDPacking.PackedFrame.decode(frame.encode())
+
+    assert decoded.size == SIZE
+    assert decoded.data == frame.data == EPDPacking.pack_image(create_image())
+
+
+def corrupt(raw: bytes) -> bytes:
+    return raw[:-1] + bytes([raw[-1] ^ 0x01])
+
+
+def set_header(raw: bytes, **fields) -> bytes:
+    header = dict(zip(('magic', 'width', 'height', 'pixel_format', 'checksum'),
+                      EPDPacking.PackedFrame.HEADER.unpack_from(raw)))
+    header.update(fields)
+
+    return EPDPacking.PackedFrame.HEADER.pack(*header.values()) + raw[EPDPacking.PackedFrame.HEADER.size:]
+
+
+@pytest.mark.parametrize('alter,message', [
+    (corrupt, 'checksum mismatch'),
+    (lambda raw: raw[:EPDPacking.PackedFrame.HEADER.size - 1], 'Truncated raw frame header'),
+    (lambda raw: raw[:-1], 'checksum mismatch'),
+    (lambda raw: set_header(raw, magic=b'BM\x00\x00'), 'Not a raw frame'),
+    (lambda raw: set_header(raw, pixel_format=1), 'Unknown pixel format'),
+    (lambda raw: set_header(raw, width=SIZE[0] - 8), 'does not match')
+])
+def test_invalid_raw_frame(alter, message):
+    raw = EPDPacking.PackedFrame.from_image(create_image()).encode()
+
+    with pytest.raises(ValueError, match=message):
+        EPDPacking.PackedFrame.decode(alter(raw))
+
+
+def test_truncated_frame_with_a_matching_checksum():
+    data = EPDPacking.pack_image(create_image())[:-1]
+    raw = EPDPacking.PackedFrame.HEADER.pack(EPDPacking.PackedFrame.MAGIC, SIZE[0], SIZE[1],
+                                             EPDPacking.PackedFrame.PANEL_4BPP, zlib.crc32(data)) + data
+
+    with pytest.raises(ValueError, match='does not match'):
+        EPDPacking.PackedFrame.decode(raw)
+
+
+def test_load_frame():
+    raw = EPDPacking.PackedFrame.from_image(create_image()).encode()
+    bmp = io.BytesIO()
+    create_image().save(bmp, 'BMP')
+
+    assert isinstance(EPD_service.load_frame(raw, EPDProtocol.FORMAT_RAW), EPDPacking.PackedFrame)
+    # Frame files are told apart by their magic.
+    assert isinstance(EPD_service.load_frame(raw, EPDProtocol.FORMAT_FILE), EPDPacking.PackedFrame)
+    assert EPD_service.load_frame(bmp.getvalue(), EPDProtocol.FORMAT_FILE).tobytes() == create_image().tobytes()
+
+    with pytest.raises(ValueError):
+        EPD_service.load_frame(b'not an image', EPDProtocol.FORMAT_IMAGE)
+
+
+def test_raw_frames_are_loaded_without_pil(tmp_path):
+    raw_path = tmp_path / 'frame.raw'
+    raw_path.write_bytes(EPDPacking.PackedFrame.from_image(create_image()).encode())
+    script = ('import sys, EPDProtocol, EPD_service\n'
+              'frame = EPD_service.load_frame(open(sys.argv[1], "rb").read(), EPDProtocol.FORMAT_RAW)\n'
+              'assert frame.size == (640, 384)\n'
+              'assert not any(module.startswith("PIL") for module in sys.modules)\n')
+
+    subprocess.run([sys.executable, '-c', script, str(raw_path)], check=True,
+                   cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+@pytest.mark.parametrize('frame_file', [False, True])
+def test_service_displays_raw_frames(start_service, simulator, frame_file):
+    running_service = start_service()
+    client = running_service.client()
+    frame = EPDPacking.PackedFrame.from_image(create_image())
+
+    if frame_file:
+        with open(running_service.frame_path, 'wb') as raw_file:
+            raw_file.write(frame.encode())
+
+        client.display()
+    else:
+        client.display(frame)
+
+    assert simulator.screen == frame.data
+
+
+def test_service_rejects_corrupted_raw_frames(start_service):
+    running_service = start_service()
+    client = running_service.client()
+    raw = corrupt(EPDPacking.PackedFrame.from_image(create_image()).encode())
+
+    status, message = client.pipeline([(EPDProtocol.DISPLAY, EPDProtocol.encode_update(
+        frame_format=EPDProtocol.FORMAT_RAW, frame=raw))], 10)[0]
+
+    assert status == EPDProtocol.FRAME_ERROR
+    assert b'checksum' in message
@@ -0,0 +1,69 @@
+import EPDRefreshPolicy
+
+RefreshPolicy = EPDRefreshPolicy.RefreshPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+def create_policy(**budgets) -> (RefreshPolicy, Clock):
+    clock = Clock()
+    policy = RefreshPolicy(100, 100, clock=clock, **budgets)
+    policy.record(RefreshPolicy.FULL)
+
+    return policy, clock
+
+
+def test_first_refresh_is_full():
+    policy = RefreshPolicy(100, 100)
+
+    assert policy.age is None
+    assert policy.decide((0, 0, 10, 10)) == RefreshPolicy.FULL
+
+
+def test_partial_count_budget():
+    policy, _ = create_policy(max_partials=2, max_fast_fulls=1)
+    box = (0, 0, 10, 10)
+
+    for _ in range(2):
+        assert policy.decide(box) == RefreshPolicy.PARTIAL
+        policy.record(RefreshPolicy.PARTIAL, box)
+
+    assert policy.decide(box) == RefreshPolicy.FAST_FULL
+    policy.record(RefreshPolicy.FAST_FULL)
+
+    # A fast full refresh resets the partial budgets only.
+    assert policy.decide(box) == RefreshPolicy.PARTIAL
+    assert policy.decide() == RefreshPolicy.FULL
+
+
+def test_partial_area_budget():
+    policy, _ = create_policy(max_partial_area=0.5)
+
+    assert policy.decide((0, 0, 100, 50)) == RefreshPolicy.PARTIAL
+    policy.record(RefreshPolicy.PARTIAL, (0, 0, 100, 40))
+
+    assert policy.decide((0, 0, 100, 10)) == RefreshPolicy.PARTIAL
+    assert policy.decide((0, 0, 100, 11)) == RefreshPolicy.FAST_FULL
+    assert policy.stats['partial_area'] == 0.4
+
+
+def test_age_budget():
+    policy, clock = create_policy(max_age=60)
+    clock.time = 59
+
+    assert policy.decide((0, 0, 1, 1)) == RefreshPolicy.PARTIAL
+
+    clock.time = 60
+
+    assert policy.decide((0, 0, 1, 1)) == RefreshPolicy.FULL
+
+    policy.record(RefreshPolicy.FULL)
+
+    assert policy.age == 0
+    assert policy.decisions == {RefreshPolicy.PARTIAL: 0, RefreshPolicy.FAST_FULL: 0, RefreshPolicy.FULL: 2}
@@ -0,0 +1,80 @@
+import pytest
+from PIL import Image
+
+import EPDHardware
+import EPDPacking
+import EPDSimulator
+import SevenFiveEPD
+
+SIZE = (SevenFiveEPD.width, SevenFiveEPD.height)
+
+
+def test_full_refresh_shows_the_frame_after_its_duration(simulator, display):
+    display.init()
+    frame = Image.new('1', SIZE, 1)
+    frame.paste(0, (10, 10, 200, 100))
+    start = simulator.clock()
+
+    display.display_frame(frame)
+
+    assert simulator.screen_image().tobytes() == frame.tobytes()
+    assert simulator.screen == EPDPacking.pack_image(frame)
+    assert simulator.stats['refreshes']['full'] == 1
+    assert simulator.clock() - start >= simulator.timings['full_refresh']
+
+
+def test_transfer_time_follows_the_spi_speed():
+    slow = EPDSimulator.SimulatedBackend(spi_speed=1000000)
+    fast = EPDSimulator.SimulatedBackend(spi_speed=4000000)
+
+    for backend in (slow, fast):
+        backend.spi_write(bytes(4000))
+
+    transfer_time = 4000 * 8 * (1 / 1000000 - 1 / 4000000)
+
+    assert slow.clock() - fast.clock() == pytest.approx(transfer_time)
+    assert slow.stats['spi_bytes'] == 4000 and slow.stats['spi_transactions'] == 1
+
+
+def test_oversized_transfer_is_rejected():
+    backend = EPDSimulator.SimulatedBackend(spi_buffer_size=16)
+
+    with pytest.raises(OSError):
+        backend.spi_write(bytes(17))
+
+
+def test_deep_sleep_ignores_commands_until_reset(simulator, display):
+    display.init()
+    display.sleep()
+
+    assert simulator.is_deep_sleeping and not simulator.is_powered
+
+    commands = simulator.stats['commands']
+    resets = simulator.stats['resets']
+    simulator.output(25, EPDHardware.LOW)
+    simulator.spi_write(bytes([SevenFiveEPD.commands['POWER_ON']]))
+
+    assert simulator.stats['commands'] == commands
+
+    display.init()
+
+    assert not simulator.is_deep_sleeping and simulator.is_powered
+    assert simulator.stats['resets'] > resets
+
+
+@pytest.mark.parametrize('temperature,reading', [(20.0, b'\x14\x00'), (21.5, b'\x15\x80'), (-0.5, b'\xff\x80')])
+def test_temperature_sensor_reading(temperature, reading):
+    backend = EPDSimulator.SimulatedBackend(temperature=temperature)
+    backend.output(25, EPDHardware.LOW)
+    backend.spi_write(bytes([SevenFiveEPD.commands['TEMPERATURE_SENSOR_COMMAND']]))
+
+    assert backend.spi_read(2) == reading
+    assert backend.spi_read(2) == b'\x00\x00'
+
+
+def test_realtime_backend_waits():
+    backend = EPDSimulator.SimulatedBackend(realtime=True)
+    start = backend.clock()
+    backend.sleep(0.01)
+
+    assert backend.clock() - start >= 0.01
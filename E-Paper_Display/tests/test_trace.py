@@ -0,0 +1,65 @@
+import pytest
+from PIL import Image
+
+import EPD
+import EPDHardware
+import EPDSimulator
+import EPDTrace
+import SevenFiveEPD
+
+
+def test_large_spi_transfer_round_trip(tmp_path):
+    path = str(tmp_path / 'large.trace')
+    chunk = bytes(range(256)) * 256
+    recorder = EPDTrace.TraceRecorder(EPDSimulator.SimulatedBackend(spi_buffer_size=len(chunk)), path)
+
+    recorder.output(25, EPDHardware.HIGH)
+    recorder.spi_write(chunk)
+    recorder.close()
+
+    events = list(EPDTrace.read_trace(path))
+
+    assert [event for event, _, _ in events] == [EPDTrace.OUTPUT, EPDTrace.SPI_WRITE]
+    assert events[1][2] == chunk
+
+
+def test_recorded_display_replays_without_divergence(tmp_path):
+    path = str(tmp_path / 'display.trace')
+    recorder = EPDTrace.TraceRecorder(EPDSimulator.SimulatedBackend(), path)
+    interface = EPD.DisplayInterface(SevenFiveEPD.commands, recorder)
+    display = EPD.Display(SevenFiveEPD.width, SevenFiveEPD.height, interface, SevenFiveEPD.init_script,
+                          SevenFiveEPD.refresh_modes)
+
+    frame = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    frame.paste(0, (0, 0, 40, 40))
+    display.init()
+    display.display_frame(frame)
+    display.wait_until_idle()
+    recorder.close()
+
+    summary = EPDTrace.summarize(EPDTrace.read_trace(path), SevenFiveEPD.commands)
+
+    assert summary['data_bytes'] >= SevenFiveEPD.width * SevenFiveEPD.height // 8
+    assert summary['commands']['DATA_START_TRANSMISSION_1'] == 1
+    simulator = EPDSimulator.SimulatedBackend()
+    replay_interface = EPD.DisplayInterface(SevenFiveEPD.commands, simulator)
+
+    assert EPDTrace.replay(EPDTrace.read_trace(path), replay_interface) == 0
+    assert simulator.screen_image().convert('1').tobytes() == frame.tobytes()
+
+
+def test_edge_wait_ends_at_once_when_busy_is_already_at_the_level():
+    simulator = EPDSimulator.SimulatedBackend()
+    start = simulator.clock()
+    simulator.wait_for_edge(24, True, 10)
+
+    assert simulator.clock() == start
+
+
+@pytest.mark.parametrize('header', [b'', b'EPDT', b'EPDT\x09', b'TDPE\x01'])
+def test_invalid_trace_is_rejected(tmp_path, header):
+    path = tmp_path / 'invalid.trace'
+    path.write_bytes(header)
+
+    with pytest.raises(ValueError):
+        list(EPDTrace.read_trace(str(path)))
@@ -0,0 +1,146 @@
+import json
+import threading
+
+import pytest
+from PIL import Image
+
+import EPDTracing
+import SevenFiveEPD
+
+
+class StepClock:
+    """
+    Clock advancing by a second at each reading.
+    """
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self) -> float:
+        self.time += 1
+
+        return self.time
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    yield str(tmp_path / 'trace.json')
+    EPDTracing.disable()
+
+
+def spans(events: list) -> list:
+    return [event for event in events if event['ph'] == 'X']
+
+
+def test_spans_are_exported_as_chrome_trace_events(trace_path):
+    EPDTracing.enable(trace_path, StepClock(), 'Test')
+
+    with EPDTracing.span('outer', 'test', frame=1):
+        with EPDTracing.span('inner'):
+            pass
+
+    EPDTracing.disable()
+
+    with open(trace_path) as trace_file:
+        events = json.load(trace_file)
+
+    assert events[0]['name'] == 'process_name' and events[0]['args'] == {'name': 'Test'}
+    assert events[-1]['name'] == 'trace_end'
+    assert [(span['name'], span['cat'], span['ts'], span['dur']) for span in spans(events)] == [
+        ('inner', 'epd', 2e6, 1e6), ('outer', 'test', 1e6, 3e6)]
+    assert spans(events)[1]['args'] == {'frame': 1}
+    assert sum(event['name'] == 'thread_name' for event in events) == 1
+
+
+def test_unclosed_trace_is_readable(trace_path):
+    EPDTracing.enable(trace_path, StepClock())
+
+    with EPDTracing.span('span'):
+        pass
+
+    EPDTracing.flush()
+
+    # Trace viewers accept the array without its closing bracket, as does this.
+    with open(trace_path) as trace_file:
+        events = json.loads(trace_file.read().rstrip(',\n') + ']')
+
+    assert [span['name'] for span in spans(events)] == ['span']
+
+
+def test_traced_functions_record_their_exceptions(trace_path):
+    @EPDTracing.traced('failing', 'test')
+    def fail():
+        raise RuntimeError('Failure')
+
+    @EPDTracing.traced('add')
+    def add(a, b):
+        return a + b
+
+    EPDTracing.enable(trace_path, StepClock())
+
+    assert add(1, 2) == 3
+
+    with pytest.raises(RuntimeError):
+        fail()
+
+    EPDTracing.disable()
+
+    with open(trace_path) as trace_file:
+        recorded = spans(json.load(trace_file))
+
+    assert [(span['name'], span.get('args')) for span in recorded] == [('add', None),
+                                                                       ('failing', {'error': 'RuntimeError'})]
+    assert add.__name__ == 'add'
+
+
+def test_threads_are_named(trace_path):
+    EPDTracing.enable(trace_path, StepClock())
+
+    def record():
+        with EPDTracing.span('span'):
+            pass
+
+    thread = threading.Thread(target=record, name='EPDHardware')
+    thread.start()
+    thread.join()
+    record()
+    EPDTracing.disable()
+
+    with open(trace_path) as trace_file:
+        events = json.load(trace_file)
+
+    names = {event['tid']: event['args']['name'] for event in events if event['name'] == 'thread_name'}
+
+    assert len(names) == 2 and 'EPDHardware' in names.values()
+    assert all(span['tid'] in names for span in spans(events))
+
+
+def test_disabled_tracing_records_nothing(trace_path):
+    tracer = EPDTracing.enable(trace_path, StepClock())
+    EPDTracing.disable()
+
+    assert EPDTracing.span('span') is EPDTracing.span('other')
+
+    with EPDTracing.span('span'):
+        pass
+
+    # Spans ending after the trace is closed are dropped.
+    tracer.record('late', 'epd', 0, 1)
+    EPDTracing.flush()
+
+    with open(trace_path) as trace_file:
+        assert spans(json.load(trace_file)) == []
+
+
+def test_service_updates_are_traced(start_service, trace_path):
+    EPDTracing.enable(trace_path)
+    running_service = start_service()
+    client = running_service.client()
+    client.init()
+    client.update(force=True, image=Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 0))
+    running_service.stop()
+    EPDTracing.disable()
+
+    with open(trace_path) as trace_file:
+        names = {span['name'] for span in spans(json.load(trace_file))}
+
+    assert {'Display.init', 'EPDService.update'} <= names
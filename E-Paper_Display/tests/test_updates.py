@@ -0,0 +1,58 @@
+from PIL import Image
+
+import EPDProtocol
+import SevenFiveEPD
+
+
+def create_image(index: int) -> Image:
+    image = Image.new('1', (SevenFiveEPD.width, SevenFiveEPD.height), 1)
+    image.paste(0, (index * 50, 0, index * 50 + 40, 40))
+
+    return image
+
+
+def test_nowait_update_event(start_service):
+    running_service = start_service()
+    client = running_service.client()
+
+    update_id = client.display_nowait(create_image(0))
+    event = client.wait(update_id, 10)
+
+    assert event['update'] == update_id
+    assert event['status'] == EPDProtocol.OK
+    assert event['timings']['refreshed'] >= event['timings']['queued']
+
+
+def test_failed_nowait_update_sends_an_event(start_service):
+    def fail():
+        raise RuntimeError('Broken hook')
+
+    running_service = start_service(on_update=fail)
+    client = running_service.client()
+
+    event = client.wait(client.display_nowait(create_image(0)), 10)
+
+    assert event['status'] == EPDProtocol.ERROR
+    assert event['message'] == 'Update failed: Broken hook'
+
+
+def test_subscribers_get_the_events_of_every_client(start_service):
+    running_service = start_service()
+    client = running_service.client()
+    subscriber = running_service.client()
+    subscriber.subscribe()
+
+    assert client.status()['subscribers'] == 1
+
+    client.display(create_image(0))
+    queued = subscriber.next_event(10)
+    update = subscriber.next_event(10)
+
+    assert queued['event'] == 'queued'
+    assert update['event'] == 'update' and update['update'] == queued['update'] and update['status'] == EPDProtocol.OK
+
+    subscriber.unsubscribe()
+    client.display(create_image(1))
+
+    assert subscriber.next_event(0.1) is None
+    assert client.status()['subscribers'] == 0
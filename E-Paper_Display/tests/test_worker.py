@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import EPDWorker
+
+
+@pytest.fixture
+def worker():
+    hardware_worker = EPDWorker.HardwareWorker()
+    hardware_worker.start()
+    yield hardware_worker
+    hardware_worker.stop(10)
+
+
+def hold(worker: EPDWorker.HardwareWorker) -> threading.Event:
+    """
+    Keeps the worker busy until the returned event is set.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    worker.submit('hold', lambda: started.set() or release.wait(10), priority=EPDWorker.INTERACTIVE)
+    started.wait(10)
+
+    return release
+
+
+def test_operations_run_by_priority_then_in_order(worker):
+    order = []
+    release = hold(worker)
+
+    futures = [worker.submit('background 1', order.append, 'background 1'),
+               worker.submit('interactive 1', order.append, 'interactive 1', priority=EPDWorker.INTERACTIVE),
+               worker.submit('background 2', order.append, 'background 2'),
+               worker.submit('interactive 2', order.append, 'interactive 2', priority=EPDWorker.INTERACTIVE)]
+
+    assert worker.current == 'hold' and worker.pending == 4
+
+    release.set()
+
+    for future in futures:
+        future.result(10)
+
+    assert order == ['interactive 1', 'interactive 2', 'background 1', 'background 2']
+    assert worker.current is None
+
+
+def test_cancelled_operations_are_skipped(worker):
+    calls = []
+    release = hold(worker)
+    cancelled = worker.submit('cancelled', calls.append, 'cancelled')
+    kept = worker.submit('kept', calls.append, 'kept')
+
+    assert cancelled.cancel()
+
+    release.set()
+    kept.result(10)
+
+    assert calls == ['kept']
+
+
+def test_exceptions_are_set_on_the_future(worker):
+    future = worker.submit('failing', int, 'not a number')
+
+    with pytest.raises(ValueError):
+        future.result(10)
+
+    # The worker goes on.
+    assert worker.submit('next', int, '1').result(10) == 1
+
+
+def test_stop_runs_the_queued_operations():
+    worker = EPDWorker.HardwareWorker()
+    worker.start()
+    release = hold(worker)
+    future = worker.submit('last', lambda: 'done')
+    release.set()
+    worker.stop(10)
+
+    assert future.result(0) == 'done'
+
+
+def test_service_answers_while_the_display_is_busy(start_service):
+    service = start_service()
+    client = service.client()
+    release = service.hold_worker()
+
+    try:
+        status = client.status()
+    finally:
+        release.set()
+
+    assert status['worker'] == {'current': 'hold', 'pending': 0}
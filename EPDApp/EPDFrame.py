@@ -1,6 +1,11 @@
 from PIL import Image, ImageDraw
 import EPDClient
+import EPDFrameRing
+import EPDPacking
+import EPDProtocol
+import EPDTracing
 import collections
+import utils
 
 
 class FrameRegion(collections.UserDict):
@@ -32,8 +37,15 @@ class FrameRegion(collections.UserDict):
 
 
 class Frame:
-    def __init__(self, display_size: (int, int), client: EPDClient):
-        self.__frame_path = '/var/epd/frame.bmp'
+    # Bands of changed rows closer than this are refreshed as a single box (px).
+    CHANGED_BOXES_GAP = 8
+
+    # Most boxes sent in a partial update.
+    MAX_CHANGED_BOXES = 255
+
+    def __init__(self, display_size: (int, int), client: EPDClient, frame_path=None, frame_ring=None):
+        self.__frame_path = frame_path
+        self.__frame_ring = frame_ring
 
         self.__client = client
 
@@ -43,20 +55,154 @@ class Frame:
 
         self._regions = {}
 
+        # Pixels as last sent to the service, None until the first display.
+        self.__displayed_bits = None
+        self.__rendered_bits = None
+
+        # IDs of the updates sent without waiting that may not be done yet.
+        self.__pending_updates = []
+
     @property
     def size(self):
         return self.__size
 
+    @property
+    def frame_path(self) -> str:
+        """
+        Getter for the path of the frame file read by the service, None if frames are sent with the updates.
+
+        :rtype str
+        """
+        return self.__frame_path
+
+    @property
+    def frame_ring(self) -> EPDFrameRing.FrameRing:
+        """
+        Getter for the shared memory frame ring the frames are written to, None if they are not.
+
+        :rtype EPDFrameRing.FrameRing
+        """
+        return self.__frame_ring
+
     def _load_template(self):
         self._image = Image.new('1', self.__size, 255)
         main_region = FrameRegion((0, 0, self.size[0], self.size[1]))
         self._regions['main'] = main_region
 
-    def display(self):
+    def update_regions(self, secs: float):
+        """
+        Updates the content of the regions for a given time. Frames without time dependent content do nothing.
+
+        :param secs: The time to display (s since the epoch).
+        :type secs: float
+        """
+        pass
+
+    def __frame_box(self, box: (int, int, int, int)) -> (int, int, int, int):
+        """
+        Converts a box to the frame file's coordinates, the frame being saved rotated by 180 degrees.
+
+        :param box: The box.
+        :type box: (int, int, int, int)
+        :return The box in the frame file.
+        :rtype (int, int, int, int)
+        """
+        width, height = self.size
+
+        return width - box[2], height - box[3], width - box[0], height - box[1]
+
+    @EPDTracing.traced('Frame.render', 'app')
+    def render(self, partial=True) -> list:
+        """
+        Draws the regions and computes the boxes to refresh.
+
+        :param partial: Allows partial updates, the whole frame is refreshed otherwise.
+        :type partial: bool
+        :return None if the whole frame has to be refreshed, otherwise the boxes, in the frame file's coordinates,
+        covering the pixels changed since the last display.
+        :rtype list
+        """
         for region_name in self._regions:
             self._regions[region_name].draw(self._draw)
 
-        self._image.copy().rotate(180).save(self.__frame_path)
-        self.__client.update()
-
-
+        self.__rendered_bits = utils.BitMatrix.from_image(self._image)
+
+        if not partial or self.__displayed_bits is None:
+            return None
+
+        changes = self.__rendered_bits.diff(self.__displayed_bits)
+        boxes = changes.boxes(self.CHANGED_BOXES_GAP)
+
+        if len(boxes) > self.MAX_CHANGED_BOXES:
+            boxes = [changes.bounding_box()]
+
+        return [self.__frame_box(box) for box in boxes]
+
+    def __frame_image(self) -> Image:
+        """
+        Copies the frame for the service, rotated by 180 degrees as the display is mounted upside down.
+
+        :rtype Image
+        """
+        return self._image.rotate(180)
+
+    def save(self):
+        """
+        Saves the frame file.
+        """
+        self.__frame_image().save(self.__frame_path)
+
+    @EPDTracing.traced('Frame.display', 'app')
+    def display(self, partial=True, wait=True):
+        """
+        Draws the regions and sends the frame to the service with a display request: through the frame ring or the
+        frame file if the frame has one, with the request otherwise. The service wakes the display up and manages its
+        power. Once the frame has been displayed, only the boxes of the pixels that changed are refreshed and nothing
+        is sent if none changed.
+
+        :param partial: Allows partial updates, a full update is always done otherwise.
+        :type partial: bool
+        :param wait: Waits for the display to be refreshed. Otherwise the service answers as soon as the update is
+        queued, and the next display is a full one if the update turns out to have failed.
+        :type wait: bool
+        """
+        self.__check_pending_updates()
+        changed_boxes = self.render(partial)
+
+        if changed_boxes == []:
+            return
+
+        with EPDTracing.span('Frame.prepare', 'app'):
+            if self.__frame_ring is not None:
+                image = self.__frame_ring.write(EPDPacking.PackedFrame.from_image(self.__frame_image()))
+            elif self.__frame_path is None:
+                image = self.__frame_image()
+            else:
+                self.save()
+                image = None
+
+        with EPDTracing.span('EPDClient.display', 'app', boxes=len(changed_boxes or ()), wait=wait):
+            if wait:
+                self.__client.display(image, changed_boxes)
+            else:
+                self.__pending_updates.append(self.__client.display_nowait(image, changed_boxes))
+
+        self.__displayed_bits = self.__rendered_bits
+
+    def __check_pending_updates(self):
+        """
+        Checks the updates sent without waiting, without blocking. If one of them failed, the pixels shown by the
+        display are unknown.
+        """
+        pending_updates = []
+
+        for update_id in self.__pending_updates:
+            event = self.__client.wait(update_id, 0)
+
+            if event is None:
+                pending_updates.append(update_id)
+            elif event['status'] not in (EPDProtocol.OK, EPDProtocol.UNCHANGED, EPDProtocol.SUPERSEDED):
+                self.__displayed_bits = None
+
+        # The client does not keep the events of older updates.
+        self.__pending_updates = pending_updates[-EPDClient.MAX_UPDATE_EVENTS:]
@@ -1,40 +1,272 @@
 #!/usr/bin/python3
 
+import argparse
+import json
 import locale
+import os
+import resource
+import statistics
+import sys
 import time
+import tracemalloc
+
+# The modules shared with the service (clients, protocol, packing, frame ring and tracing) are imported from its
+# directory, which comes after this one so the application's own modules are used.
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'E-Paper_Display')
+sys.path.append(SERVICE_PATH)
+
 import SevenFiveEPD
 import EPDClient
+import EPDExceptions
+import EPDFrameRing
+import EPDTracing
+import utils.clock
 import utils.os
 
 from frames.time import TimeFrame
 from frames.wallpaper import WallpaperFrame
 
-locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
+time_update_freq = 30
+time_update_offset = 12
+time_precision = 5
 
-terminator = utils.os.Terminator()
 
-client = EPDClient.EPDClient()
-client.connect()
+def run(client: EPDClient.EPDClient, frame, terminator: utils.os.Terminator, clock=time.time, sleep=time.sleep,
+        until=None, on_update=None, verbose=True, wait=False):
+    """
+    Updates the frame every minute, a little before the minute changes, until the terminator exits. By default the loop
+    does not wait for the display to be refreshed, only for the service to queue the update. A failed update is
+    printed and the loop goes on, the next update sending the pixels changed since the last successful one.
 
-# frame = TimeFrame.TimeFrame((SevenFiveEPD.width, SevenFiveEPD.height), client)
-frame = WallpaperFrame.WallpaperFrame((SevenFiveEPD.width, SevenFiveEPD.height), client)
+    :param client: The client connected to the service.
+    :type client: EPDClient.EPDClient
+    :param frame: The frame.
+    :type frame: EPDFrame.Frame
+    :param terminator: The terminator stopping the loop.
+    :type terminator: utils.os.Terminator
+    :param clock: Reads the time (s since the epoch).
+    :param sleep: Waits for a given time (s).
+    :param until: Stops once the clock reaches this time (s since the epoch), None to run until the terminator exits.
+    :type until: float
+    :param on_update: Called after each update with the displayed time (s since the epoch), the wall duration of the
+    display command (s) and whether the update failed.
+    :param verbose: Prints the times checked by the loop.
+    :type verbose: bool
+    :param wait: Waits for each update to be done, so the duration of the display command is the whole update's.
+    :type wait: bool
+    """
+    last_time = 0
 
-time_update_freq = 30
-time_update_offset = 12
-time_precision = 5
-last_time = 0
-while not terminator.exit:
-    time.sleep(time_precision)
-    current_time = time.time()
-    print(time.strftime('%M:%S', time.localtime(last_time)), time.strftime('%M:%S', time.localtime(current_time)),
-          time.strftime('%M:%S', time.localtime(last_time + 60 - time_update_offset)))
-
-    if current_time > (last_time + time_update_freq - time_update_offset):
-        client.init()
-        # frame.update_regions(current_time + time_update_offset)
-        frame.display()
-        client.sleep()
-
-        last_time = current_time - current_time % 60 + time_update_freq
-
-client.disconnect()
+    while not terminator.exit and (until is None or clock() < until):
+        sleep(time_precision)
+        current_time = clock()
+
+        if verbose:
+            print(time.strftime('%M:%S', time.localtime(last_time)),
+                  time.strftime('%M:%S', time.localtime(current_time)),
+                  time.strftime('%M:%S', time.localtime(last_time + 60 - time_update_offset)))
+
+        if current_time > (last_time + time_update_freq - time_update_offset):
+            frame.update_regions(current_time + time_update_offset)
+            start = time.perf_counter()
+
+            try:
+                frame.display(wait=wait)
+                failed = False
+            except (EPDExceptions.InvalidFrameException, EPDExceptions.InvalidDisplayStatusException,
+                    EPDClient.EPDServiceException) as exception:
+                print('Update failed: ' + str(exception))
+                failed = True
+
+            displayed = time.perf_counter()
+
+            last_time = current_time - current_time % 60 + time_update_freq
+
+            if on_update is not None:
+                on_update(current_time + time_update_offset, displayed - start, failed)
+
+
+def distribution(samples: list) -> dict:
+    """
+    Computes the distribution of latency samples.
+
+    :param samples: The samples (s).
+    :type samples: list
+    :return The mean, median, 90th, 99th percentiles and max (s).
+    :rtype dict
+    """
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+
+    return {
+        'mean': statistics.mean(samples),
+        'p50': percentiles[49],
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': max(samples)
+    }
+
+
+def traced_memory() -> int:
+    """
+    Measures the memory allocated since tracemalloc started, leaving out this module's allocations (the measurements).
+
+    :return The allocated memory (B).
+    :rtype int
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+
+    return sum(statistic.size for statistic in snapshot.statistics('filename'))
+
+
+def time_warp(client: EPDClient.EPDClient, frame, minutes: int, start: float) -> dict:
+    """
+    Runs the update loop on a virtual clock, as fast as the frame and the service allow, and measures it. Each update is
+    waited for, so its latency covers the whole cycle, from the drawing to the end of the refresh, and its failure is
+    counted.
+
+    :param client: The client connected to the service.
+    :type client: EPDClient.EPDClient
+    :param frame: The frame.
+    :type frame: EPDFrame.Frame
+    :param minutes: The simulated duration (min).
+    :type minutes: int
+    :param start: The virtual time of the first update (s since the epoch).
+    :type start: float
+    :return The number of updates, of failed updates and of distinct displayed minutes, the throughput (updates/s),
+    the latency distribution of the updates (s), and the memory allocated by the frame and the client at each
+    simulated hour (B).
+    :rtype dict
+    """
+    clock = utils.clock.VirtualClock(start - time_precision)
+    latencies = {'display': []}
+    displayed_minutes = set()
+    failed_updates = []
+    memory = []
+
+    def on_update(displayed_time, display_duration, failed):
+        displayed_minutes.add(int(displayed_time // 60))
+        latencies['display'].append(display_duration)
+
+        if failed:
+            failed_updates.append(displayed_time)
+
+        # One sample per simulated hour.
+        if len(displayed_minutes) > 60 * len(memory):
+            memory.append(traced_memory())
+
+    tracemalloc.start()
+    wall_start = time.perf_counter()
+    run(client, frame, utils.os.Terminator(), clock.time, clock.sleep, start + minutes * 60, on_update, False, True)
+    wall_duration = time.perf_counter() - wall_start
+    memory.append(traced_memory())
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'updates': len(latencies['display']),
+        'failed_updates': len(failed_updates),
+        'displayed_minutes': len(displayed_minutes),
+        'virtual_duration': clock.time() - start,
+        'wall_duration': wall_duration,
+        'throughput': len(latencies['display']) / wall_duration,
+        'latency': {phase: distribution(samples) for phase, samples in latencies.items()},
+        'memory': {
+            'hourly': memory,
+            'growth': memory[-1] - memory[0],
+            'peak': peak_memory,
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        }
+    }
+
+
+def print_report(report: dict):
+    """
+    Prints a time warp report.
+
+    :param report: The report, as returned by time_warp.
+    :type report: dict
+    """
+    print('{} updates ({} failed, {} distinct minutes) in {:.1f} s for {:.1f} simulated hours: {:.1f} updates/s'.format(
+        report['updates'], report['failed_updates'], report['displayed_minutes'], report['wall_duration'],
+        report['virtual_duration'] / 3600, report['throughput']))
+    print('{:<10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format('ms', 'mean', 'p50', 'p90', 'p99', 'max'))
+
+    for phase, latency in report['latency'].items():
+        print('{:<10} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            phase, *(latency[key] * 1000 for key in ('mean', 'p50', 'p90', 'p99', 'max'))))
+
+    print('memory: {:+.1f} KiB over the run, {:.1f} KiB peak, {:.1f} MiB max RSS'.format(
+        report['memory']['growth'] / 1024, report['memory']['peak'] / 1024,
+        report['memory']['max_rss'] / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frame', choices=['wallpaper', 'time'], default='wallpaper', help='displayed frame')
+    parser.add_argument('--socket', default='/var/run/epd.sock', help='path of the service socket')
+    parser.add_argument('--frame-file',
+                        help='writes the frames to this file for the service to read, instead of sending them with '
+                             'the updates')
+    parser.add_argument('--frame-ring', nargs='?', const=EPDFrameRing.DEFAULT_PATH, metavar='PATH',
+                        help='writes the frames to the shared memory frame ring read by the service (default path is '
+                             + EPDFrameRing.DEFAULT_PATH + '), instead of sending them with the updates')
+    parser.add_argument('--time-warp', type=int, metavar='MINUTES',
+                        help='runs this many minutes on a virtual clock as fast as possible, starting at '
+                             'midnight, and prints a throughput, latency and memory report (a day is 1440 minutes). '
+                             'Run the service with --simulate --virtual-time to leave the panel times out')
+    parser.add_argument('--report', help='with --time-warp, writes the report to this JSON file')
+    parser.add_argument('--trace-spans', metavar='PATH',
+                        help='records spans of the frame updates to this Chrome trace file, viewed as a timeline in '
+                             'Perfetto or chrome://tracing. Spans are timed on the monotonic clock, as the service\'s '
+                             'unless it runs on a virtual clock, so both traces can be merged')
+
+    args = parser.parse_args()
+
+    try:
+        locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
+    except locale.Error:
+        print('fr_FR.UTF-8 locale unavailable, using the default one')
+
+    if args.trace_spans:
+        EPDTracing.enable(args.trace_spans, process_name='EPD app')
+
+    client = EPDClient.EPDClient(args.socket)
+    client.connect()
+
+    # Periodic updates give way to the ones triggered by a user.
+    client.set_priority(EPDClient.PRIORITY_BACKGROUND)
+
+    size = (SevenFiveEPD.width, SevenFiveEPD.height)
+    frame_ring = None
+
+    if args.frame_ring:
+        # Three slots: the service may still have to read a queued frame and the one it displays while the next one is
+        # written.
+        frame_ring = EPDFrameRing.FrameRing.create(args.frame_ring, 3, EPDFrameRing.slot_size(*size))
+
+    if args.frame == 'time':
+        frame = TimeFrame.TimeFrame(size, client, args.frame_file, frame_ring)
+    else:
+        frame = WallpaperFrame.WallpaperFrame(size, client, args.frame_file, frame_ring)
+
+    if args.time_warp is None:
+        run(client, frame, utils.os.Terminator())
+    else:
+        midnight = time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+        report = time_warp(client, frame, args.time_warp, midnight)
+        print_report(report)
+
+        if args.report:
+            with open(args.report, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+
+    client.disconnect()
+
+    if frame_ring is not None:
+        frame_ring.close()
+
+    EPDTracing.disable()
+
+
+if __name__ == '__main__':
+    main()
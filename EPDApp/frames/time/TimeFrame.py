@@ -6,8 +6,8 @@ import time
 
 
 class TimeFrame(EPDFrame.Frame):
-    def __init__(self, display_size, client):
-        super(self.__class__, self).__init__(display_size, client)
+    def __init__(self, display_size, client, frame_path=None, frame_ring=None):
+        super(self.__class__, self).__init__(display_size, client, frame_path, frame_ring)
 
         date_x0 = 40
         date_y0 = 25
@@ -24,7 +24,7 @@ class TimeFrame(EPDFrame.Frame):
         time_font = ImageFont.truetype('fonts/Roboto-Thin.ttf', 100)
         time_y0 = self.size[1] / 2 - 100 / 2 - 10
         time_y1 = time_y0 + 100
-        time_width = time_font.getsize('00')[0]
+        time_width = time_font.getlength('00')
         offset = 15
         hours_x1 = self.size[0] / 2 - offset
         hours_x0 = hours_x1 - time_width
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The application's modules are imported from its directory, as the scripts do, then the modules it shares with the
+# service from the service's directory (see app.SERVICE_PATH).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'E-Paper_Display'))
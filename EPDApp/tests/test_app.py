@@ -0,0 +1,81 @@
+import types
+
+import pytest
+
+import EPDClient
+import app
+import utils.clock
+
+
+class FlakyFrame:
+    """
+    Frame whose second update fails, recording how it is displayed.
+    """
+    def __init__(self):
+        self.displayed = []
+
+    def update_regions(self, secs: float):
+        pass
+
+    def display(self, partial=True, wait=True):
+        self.displayed.append(wait)
+
+        if len(self.displayed) == 2:
+            raise EPDClient.EPDServiceException('Update failed')
+
+
+def test_run_reports_failed_updates():
+    clock = utils.clock.VirtualClock(0)
+    frame = FlakyFrame()
+    updates = []
+
+    app.run(None, frame, types.SimpleNamespace(exit=False), clock.time, clock.sleep, 5 * 60,
+            lambda displayed_time, duration, failed: updates.append(failed), False, True)
+
+    assert len(updates) >= 5
+    assert updates[1] and not any(updates[:1] + updates[2:])
+    assert all(frame.displayed)
+
+
+class RecordingFrame:
+    """
+    Frame recording the times it displays.
+    """
+    def __init__(self):
+        self.times = []
+
+    def update_regions(self, secs: float):
+        self.times.append(secs)
+
+    def display(self, partial=True, wait=True):
+        pass
+
+
+def test_time_warp_displays_every_minute():
+    frame = RecordingFrame()
+    report = app.time_warp(None, frame, 120, 1_700_000_000)
+
+    assert report['updates'] == len(frame.times)
+    # Updates are repeated until the minute changes, the frame then sending only the changed pixels.
+    assert report['updates'] >= report['displayed_minutes'] >= 120
+    assert report['failed_updates'] == 0
+    assert report['virtual_duration'] >= 120 * 60
+    # After the first update, the minutes are drawn ahead of time, displaying the minute about to start.
+    assert all(displayed % 60 <= app.time_update_offset + app.time_precision for displayed in frame.times[1:])
+    assert len(report['memory']['hourly']) >= 2
+
+
+def test_virtual_clock_never_goes_back():
+    clock = utils.clock.VirtualClock(10)
+    clock.sleep(5)
+    clock.sleep(-5)
+
+    assert clock.time() == 15
+
+
+def test_distribution():
+    report = app.distribution([float(sample) for sample in range(1, 101)])
+
+    assert report['p50'] == pytest.approx(50.5)
+    assert report['max'] == 100
+    assert app.distribution([2.0])['p99'] == 2.0
@@ -0,0 +1,78 @@
+import pytest
+from PIL import Image, ImageDraw
+
+import utils
+
+
+def test_image_round_trip():
+    image = Image.new('1', (13, 5), 0)
+    ImageDraw.Draw(image).rectangle((2, 1, 10, 3), fill=1)
+    matrix = utils.BitMatrix.from_image(image)
+
+    assert (matrix.width, matrix.height, matrix.stride) == (13, 5, 2)
+    assert matrix.count() == 9 * 3
+    assert matrix.to_image().tobytes() == image.tobytes()
+    assert matrix.bounding_box() == (2, 1, 11, 4)
+
+
+def test_grayscale_image_is_thresholded():
+    image = Image.new('L', (8, 1), 0)
+    image.putpixel((3, 0), 1)
+
+    assert list(utils.BitMatrix.from_image(image)) == [0, 0, 0, 1, 0, 0, 0, 0]
+
+
+def test_padding_bits_are_cleared():
+    matrix = utils.BitMatrix(4, 2, b'\xff\xff')
+
+    assert matrix.data == b'\xf0\xf0'
+    assert not matrix.diff(utils.BitMatrix(4, 2, b'\xf0\xf0')).any()
+
+
+def test_items_and_iteration():
+    matrix = utils.BitMatrix(10, 2)
+    matrix[9, 1] = 1
+    matrix[0, 0] = 5
+
+    assert matrix[9, 1] == 1
+    assert list(matrix) == [1] + [0] * 18 + [1]
+
+    del matrix[0, 0]
+
+    assert list(matrix) == [0] * 19 + [1]
+    assert list(matrix) == [0] * 19 + [1]
+
+
+def test_diff_boxes():
+    first = utils.BitMatrix(32, 20)
+    second = utils.BitMatrix(32, 20)
+
+    for x, y in ((3, 2), (12, 4), (30, 15)):
+        second[x, y] = 1
+
+    changes = first.diff(second)
+
+    assert changes.count() == 3
+    assert changes.row_spans() == [(2, 3), (4, 5), (15, 16)]
+    assert changes.boxes(2) == [(3, 2, 13, 5), (30, 15, 31, 16)]
+    assert changes.bounding_box() == (3, 2, 31, 16)
+    assert first.diff(first).bounding_box() is None
+
+
+def test_slice():
+    matrix = utils.BitMatrix(20, 4)
+    matrix[11, 2] = 1
+
+    piece = matrix.slice((9, 1, 25, 3))
+
+    assert (piece.width, piece.height) == (11, 2)
+    assert piece[2, 1] == 1
+    assert piece.count() == 1
+
+
+def test_invalid_data_is_rejected():
+    with pytest.raises(ValueError):
+        utils.BitMatrix(9, 2, b'\x00\x00\x00')
+
+    with pytest.raises(ValueError):
+        utils.BitMatrix(8, 1).diff(utils.BitMatrix(8, 2))
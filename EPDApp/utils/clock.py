@@ -0,0 +1,29 @@
+class VirtualClock:
+    def __init__(self, start: float):
+        """
+        Creates a VirtualClock object. It replaces time.time and time.sleep: sleeping advances the clock instantly, so
+        loops written against the system clock run as fast as possible.
+
+        :param start: The initial time (s since the epoch).
+        :type start: float
+        """
+        self.__time = start
+
+    def time(self) -> float:
+        """
+        Reads the clock.
+
+        :return The time (s since the epoch).
+        :rtype float
+        """
+        return self.__time
+
+    def sleep(self, seconds: float):
+        """
+        Advances the clock.
+
+        :param seconds: The time to skip (s).
+        :type seconds: float
+        """
+        if seconds > 0:
+            self.__time += seconds
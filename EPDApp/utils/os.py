@@ -12,5 +12,5 @@ class Terminator:
     def exit(self) -> bool:
         return self.__exit
 
-    def __do_exit(self):
+    def __do_exit(self, signal_number=None, frame=None):
         self.__exit = True